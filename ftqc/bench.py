@@ -0,0 +1,39 @@
+import argparse
+import json
+import os
+from os.path import join
+from benchmark.startup import run_startup_benchmark
+from benchmark.scaling import run_scaling_benchmark
+from benchmark.circuits import FAMILIES
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks of the ftqc framework")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    startup = subparsers.add_parser("startup", help="Startup time of main.py and of the evaluation of stored results")
+    startup.add_argument("--repetitions", type=int, default=3)
+    startup.add_argument("--circuits", type=int, default=50)
+    startup.add_argument("--outputdir", default=join("results", "benchmark"))
+
+    scaling = subparsers.add_parser("scaling", help="Time of each stage of run_experiment on synthetic devices")
+    scaling.add_argument("--circuits", type=int, nargs="+", default=[5, 10, 20])
+    scaling.add_argument("--transpilations", type=int, nargs="+", default=[3, 9])
+    scaling.add_argument("--devices", type=int, nargs="+", default=[2, 4])
+    scaling.add_argument("--latency", type=float, default=None, help="Seconds per batch, the devices return their counts immediately if not set")
+    scaling.add_argument("--shots", type=int, default=1024)
+    scaling.add_argument("--families", nargs="+", default=FAMILIES, choices=FAMILIES)
+    scaling.add_argument("--max-qubits", type=int, default=6)
+    scaling.add_argument("--seed", type=int, default=0)
+    scaling.add_argument("--outputdir", default=join("results", "benchmark"))
+
+    args = parser.parse_args()
+    os.makedirs(args.outputdir, exist_ok=True)
+
+    if args.benchmark == "startup":
+        rows = run_startup_benchmark(args.outputdir, repetitions=args.repetitions, num_circuits=args.circuits)
+        with open(join(args.outputdir, "startup.json"), "w") as f:
+            json.dump(rows, f, indent=4)
+    elif args.benchmark == "scaling":
+        df = run_scaling_benchmark(args.outputdir, circuits=args.circuits, transpilations=args.transpilations, devices=args.devices,
+                                   batch_latency=args.latency, shots=args.shots, families=args.families, max_qubits=args.max_qubits, seed=args.seed)
+        print(df.to_string(index=False))
@@ -0,0 +1,78 @@
+import math
+import random
+from core.entities import Circuit
+from provider.circuit_provider import CircuitProvider
+
+FAMILIES = ["ghz", "qft", "grover"]
+
+def ghz(num_qubits, rng):
+    from qiskit import QuantumCircuit
+
+    qc = QuantumCircuit(num_qubits, num_qubits)
+    qc.h(0)
+    for i in range(num_qubits - 1):
+        qc.cx(i, i + 1)
+    qc.measure(range(num_qubits), range(num_qubits))
+    return qc
+
+def qft(num_qubits, rng):
+    '''QFT of a random basis state'''
+    from qiskit import QuantumCircuit
+    from qiskit.circuit.library import QFT
+
+    qc = QuantumCircuit(num_qubits, num_qubits)
+    for i in range(num_qubits):
+        if rng.random() < 0.5:
+            qc.x(i)
+    qc.compose(QFT(num_qubits).decompose(), inplace=True)
+    qc.measure(range(num_qubits), range(num_qubits))
+    return qc
+
+def grover(num_qubits, rng, max_iterations=2):
+    '''Grover search for a random marked state, the number of iterations is capped to keep the circuits shallow'''
+    from qiskit import QuantumCircuit
+
+    marked = [rng.random() < 0.5 for _ in range(num_qubits)]
+    qc = QuantumCircuit(num_qubits, num_qubits)
+    qc.h(range(num_qubits))
+
+    iterations = max(1, min(max_iterations, math.floor(math.pi / 4 * math.sqrt(2 ** num_qubits))))
+    for _ in range(iterations):
+        # Oracle flipping the phase of the marked state
+        zeros = [i for i in range(num_qubits) if not marked[i]]
+        if len(zeros) > 0:
+            qc.x(zeros)
+        qc.h(num_qubits - 1)
+        qc.mcx(list(range(num_qubits - 1)), num_qubits - 1)
+        qc.h(num_qubits - 1)
+        if len(zeros) > 0:
+            qc.x(zeros)
+
+        # Diffusion
+        qc.h(range(num_qubits))
+        qc.x(range(num_qubits))
+        qc.h(num_qubits - 1)
+        qc.mcx(list(range(num_qubits - 1)), num_qubits - 1)
+        qc.h(num_qubits - 1)
+        qc.x(range(num_qubits))
+        qc.h(range(num_qubits))
+
+    qc.measure(range(num_qubits), range(num_qubits))
+    return qc
+
+GENERATORS = {"ghz": ghz, "qft": qft, "grover": grover}
+
+class BenchmarkCircuitProvider(CircuitProvider):
+    '''Seeded circuits of the benchmark families, the same arguments always yield the same circuits'''
+    def __init__(self, num_circuits, families=FAMILIES, min_qubits=3, max_qubits=6, seed=0) -> None:
+        rng = random.Random(seed)
+        self.circuits = []
+        for i in range(num_circuits):
+            family = families[i % len(families)]
+            num_qubits = rng.randint(min_qubits, max_qubits)
+            qiskit_circuit = GENERATORS[family](num_qubits, rng)
+            qiskit_circuit.name = family + "_" + str(num_qubits) + "_" + str(i)
+            self.circuits.append(Circuit(qiskit_circuit.name, qiskit_circuit))
+
+    def get(self):
+        return self.circuits
@@ -0,0 +1,96 @@
+import random
+import time
+from os.path import join
+from core.entities import QuantumContainerOrchestrator
+from experiment.ftqc_experiment import FaultTolerantQCExperiment
+from pattern_definition import build_patterns
+from benchmark.circuits import BenchmarkCircuitProvider, FAMILIES
+from benchmark.synthetic import SyntheticDeviceProvider
+
+STAGES = ["transpilation", "execution", "aggregation", "ground_truth", "total"]
+
+class TimedContainerOrchestrator(QuantumContainerOrchestrator):
+    '''Records the time of each stage of the orchestration'''
+    def __init__(self, qcontainers, qdevice_provider, execution_retries=3, aggregation_processes=None) -> None:
+        super().__init__(qcontainers, qdevice_provider, execution_retries, aggregation_processes)
+        self.timings = {}
+
+    def prepare_for_execution(self, circuit_provider):
+        start = time.perf_counter()
+        prepared = super().prepare_for_execution(circuit_provider)
+        self.timings["transpilation"] = time.perf_counter() - start
+        return prepared
+
+    def execute(self, partitioned_circuits):
+        start = time.perf_counter()
+        result_manager = super().execute(partitioned_circuits)
+        self.timings["execution"] = time.perf_counter() - start
+        return result_manager
+
+    def aggregate_results(self, orchestrations, result_manager):
+        start = time.perf_counter()
+        super().aggregate_results(orchestrations, result_manager)
+        self.timings["aggregation"] = time.perf_counter() - start
+
+def run_point(num_circuits, num_transpilations, num_devices, batch_latency=None, shots=1024, families=FAMILIES, max_qubits=6, seed=0):
+    '''Runs the containers of build_patterns on synthetic devices and returns the time of each stage'''
+    device_provider = SyntheticDeviceProvider(num_devices, batch_latency=batch_latency, shots=shots, seed=seed)
+    circuit_provider = BenchmarkCircuitProvider(num_circuits, families=families, max_qubits=max_qubits, seed=seed)
+
+    random.seed(seed)
+    patterns = build_patterns({"transpilations": num_transpilations, "num_opt_level": 4}, device_provider)
+
+    orchestrators = []
+    def create_orchestrator(containers, provider):
+        orchestrators.append(TimedContainerOrchestrator(containers, provider))
+        return orchestrators[-1]
+
+    start = time.perf_counter()
+    FaultTolerantQCExperiment(circuit_provider, device_provider, patterns, create_orchestrator).run_experiment()
+    total = time.perf_counter() - start
+
+    timings = dict(orchestrators[0].timings)
+    timings["ground_truth"] = total - sum(timings.values())
+    timings["total"] = total
+    timings.update({"circuits": num_circuits, "transpilations": num_transpilations, "devices": num_devices,
+                    "channels": sum(len(p.channels) for p in patterns)})
+    return timings
+
+def run_scaling_benchmark(result_dir, circuits=[5, 10, 20], transpilations=[3, 9], devices=[2, 4], batch_latency=None,
+                          shots=1024, families=FAMILIES, max_qubits=6, seed=0):
+    '''Varies one dimension at a time starting from the smallest sizes and plots the time of each stage against it'''
+    import pandas as pd
+
+    base = {"num_circuits": circuits[0], "num_transpilations": transpilations[0], "num_devices": devices[0]}
+    rows = []
+    for dimension, values in [("num_circuits", circuits), ("num_transpilations", transpilations), ("num_devices", devices)]:
+        for value in values:
+            point = dict(base)
+            point[dimension] = value
+            print("Benchmark point: " + str(point))
+            timings = run_point(**point, batch_latency=batch_latency, shots=shots, families=families, max_qubits=max_qubits, seed=seed)
+            timings["varied"] = dimension
+            rows.append(timings)
+
+    df = pd.DataFrame(rows)
+    df.to_csv(join(result_dir, "scaling.csv"), index=False)
+    plot_scaling(df, result_dir)
+    return df
+
+def plot_scaling(df, result_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    columns = {"num_circuits": "circuits", "num_transpilations": "transpilations", "num_devices": "devices"}
+    fig, axes = plt.subplots(1, len(columns), figsize=(5 * len(columns), 4))
+    for ax, (dimension, column) in zip(axes, columns.items()):
+        points = df[df["varied"] == dimension].sort_values(column)
+        for stage in STAGES:
+            ax.plot(points[column], points[stage], marker="o", label=stage)
+        ax.set_xlabel(column)
+        ax.set_ylabel("time [s]")
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig(join(result_dir, "scaling.png"))
+    plt.close(fig)
@@ -0,0 +1,72 @@
+import random
+import subprocess
+import sys
+import time
+from os.path import dirname, abspath, join
+from core.entities import Measurements
+from experiment.ftqc_experiment import ExperimentResult
+from experiment.util import save_results
+
+FTQC_ROOT = dirname(dirname(abspath(__file__)))
+
+IMPORT_MAIN = "import main"
+EVALUATE_ONLY = """
+import sys
+from experiment.ftqc_experiment import FaultTolerantQCExperiment
+ftqc_exp = FaultTolerantQCExperiment(None, None, [])
+ftqc_exp.evaluate(ftqc_exp.load_accepted_from(sys.argv[1]), sys.argv[2])
+"""
+HEAVY_MODULES = ["qiskit", "qiskit_aer", "qiskit_ibm_provider", "pandas", "openpyxl"]
+
+def generate_results(result_dir, num_circuits=50, num_containers=2, num_channels=3, num_qubits=4, shots=1024, seed=None):
+    '''Writes synthetic experiment results, so the evaluation can be timed without running any circuit'''
+    rng = random.Random(seed)
+    states = [format(i, "b").zfill(num_qubits) for i in range(2 ** num_qubits)]
+
+    def random_counts():
+        weights = [rng.random() ** 4 for _ in states]
+        counts = {}
+        for state in rng.choices(states, weights=weights, k=shots):
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    results = []
+    for _ in range(num_circuits):
+        ground_truth = [rng.choice(states)]
+        for container in range(num_containers):
+            singles = [Measurements("channel_" + str(c), random_counts(), rng.random() < 0.8) for c in range(num_channels)]
+            aggregated = Measurements(None, random_counts(), rng.random() < 0.9)
+            results.append(ExperimentResult("container_" + str(container), ground_truth, aggregated, singles))
+
+    result_file = join(result_dir, "synthetic_results.json")
+    save_results(results, result_dir, ExperimentResult.JSONEncoder, result_file)
+    return result_file
+
+def time_in_fresh_interpreter(code, args=[]):
+    '''Runs the code in a new interpreter, so no module is already imported, and returns the wall time and the loaded heavy modules'''
+    probe = code + "\nimport sys\nprint(','.join(m for m in " + repr(HEAVY_MODULES) + " if m in sys.modules))\n"
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-c", probe] + args, cwd=FTQC_ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+
+    if process.returncode != 0:
+        raise Exception("Benchmark failed: " + process.stderr)
+
+    lines = process.stdout.strip().splitlines()
+    loaded = lines[-1].split(",") if len(lines) > 0 and lines[-1] != "" else []
+    return elapsed, [m for m in loaded if m in HEAVY_MODULES]
+
+def run_startup_benchmark(result_dir, repetitions=3, num_circuits=50):
+    result_file = generate_results(result_dir, num_circuits=num_circuits, seed=0)
+
+    rows = []
+    for name, code, args in [("import main", IMPORT_MAIN, []),
+                             ("evaluate only", EVALUATE_ONLY, [result_file, result_dir])]:
+        timings = []
+        for _ in range(repetitions):
+            elapsed, loaded = time_in_fresh_interpreter(code, args)
+            timings.append(elapsed)
+        rows.append({"path": name, "min_s": min(timings), "mean_s": sum(timings) / len(timings), "heavy_modules": " ".join(loaded)})
+        print("{0}: min {1:.3f}s, mean {2:.3f}s, loaded: {3}".format(name, min(timings), sum(timings) / len(timings), " ".join(loaded) or "-"))
+
+    return rows
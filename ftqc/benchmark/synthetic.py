@@ -0,0 +1,94 @@
+import random
+import time
+import zlib
+import numpy as np
+from core.entities import QuantumDevice
+from core.exact_execution import PseudoCountsResult
+
+class SyntheticJob:
+    def __init__(self, result) -> None:
+        self._result = result
+
+    def result(self):
+        return self._result
+
+def format_outcome(outcome, qiskit_circuit):
+    '''Formats an integer over all clbits like the keys of qiskit counts, registers are separated by spaces'''
+    bits = format(outcome, "b").zfill(qiskit_circuit.num_clbits)[::-1]
+    registers = []
+    offset = 0
+    for creg in qiskit_circuit.cregs:
+        registers.append(bits[offset:offset + creg.size][::-1])
+        offset += creg.size
+    return " ".join(reversed(registers))
+
+class SyntheticQuantumDevice(QuantumDevice):
+    '''Device without simulation cost. The counts follow a distribution with a peak on a state derived from the circuit name,
+    the remaining shots are spread uniformly. The backend is only used to transpile the circuits.'''
+    def __init__(self, backend, shots=1024, peak_probability=0.5, seed=0) -> None:
+        super().__init__(backend.backend_name, shots)
+        self.backend = backend
+        self.num_qubits = backend.configuration().n_qubits
+        self.peak_probability = peak_probability
+        self.seed = seed
+        self.executed_batches = 0
+
+    def get_backend(self):
+        return self.backend
+
+    def execute(self, circuit):
+        return self.execute_batch([circuit])
+
+    def execute_batch(self, circuits):
+        return self.submit_batch(circuits).result()
+
+    def submit_batch(self, circuits, profile=None):
+        self.executed_batches += 1
+        return SyntheticJob(PseudoCountsResult({c.qiskit_circuit.name: self.counts_for(c.qiskit_circuit) for c in circuits}))
+
+    def counts_for(self, qiskit_circuit):
+        # The peak only depends on the original circuit, so that all channels agree on it
+        original_name = qiskit_circuit.name.split("-")[0]
+        num_states = 2 ** qiskit_circuit.num_clbits
+        peak = random.Random(original_name).randrange(num_states)
+
+        rng = np.random.default_rng([self.seed, self.executed_batches, zlib.crc32(qiskit_circuit.name.encode())])
+        num_peak = rng.binomial(self.shots, self.peak_probability)
+        outcomes, counts = np.unique(rng.integers(0, num_states, size=self.shots - num_peak), return_counts=True)
+
+        measurements = {format_outcome(int(outcome), qiskit_circuit): int(count) for outcome, count in zip(outcomes, counts)}
+        peak_key = format_outcome(peak, qiskit_circuit)
+        measurements[peak_key] = measurements.get(peak_key, 0) + int(num_peak)
+        return {key: count for key, count in measurements.items() if count > 0}
+
+class FixedLatencyQuantumDevice(SyntheticQuantumDevice):
+    '''Synthetic device that takes a fixed time per batch and per circuit, e.g. to mimic the queue of a remote device'''
+    def __init__(self, backend, shots=1024, batch_latency=1.0, circuit_latency=0.0, peak_probability=0.5, seed=0) -> None:
+        super().__init__(backend, shots, peak_probability, seed)
+        self.batch_latency = batch_latency
+        self.circuit_latency = circuit_latency
+
+    def submit_batch(self, circuits, profile=None):
+        time.sleep(self.batch_latency + self.circuit_latency * len(circuits))
+        return super().submit_batch(circuits, profile)
+
+class SyntheticDeviceProvider:
+    '''Provides synthetic devices for the first num_devices fake backends, the first one being the default device'''
+    def __init__(self, num_devices, batch_latency=None, circuit_latency=0.0, shots=1024, max_job_size=None, seed=0) -> None:
+        from qiskit.providers.fake_provider import FakeProvider
+
+        self.max_job_size = max_job_size
+        backends = [b for b in FakeProvider().backends() if hasattr(b, "backend_name") and b.configuration().n_qubits >= 10]
+        backends = sorted(backends, key=lambda b: b.backend_name != "fake_boeblingen")[:num_devices]
+
+        if batch_latency == None:
+            self.devices = [SyntheticQuantumDevice(b, shots, seed=seed) for b in backends]
+        else:
+            self.devices = [FixedLatencyQuantumDevice(b, shots, batch_latency, circuit_latency, seed=seed) for b in backends]
+        self.default_device = self.devices[0]
+
+    def max_job_size_for(self, device):
+        return self.max_job_size
+
+    def provided_devices(self, min_qubits=10):
+        return [device for device in self.devices if device.num_qubits >= min_qubits]
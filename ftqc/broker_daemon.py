@@ -0,0 +1,27 @@
+import argparse
+from provider.device_broker import DeviceBroker, create_authkey, DEFAULT_ADDRESS, DEFAULT_KEY_FILE, DEFAULT_MAX_BATCH_LATENCY
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the circuits of concurrent experiments on shared devices, the circuits of all runs are coalesced into full jobs")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS[0] + ":" + str(DEFAULT_ADDRESS[1]), help="host:port the broker listens on")
+    parser.add_argument("--max_batch_latency", type=float, default=DEFAULT_MAX_BATCH_LATENCY, help="Seconds a circuit waits for a job to fill up")
+    parser.add_argument("--key_file", default=DEFAULT_KEY_FILE, help="File with the authkey of the clients, created with mode 0600 on the first start")
+    parser.add_argument("--device_snapshot_dir", default=None)
+    parser.add_argument("--fake", action="store_true", help="Only provide the fake devices of qiskit")
+    args = parser.parse_args()
+
+    if args.fake:
+        from provider.qdevice_provider import FakeQuantumDeviceProvider
+
+        device_provider = FakeQuantumDeviceProvider()
+    else:
+        from provider.qdevice_provider import HybridQuantumDeviceProvider, IBMQCredentials
+
+        ibmq_credentials = IBMQCredentials(api_token='api_token', api_url='api_url', instance='instance')
+        device_provider = HybridQuantumDeviceProvider(ibmq_credentials, args.device_snapshot_dir)
+
+    broker = DeviceBroker(device_provider, args.address, authkey=create_authkey(args.key_file), max_batch_latency=args.max_batch_latency)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        broker.stop()
@@ -1,5 +1,6 @@
 from core.combiner import LinearOpinionPool
-from core.entities import FaultTolerantQuantumContainer, Measurements
+from core.batch_aggregation import ConformalVotingBatch
+from core.entities import FaultTolerantQuantumContainer, Measurements, SKIP
 from core.qswitches import QuantumSwitchUnit
 from core.qerror_detection import MeasurementComparison
 from core.conformal_measurements import (ConformalBasedMajorityVoting,
@@ -15,6 +16,12 @@ from core.conformal_measurements import (ConformalBasedMajorityVoting,
 class FaultTolerantPatternBuilder:
     def __init__(self, pattern_name) -> None:
         self.pattern_name = pattern_name
+        self.unavailable_channels_policy = SKIP
+
+    def when_channels_unavailable(self, policy):
+        '''What the container does with a circuit some of its channels cannot run: skip, degrade or fail'''
+        self.unavailable_channels_policy = policy
+        return self
     
     def build(self):
         if self.pattern_name == "" or self.pattern_name == None:
@@ -56,7 +63,19 @@ class CombinerPatternBuilder(FaultTolerantPatternBuilder):
             else:
                 raise Exception("No combiner has been specified.")
         
-        return FaultTolerantQuantumContainer(self.pattern_name, self.channels, self.combiner.combine)
+        batch_aggregation = self.combiner.batch_for(self.channels) if isinstance(self.combiner, LinearOpinionPool) else None
+        channel_restriction = None
+        restricted_aggregator = None
+        if isinstance(self.combiner, LinearOpinionPool):
+            combiner = self.combiner
+            # A combination of a single channel is still a result
+            channel_restriction = lambda channels: channels if len(channels) >= 1 else None
+            restricted_aggregator = lambda measurements: combiner.restricted_to([m.generated_from_channel for m in measurements]).combine(measurements)
+
+        return FaultTolerantQuantumContainer(self.pattern_name, self.channels, self.combiner.combine, batch_aggregation,
+                                             channel_restriction=channel_restriction,
+                                             restricted_aggregator=restricted_aggregator,
+                                             unavailable_channels_policy=self.unavailable_channels_policy)
     
 class ComparisonPatternBuilder(FaultTolerantPatternBuilder):
     def __init__(self, pattern_name) -> None:
@@ -99,7 +118,9 @@ class ComparisonPatternBuilder(FaultTolerantPatternBuilder):
 
             return measurements_primary
         
-        return FaultTolerantQuantumContainer(self.pattern_name, [self.primary_channel, self.comparator_channel], accept)
+        # A comparison needs both channels, so the container cannot degrade
+        return FaultTolerantQuantumContainer(self.pattern_name, [self.primary_channel, self.comparator_channel], accept,
+                                             unavailable_channels_policy=self.unavailable_channels_policy)
 
 class SparingPatternBuilder(FaultTolerantPatternBuilder):
     def __init__(self, pattern_name) -> None:
@@ -143,8 +164,7 @@ class SparingPatternBuilder(FaultTolerantPatternBuilder):
         if len(self.spares) < 1:
             raise Exception("There must be at least one spare")
         
-        self.qswitch.operational = self.operational
-        self.qswitch.spares = self.spares
+        self.qswitch.set_units(self.operational, self.spares)
 
         qswitch_units = [self.operational] + self.spares
         all_set = all(qswitch_unit.fault_detector != None for qswitch_unit in qswitch_units)
@@ -159,7 +179,11 @@ class SparingPatternBuilder(FaultTolerantPatternBuilder):
             raise Exception("The assignment between channels and error detection components is not valid")
         
         channels = [channel for qswitch_unit in qswitch_units for channel in qswitch_unit.get_channels()]
-        return FaultTolerantQuantumContainer(self.pattern_name, channels, self.qswitch.switch_if_necessary)
+        return FaultTolerantQuantumContainer(self.pattern_name, channels, self.qswitch.switch_if_necessary,
+                                             channel_restriction=self.qswitch.available_channels,
+                                             restricted_aggregator=self.qswitch.switch_among_available,
+                                             unavailable_channels_policy=self.unavailable_channels_policy,
+                                             sequence_aggregator=self.qswitch.aggregate_sequence)
     
 class ConformalMeasurementsBuilder(FaultTolerantPatternBuilder):
     def __init__(self, pattern_name) -> None:
@@ -167,6 +191,7 @@ class ConformalMeasurementsBuilder(FaultTolerantPatternBuilder):
         self.channels = []
         self.top_n_rate = None
         self.conformity_threshold = None
+        self.agreement_multiplier = agreement_multiplier
 
     def add_channel(self, channel):
         self.channels.append(channel)
@@ -176,6 +201,10 @@ class ConformalMeasurementsBuilder(FaultTolerantPatternBuilder):
         self.top_n_rate = top_n_rate
         return self
     
+    def with_agreement_multiplier(self, agreement_multiplier):
+        self.agreement_multiplier = agreement_multiplier
+        return self
+
     def with_min_conformity(self, conformity_threshold):
         self.conformity_threshold = conformity_threshold
         return self
@@ -208,7 +237,7 @@ class ConformalMeasurementsBuilder(FaultTolerantPatternBuilder):
             top_n = min(top_n, max_top_n)
             top_n = max(top_n, min_top_n)
 
-            agreement_threshold = (int) (agreement_multiplier * top_n)
+            agreement_threshold = (int) (self.agreement_multiplier * top_n)
             if agreement_threshold < 1:
                 agreement_threshold = 1
 
@@ -217,4 +246,9 @@ class ConformalMeasurementsBuilder(FaultTolerantPatternBuilder):
             conformity = calculate_conformity(conformal_sets, top_n)
             return Measurements(None, votes, accepted=conformity >= self.conformity_threshold)
 
-        return FaultTolerantQuantumContainer(self.pattern_name, self.channels, conformal_based_majority_voting)
+        # Conformal sets can only agree if there are at least two of them
+        return FaultTolerantQuantumContainer(self.pattern_name, self.channels, conformal_based_majority_voting,
+                                             ConformalVotingBatch(self.top_n_rate, self.conformity_threshold, self.agreement_multiplier),
+                                             channel_restriction=lambda channels: channels if len(channels) >= 2 else None,
+                                             restricted_aggregator=conformal_based_majority_voting,
+                                             unavailable_channels_policy=self.unavailable_channels_policy)
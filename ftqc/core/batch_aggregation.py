@@ -0,0 +1,183 @@
+import numpy as np
+from math import exp
+from multiprocessing import get_context, shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from core.entities import Measurements
+from core.conformal_measurements import agreement_multiplier, max_top_n, min_top_n
+
+COUNTS = 0
+ORDER = 1
+
+class MeasurementTensor:
+    '''Measurements of many circuits by the channels of a container as a (counts, order) x circuits x channels x states tensor.
+    States that have not been measured are NaN. The order keeps the position of each state in the counts of its channel,
+    so that ties are ranked as by Measurements.rank.'''
+    def __init__(self, data, states) -> None:
+        self.data = data
+        self.states = states
+
+    def from_measurements(measurements_per_circuit):
+        states = sorted({state for measurements in measurements_per_circuit for m in measurements for state in m.get_measured_states()})
+        state_idxs = {state: i for i, state in enumerate(states)}
+        num_channels = max((len(measurements) for measurements in measurements_per_circuit), default=0)
+
+        data = np.full((2, len(measurements_per_circuit), num_channels, len(states)), np.nan)
+        for c, measurements in enumerate(measurements_per_circuit):
+            for k, m in enumerate(measurements):
+                for position, (state, count) in enumerate(m.measurements.items()):
+                    data[COUNTS, c, k, state_idxs[state]] = count
+                    data[ORDER, c, k, state_idxs[state]] = position
+        return MeasurementTensor(data, states)
+
+class LinearOpinionPoolBatch:
+    '''Batched LinearOpinionPool, the weights are given in the order of the channels of the container, either for all
+    circuits or as a circuits x channels matrix'''
+    def __init__(self, weights) -> None:
+        self.weights = np.asarray(weights, dtype=float)
+
+    def with_expected_fidelities(self, measurements_per_circuit):
+        '''Weights scaled per circuit by the expected fidelity of the measurements, as by LinearOpinionPool.weights_for'''
+        if all(m.expected_fidelity == None for measurements in measurements_per_circuit for m in measurements):
+            return self
+
+        weights = np.tile(self.weights, (len(measurements_per_circuit), 1))
+        for c, measurements in enumerate(measurements_per_circuit):
+            if any(m.expected_fidelity == None for m in measurements):
+                continue
+            scaled = self.weights * np.asarray([m.expected_fidelity for m in measurements], dtype=float)
+            if scaled.sum() > 0:
+                weights[c] = scaled * self.weights.sum() / scaled.sum()
+        return LinearOpinionPoolBatch(weights)
+
+    def for_circuits(self, start, end):
+        return self if self.weights.ndim == 1 else LinearOpinionPoolBatch(self.weights[start:end])
+
+    def aggregate(self, counts, order):
+        present = ~np.isnan(counts)
+        weights = self.weights[None, :, None] if self.weights.ndim == 1 else self.weights[:, :, None]
+        votes = np.round(np.nan_to_num(counts) * weights).sum(axis=1)
+        return votes, present.any(axis=1), np.ones(len(counts), dtype=bool)
+
+class ConformalVotingBatch:
+    '''Batched conformal based linear opinion pool as built by the ConformalMeasurementsBuilder'''
+    def __init__(self, top_n_rate, conformity_threshold, agreement_multiplier=agreement_multiplier) -> None:
+        self.top_n_rate = top_n_rate
+        self.conformity_threshold = conformity_threshold
+        self.agreement_multiplier = agreement_multiplier
+
+    def with_expected_fidelities(self, measurements_per_circuit):
+        # Conformal voting weights the agreements of the channels, not the channels themselves
+        return self
+
+    def for_circuits(self, start, end):
+        return self
+
+    def aggregate(self, counts, order):
+        num_circuits, num_channels, num_states = counts.shape
+        if num_channels < 2:
+            raise Exception("There must be at least two mearuements.")
+
+        votes = np.zeros((num_circuits, num_states))
+        voted = np.zeros((num_circuits, num_states), dtype=bool)
+        accepted = np.zeros(num_circuits, dtype=bool)
+        for c in range(num_circuits):
+            present = ~np.isnan(counts[c])
+            values = np.nan_to_num(counts[c])
+
+            top_n = int(np.count_nonzero(present.any(axis=0)) * self.top_n_rate)
+            top_n = max(min(top_n, max_top_n), min_top_n)
+            agreement_threshold = max(int(self.agreement_multiplier * top_n), 1)
+
+            conformal_sets = []
+            for k in range(num_channels):
+                idxs = np.flatnonzero(present[k])
+                ranked = idxs[np.lexsort((order[c, k, idxs], -values[k, idxs]))][:top_n]
+                conformal_set = np.zeros(num_states, dtype=bool)
+                conformal_set[ranked] = True
+                conformal_sets.append(conformal_set)
+
+            # Pairs in the order of the ConformalSetsIterator, so the score is summed up identically
+            score = 0
+            agreements = []
+            for i in range(num_channels - 1):
+                for j in range(i + 1, num_channels):
+                    intersection = conformal_sets[i] & conformal_sets[j]
+                    agreement_strength = int(np.count_nonzero(intersection))
+                    score += (2 * agreement_strength / top_n) - 1
+                    if agreement_strength >= agreement_threshold:
+                        agreements.append((intersection, values[i] + values[j], agreement_strength))
+
+            weights_total = sum(strength for _, _, strength in agreements)
+            for intersection, raw_counts, strength in agreements:
+                votes[c] += np.where(intersection, np.round(raw_counts * (strength / weights_total)), 0.0)
+                voted[c] |= intersection
+
+            accepted[c] = 1 / (1 + exp(-score)) >= self.conformity_threshold
+
+        return votes, voted, accepted
+
+def _aggregate_slice(aggregator, input_name, input_shape, output_name, output_shape, start, end):
+    input_memory = shared_memory.SharedMemory(name=input_name)
+    output_memory = shared_memory.SharedMemory(name=output_name)
+    try:
+        data = np.ndarray(input_shape, dtype=float, buffer=input_memory.buf)
+        output = np.ndarray(output_shape, dtype=float, buffer=output_memory.buf)
+        votes, present, accepted = aggregator.for_circuits(start, end).aggregate(data[COUNTS, start:end], data[ORDER, start:end])
+        output[0, start:end] = votes
+        output[1, start:end] = present
+        return accepted.tolist()
+    finally:
+        input_memory.close()
+        output_memory.close()
+
+class BatchAggregator:
+    '''Aggregates the measurements of many circuits at once. With several processes the tensor is placed in shared memory and
+    each process aggregates a slice of circuits. The circuits are aggregated independently, so the result does not depend on
+    the number of processes.'''
+    def __init__(self, processes=1, min_circuits_per_process=8) -> None:
+        self.processes = processes
+        self.min_circuits_per_process = min_circuits_per_process
+        self.executor = None
+
+    def aggregate(self, batch_aggregation, measurements_per_circuit):
+        '''Returns the aggregated measurements in the order of the circuits'''
+        batch_aggregation = batch_aggregation.with_expected_fidelities(measurements_per_circuit)
+        tensor = MeasurementTensor.from_measurements(measurements_per_circuit)
+        num_circuits = len(measurements_per_circuit)
+
+        num_slices = min(self.processes, num_circuits // self.min_circuits_per_process)
+        if num_slices <= 1:
+            votes, present, accepted = batch_aggregation.aggregate(tensor.data[COUNTS], tensor.data[ORDER])
+        else:
+            votes, present, accepted = self._aggregate_in_processes(batch_aggregation, tensor, num_slices)
+
+        return [Measurements(None, {tensor.states[s]: float(votes[c, s]) for s in np.flatnonzero(present[c])}, accepted=bool(accepted[c]))
+                for c in range(num_circuits)]
+
+    def _aggregate_in_processes(self, batch_aggregation, tensor, num_slices):
+        if self.executor == None:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=get_context("spawn"))
+
+        output_shape = (2, tensor.data.shape[1], tensor.data.shape[3])
+        input_memory = shared_memory.SharedMemory(create=True, size=max(tensor.data.nbytes, 1))
+        output_memory = shared_memory.SharedMemory(create=True, size=max(8 * int(np.prod(output_shape)), 1))
+        try:
+            np.ndarray(tensor.data.shape, dtype=float, buffer=input_memory.buf)[:] = tensor.data
+
+            bounds = np.linspace(0, tensor.data.shape[1], num_slices + 1).astype(int)
+            futures = [self.executor.submit(_aggregate_slice, batch_aggregation, input_memory.name, tensor.data.shape,
+                                            output_memory.name, output_shape, bounds[i], bounds[i + 1]) for i in range(num_slices)]
+            accepted = [a for future in futures for a in future.result()]
+
+            output = np.ndarray(output_shape, dtype=float, buffer=output_memory.buf).copy()
+            return output[0], output[1].astype(bool), np.asarray(accepted, dtype=bool)
+        finally:
+            input_memory.close()
+            input_memory.unlink()
+            output_memory.close()
+            output_memory.unlink()
+
+    def close(self):
+        if self.executor != None:
+            self.executor.shutdown()
+            self.executor = None
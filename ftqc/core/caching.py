@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+from os.path import join, exists
+
+DEFAULT_SIMULATOR_SEED = 42
+
+execution_cache = None
+
+def use_execution_cache(cache):
+    '''Sets the cache consulted by all local simulated devices before submitting a batch, None executes every circuit'''
+    global execution_cache
+    execution_cache = cache
+
+def circuit_fingerprint(qiskit_circuit):
+    '''Content hash of a circuit that is stable across processes and nodes, None if the circuit cannot be exported'''
+    from qiskit.exceptions import QiskitError
+
+    try:
+        qasm = qiskit_circuit.qasm()
+    except QiskitError:
+        return None
+    return hashlib.sha256(qasm.encode()).hexdigest()
+
+class TranspilationCache:
+    '''Caches transpiled circuits by the content of the original circuit and the variant key of the channel.
+    If a directory is given, the transpilations are also stored on disk, so they are shared between processes.'''
+    def __init__(self, cache_dir=None) -> None:
+        self.cache_dir = cache_dir
+        self.transpilations = {}
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir != None and not exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_or_create(self, circuit, channel):
+        fingerprint = circuit_fingerprint(circuit.qiskit_circuit)
+        if fingerprint == None:
+            self.misses += 1
+            return channel.create_variant_of(circuit)
+
+        key = hashlib.sha256(repr((fingerprint, channel.variant_key())).encode()).hexdigest()
+        transpilation = self._lookup(key)
+        if transpilation == None:
+            self.misses += 1
+            transpilation = channel.create_variant_of(circuit)
+            if transpilation == None:
+                return None
+            self._store(key, transpilation)
+        else:
+            self.hits += 1
+
+        # Channels sharing a transpilation rename it, so each of them must obtain its own copy
+        return transpilation.copy()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def _lookup(self, key):
+        if key in self.transpilations.keys():
+            return self.transpilations[key]
+
+        if self.cache_dir == None:
+            return None
+
+        cache_file = join(self.cache_dir, key + ".pkl")
+        if not exists(cache_file):
+            return None
+
+        try:
+            with open(cache_file, "rb") as f:
+                transpilation = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        self.transpilations[key] = transpilation
+        return transpilation
+
+    def _store(self, key, transpilation):
+        self.transpilations[key] = transpilation
+
+        if self.cache_dir == None:
+            return
+
+        # Write to a temporary file first, as other processes may read the cache concurrently
+        cache_file = join(self.cache_dir, key + ".pkl")
+        tmp_file = cache_file + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(transpilation, f)
+        os.replace(tmp_file, cache_file)
+
+class ExecutionResultCache:
+    '''Caches the counts of circuits executed on local simulated devices by the content of the transpiled circuit, the noise
+    of the device, the shots and the simulator seed, which the cache pins for all executions. Aer offsets the seed by the
+    position of a circuit in its job, so the cached counts are those of the run that executed the circuit first. Equal
+    circuits within a batch are told apart by their occurrence, so they keep being sampled independently. Real hardware is
+    never cached. If a directory is given, the counts are also stored on disk, so later runs reuse them.'''
+    def __init__(self, cache_dir=None, max_entries=100000, max_disk_mb=None, seed_simulator=DEFAULT_SIMULATOR_SEED) -> None:
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_mb = max_disk_mb
+        self.seed_simulator = seed_simulator
+        self.counts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_bytes = 0
+
+        if self.cache_dir != None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.disk_bytes = sum(os.path.getsize(join(self.cache_dir, name)) for name in os.listdir(self.cache_dir) if name.endswith(".json"))
+
+    def execute_batch(self, device, circuits, execute):
+        '''Executes the circuits whose counts are not cached with execute and returns the counts of all circuits'''
+        from core.exact_execution import PseudoCountsResult
+
+        noise_fingerprint = device.noise_fingerprint() if device.is_simulated() else None
+        if noise_fingerprint == None:
+            return execute(circuits)
+
+        cached = {}
+        missing = []
+        occurrences = {}
+        for circuit in circuits:
+            key = self._key(circuit, device, noise_fingerprint, occurrences)
+            counts = self._lookup(key) if key != None else None
+            if counts == None:
+                self.misses += 1
+                missing.append((circuit, key))
+            else:
+                self.hits += 1
+                cached[circuit.qiskit_circuit.name] = counts
+
+        result = execute([circuit for circuit, _ in missing]) if len(missing) > 0 else None
+        for circuit, key in missing:
+            if key != None:
+                self._store(key, dict(result.get_counts(circuit.qiskit_circuit)))
+        return PseudoCountsResult(cached, result)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def statistics(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate(), "evictions": self.evictions,
+                "entries": len(self.counts), "disk_mb": self.disk_bytes / 1024 ** 2}
+
+    def _key(self, circuit, device, noise_fingerprint, occurrences):
+        from core import exact_execution
+
+        fingerprint = circuit_fingerprint(circuit.qiskit_circuit)
+        if fingerprint == None:
+            return None
+
+        # Identical circuits of a batch, e.g. of channels with the same transpilation, are told apart by their position,
+        # which follows the order of the containers and of their channels
+        occurrence = occurrences.get(fingerprint, 0)
+        occurrences[fingerprint] = occurrence + 1
+        # Exact and sampled execution give different counts for the same circuit
+        exact_max_qubits = exact_execution.exact_executor.max_qubits if exact_execution.exact_executor != None else None
+        return hashlib.sha256(repr((fingerprint, device.unique_name, noise_fingerprint, device.shots, self.seed_simulator,
+                                    exact_max_qubits, occurrence)).encode()).hexdigest()
+
+    def _lookup(self, key):
+        if key in self.counts.keys():
+            self.counts.move_to_end(key)
+            return self.counts[key]
+
+        if self.cache_dir == None:
+            return None
+
+        cache_file = join(self.cache_dir, key + ".json")
+        try:
+            with open(cache_file, "r") as f:
+                counts = json.load(f)
+            # The modification time orders the files for eviction
+            os.utime(cache_file)
+        except (OSError, ValueError):
+            return None
+
+        self._remember(key, counts)
+        return counts
+
+    def _store(self, key, counts):
+        self._remember(key, counts)
+
+        if self.cache_dir == None:
+            return
+
+        # Write to a temporary file first, as other processes may read the cache concurrently
+        cache_file = join(self.cache_dir, key + ".json")
+        tmp_file = cache_file + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(counts, f)
+        os.replace(tmp_file, cache_file)
+        self.disk_bytes += os.path.getsize(cache_file)
+
+        if self.max_disk_mb != None and self.disk_bytes > self.max_disk_mb * 1024 ** 2:
+            self._evict_from_disk()
+
+    def _remember(self, key, counts):
+        self.counts[key] = counts
+        self.counts.move_to_end(key)
+        while len(self.counts) > self.max_entries:
+            self.counts.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_from_disk(self):
+        '''Removes the least recently used files until the cache takes at most 90% of its limit'''
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                try:
+                    stat = os.stat(join(self.cache_dir, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+
+        self.disk_bytes = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if self.disk_bytes <= 0.9 * self.max_disk_mb * 1024 ** 2:
+                break
+            try:
+                os.remove(join(self.cache_dir, name))
+            except OSError:
+                continue
+            self.disk_bytes -= size
+            self.evictions += 1
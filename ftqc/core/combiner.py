@@ -13,10 +13,33 @@ class LinearOpinionPool(MeasurementCombiner):
         uniform_weights = { qchannel:1/n for qchannel in qchannels }
         return LinearOpinionPool(uniform_weights)
     
+    def restricted_to(self, qchannels):
+        '''Pool over a subset of the channels, the weights are renormalized to sum up to the same total'''
+        total = sum(self.weights.values())
+        restricted_total = sum(self.weights[qchannel] for qchannel in qchannels)
+        return LinearOpinionPool({qchannel: self.weights[qchannel] * total / restricted_total for qchannel in qchannels})
+
+    def weights_for(self, measurements):
+        '''Weights scaled by the expected fidelity of the measurements and renormalized to the same total, unchanged if not all of them have been estimated'''
+        if any(m.expected_fidelity == None for m in measurements):
+            return self.weights
+
+        scaled = {m.generated_from_channel: self.weights[m.generated_from_channel] * m.expected_fidelity for m in measurements}
+        scaled_total = sum(scaled.values())
+        if scaled_total <= 0:
+            return self.weights
+        total = sum(self.weights[m.generated_from_channel] for m in measurements)
+        return {qchannel: weight * total / scaled_total for qchannel, weight in scaled.items()}
+
+    def batch_for(self, qchannels):
+        from core.batch_aggregation import LinearOpinionPoolBatch
+        return LinearOpinionPoolBatch([self.weights[qchannel] for qchannel in qchannels])
+
     def combine(self, measurements):
         self.assert_equal_devices(measurements)
         
         combined_measurements = {}
+        weights = self.weights_for(measurements)
 
         measured_states = set()
         for m in measurements:
@@ -26,7 +49,7 @@ class LinearOpinionPool(MeasurementCombiner):
             normalized_counts = 0.0
             for measurement in measurements:
                 count = measurement.get_count_for(measured_state)
-                weight = self.weights[measurement.generated_from_channel]
+                weight = weights[measurement.generated_from_channel]
                 normalized_counts += round(count * weight) 
             
             combined_measurements[measured_state] = normalized_counts
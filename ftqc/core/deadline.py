@@ -0,0 +1,126 @@
+import heapq
+import json
+from os.path import join
+
+# Shot-layers per second of devices without calibration data, e.g. local simulators
+DEFAULT_THROUGHPUT = 1e6
+
+class DeadlinePlanner:
+    '''Runs fewer channels per container so that a run fits into a time budget in seconds or a budget of shots. The time
+    of a channel is estimated from the depth of its transpiled circuit, the shots of its device and the throughput of the
+    device, given in shot-layers per second by throughputs or derived from the calibration of the backend. Channels are
+    dropped from the end of a container, i.e. spares before the operational unit and channels in reverse order of their
+    registration, as long as the channel restriction of the pattern still accepts the remaining channels. The drop that
+    saves the most is taken first over all containers. Containers without a channel restriction always run all channels.'''
+    def __init__(self, time_budget=None, shot_budget=None, throughputs=None, report_dir=None) -> None:
+        self.time_budget = time_budget
+        self.shot_budget = shot_budget
+        self.throughputs = throughputs if throughputs != None else {}
+        self.report_dir = report_dir
+        self.device_timings = {}
+        self.spent_time = 0.0
+        self.spent_shots = 0
+        self.dropped = []
+        self.exceeded = False
+
+    def estimate(self, channel, transpiled_circuit):
+        '''Estimated seconds and shots of running the transpiled circuit on the device of the channel'''
+        device = channel.device
+        shots = device.shots if device.shots != None else 1
+        depth = transpiled_circuit.qiskit_circuit.depth()
+
+        if device.unique_name in self.throughputs.keys():
+            return (shots * depth / self.throughputs[device.unique_name], shots)
+        if device.unique_name not in self.device_timings.keys():
+            self.device_timings[device.unique_name] = device.calibration().seconds_per_layer_and_shot()
+        timing = self.device_timings[device.unique_name]
+        if timing == None:
+            return (shots * depth / DEFAULT_THROUGHPUT, shots)
+        layer_time, overhead = timing
+        return (shots * (depth * layer_time + overhead), shots)
+
+    def plan(self, orchestrations, num_remaining=1):
+        '''Orchestrations (circuit, container, transpiled circuits) restricted to the channels that fit into the budget.
+        If the orchestrations are only a part of the run, e.g. a circuit of a pipeline, they get the share of the remaining
+        budget of one of the num_remaining parts.'''
+        time_budget = (self.time_budget - self.spent_time) / num_remaining if self.time_budget != None else None
+        shot_budget = (self.shot_budget - self.spent_shots) / num_remaining if self.shot_budget != None else None
+
+        costs = [{channel: self.estimate(channel, transpiled_circuit) for channel, transpiled_circuit in transpiled_circuits.items()}
+                 for _, _, transpiled_circuits in orchestrations]
+        selected = [list(transpiled_circuits.keys()) for _, _, transpiled_circuits in orchestrations]
+        total_time = sum(cost[0] for orchestration_costs in costs for cost in orchestration_costs.values())
+        total_shots = sum(cost[1] for orchestration_costs in costs for cost in orchestration_costs.values())
+
+        def over_budget():
+            return (time_budget != None and total_time > time_budget) or (shot_budget != None and total_shots > shot_budget)
+
+        def next_drop(i):
+            container = orchestrations[i][1]
+            channels = selected[i]
+            if container.channel_restriction == None:
+                return None
+            for channel in reversed(channels):
+                remaining = container.channel_restriction([c for c in channels if c != channel])
+                if remaining != None:
+                    removed = [c for c in channels if c not in remaining]
+                    saving = (sum(costs[i][c][0] for c in removed), sum(costs[i][c][1] for c in removed))
+                    return (remaining, removed, saving)
+            return None
+
+        def priority(saving):
+            # Time is the scarce resource if there is a time budget, shots otherwise
+            return -saving[0] if time_budget != None and total_time > time_budget else -saving[1]
+
+        candidates = []
+        drops = {}
+        if over_budget():
+            for i in range(len(orchestrations)):
+                drops[i] = next_drop(i)
+                if drops[i] != None:
+                    heapq.heappush(candidates, (priority(drops[i][2]), i))
+
+        while over_budget() and len(candidates) > 0:
+            _, i = heapq.heappop(candidates)
+            remaining, removed, saving = drops[i]
+            circuit, container, _ = orchestrations[i]
+            selected[i] = remaining
+            total_time -= saving[0]
+            total_shots -= saving[1]
+            for channel in removed:
+                self.dropped.append({"circuit": circuit.id, "container": container.id, "channel": channel.id,
+                                     "device": channel.device.unique_name, "seconds": costs[i][channel][0], "shots": costs[i][channel][1]})
+
+            drops[i] = next_drop(i)
+            if drops[i] != None:
+                heapq.heappush(candidates, (priority(drops[i][2]), i))
+
+        if over_budget() and not self.exceeded:
+            print("Deadline: the budget cannot be met without running fewer channels than the patterns require")
+            self.exceeded = True
+
+        self.spent_time += total_time
+        self.spent_shots += total_shots
+        return [(circuit, container, {channel: transpiled_circuits[channel] for channel in channels})
+                for (circuit, container, transpiled_circuits), channels in zip(orchestrations, selected)]
+
+    def report(self):
+        print("Deadline: {0} channel executions dropped, estimated {1:.2f}s and {2} shots are run".format(
+            len(self.dropped), self.spent_time, int(self.spent_shots)))
+        dropped_per_container = {}
+        for entry in self.dropped:
+            dropped_per_container.setdefault(entry["container"], {}).setdefault(entry["channel"], 0)
+            dropped_per_container[entry["container"]][entry["channel"]] += 1
+        for container_id, channels in dropped_per_container.items():
+            for channel_id, count in channels.items():
+                print("Container " + container_id + " has dropped channel " + channel_id + " for " + str(count) + " circuits")
+
+        if self.report_dir == None:
+            return None
+
+        report_file = join(self.report_dir, "deadline_report.json")
+        with open(report_file, "w") as f:
+            json.dump({"time_budget": self.time_budget, "shot_budget": self.shot_budget, "estimated_time": self.spent_time,
+                       "estimated_shots": self.spent_shots, "budget_exceeded": self.exceeded, "dropped": self.dropped}, f, indent=4)
+        print("Deadline report has been written to file: " + report_file)
+        return report_file
@@ -1,11 +1,16 @@
-from qiskit import Aer, execute
-from qiskit_aer.noise import NoiseModel, depolarizing_error
-from qiskit.circuit import QuantumCircuit
-from qiskit.exceptions import QiskitError
+import queue
+import threading
+import time
+from collections import deque
 from math import ceil
+from core import caching, execution_profile, exact_execution, memory_profile
+
+# qiskit and Aer are imported where they are needed, so that working with stored results does not load them
 
 class Circuit:
     def __init__(self, id, qiskit_circuit) -> None:
+        from qiskit.circuit import QuantumCircuit
+
         self.id = id
 
         if not isinstance(qiskit_circuit, QuantumCircuit):
@@ -18,10 +23,12 @@ class Circuit:
         return False
 
 class Measurements:
-    def __init__(self, generated_from_channel, measurements, accepted=True) -> None:
+    def __init__(self, generated_from_channel, measurements, accepted=True, expected_fidelity=None) -> None:
         self.generated_from_channel = generated_from_channel
         self.measurements = measurements
         self.accepted = accepted
+        # Fidelity the channel was expected to reach before execution, None if it has not been estimated
+        self.expected_fidelity = expected_fidelity
         self.num_counts = sum(count for count in measurements.values())
 
     def get_measured_states(self):
@@ -49,6 +56,8 @@ class QuantumDevice:
     def __init__(self, unique_name, shots) -> None:
         self.unique_name = unique_name
         self.shots = shots
+        # Devices of a registry get their calibration from it, others parse the calibration of their backend
+        self.calibration_source = None
 
     def __eq__(self, __value: object) -> bool:
         if isinstance(__value, QuantumDevice):
@@ -73,8 +82,70 @@ class QuantumDevice:
         '''Executes a batch of qiskit circuits on the device'''
         pass
 
+    def submit_batch(self, circuits):
+        '''Submits a batch of qiskit circuits to the device without waiting for the result and returns the job'''
+        pass
+
+    def is_simulated(self):
+        '''Whether the device is simulated locally rather than being real hardware'''
+        return False
+
+    def calibration(self):
+        '''DeviceCalibration of the backend of the device'''
+        if self.calibration_source != None:
+            return self.calibration_source(self.unique_name)
+        from provider.device_registry import DeviceCalibration
+        return DeviceCalibration.from_backend(self.get_backend())
+
+    def _tune_execution(self, circuits):
+        tuner = execution_profile.execution_tuner
+        if tuner == None or not self.is_simulated():
+            return None
+        return tuner.tune(circuits, self.shots)
+
+    def _record_execution(self, profile, circuits, elapsed):
+        if profile != None and execution_profile.execution_tuner != None:
+            execution_profile.execution_tuner.record(self, profile, circuits, self.shots, elapsed)
+
+    def exact_simulator(self):
+        '''Density matrix simulator with the noise of the device, only needed by simulated devices'''
+        pass
+
+    def stand_in(self):
+        '''Local device that can run the circuits of this device with comparable noise, None if there is none'''
+        return None
+
+    def noise_fingerprint(self):
+        '''Identifies the noise of a simulated device, results are only cached for devices that provide it'''
+        return None
+
+    def _run_options(self, profile):
+        run_options = profile.run_options() if profile != None else {}
+        if caching.execution_cache != None and self.is_simulated():
+            run_options["seed_simulator"] = caching.execution_cache.seed_simulator
+        return run_options
+
+    def _execute_tuned(self, circuits):
+        if caching.execution_cache != None and self.is_simulated():
+            return caching.execution_cache.execute_batch(self, circuits, self._execute_uncached)
+        return self._execute_uncached(circuits)
+
+    def _execute_uncached(self, circuits):
+        if exact_execution.exact_executor != None and self.is_simulated():
+            return exact_execution.exact_executor.execute_batch(self, circuits, self._execute_sampled)
+        return self._execute_sampled(circuits)
+
+    def _execute_sampled(self, circuits):
+        profile = self._tune_execution(circuits)
+        start = time.time()
+        result = self.submit_batch(circuits, profile).result()
+        self._record_execution(profile, circuits, time.time() - start)
+        return result
+
 class QuantumComputerSimulator(QuantumDevice):
     def __init__(self, simulator, noise_model_backend=None, shots=None, custom_noise_model=False) -> None:
+        from qiskit_aer.noise import NoiseModel
+
         super().__init__(simulator.name() if noise_model_backend == None else simulator.name() + "_" + noise_model_backend.name(), shots=shots)
         self.simulator = simulator
         self.noise_model = NoiseModel.from_backend(noise_model_backend, warnings=False) if noise_model_backend != None else None
@@ -84,10 +155,14 @@ class QuantumComputerSimulator(QuantumDevice):
 
 
     def create_perfect_simulator():
+        from qiskit import Aer
+
         simulator = Aer.get_backend('statevector_simulator')
         return QuantumComputerSimulator(simulator)
     
     def create_noisy_simulator(backend=None, shots=1024):
+        from qiskit import Aer
+
         simulator = Aer.get_backend('qasm_simulator')
 
         return QuantumComputerSimulator(simulator, 
@@ -99,15 +174,49 @@ class QuantumComputerSimulator(QuantumDevice):
         return self.simulator
 
     def execute(self, circuit):
+        from qiskit import execute
+
         job = execute(circuit.qiskit_circuit, self.simulator, shots=self.shots, noise_model=self.noise_model)
         return job.result()
     
     def execute_batch(self, circuits):
+        return self._execute_tuned(circuits)
+
+    def submit_batch(self, circuits, profile=None):
+        from qiskit import execute
+
+        profile = profile if profile != None else self._tune_execution(circuits)
+        run_options = self._run_options(profile)
         qiskit_circuits = [c.qiskit_circuit for c in circuits]
-        job = execute(qiskit_circuits, self.simulator, shots=self.shots, noise_model=self.noise_model)
-        return job.result()
+        return execute(qiskit_circuits, self.simulator, shots=self.shots, noise_model=self.noise_model, **run_options)
+
+    def is_simulated(self):
+        return True
+
+    def exact_simulator(self):
+        from qiskit_aer import AerSimulator
+
+        return AerSimulator(method="density_matrix", noise_model=self.noise_model)
+
+    def stand_in(self):
+        from qiskit_aer import AerSimulator
+
+        stand_in = QuantumComputerSimulator(AerSimulator(), shots=self.shots)
+        stand_in.unique_name = self.unique_name + "_stand_in"
+        stand_in.noise_model = self.noise_model
+        return stand_in
+
+    def noise_fingerprint(self):
+        import hashlib
+        import json
+
+        # The noise model may be modified after creation, so it is fingerprinted with every batch
+        noise = json.dumps(self.noise_model.to_dict(serializable=True), sort_keys=True) if self.noise_model != None else None
+        return hashlib.sha256(repr((self.simulator.name(), noise)).encode()).hexdigest()
 
     def modify_noise(self):
+        from qiskit_aer.noise import depolarizing_error
+
         prob_1 = 0.001  # 1-qubit gate
         prob_2 = 0.01   # 2-qubit gate
 
@@ -118,32 +227,110 @@ class QuantumComputerSimulator(QuantumDevice):
         self.noise_model.add_all_qubit_quantum_error(error_2, ['cx'])
 
 class IBMQuantumComputer(QuantumDevice):
-    def __init__(self, backend, shots=4096) -> None:
-        super().__init__(backend.backend_name, shots=shots)
+    def __init__(self, backend, shots=4096, name=None, load_backend=None) -> None:
+        super().__init__(name if name != None else backend.backend_name, shots=shots)
         self.backend = backend
+        self.load_backend = load_backend
         self.shots = shots
 
+    def lazy(name, load_backend, shots=4096):
+        '''Device whose backend is only requested from the provider when it is first needed, e.g. to transpile or execute'''
+        return IBMQuantumComputer(None, shots, name, load_backend)
+
     def execute(self, circuit):
-        job = execute(circuit.qiskit_circuit, self.backend, shots=self.shots)
+        from qiskit import execute
+
+        job = execute(circuit.qiskit_circuit, self.get_backend(), shots=self.shots)
         return job.result()
 
     def execute_batch(self, circuits):
+        return self._execute_tuned(circuits)
+
+    def submit_batch(self, circuits, profile=None):
+        from qiskit import execute
+
+        profile = profile if profile != None else self._tune_execution(circuits)
+        run_options = self._run_options(profile)
         qiskit_circuits = [c.qiskit_circuit for c in circuits]
-        job = execute(qiskit_circuits, self.backend, shots=self.shots)
-        return job.result()
+        return execute(qiskit_circuits, self.get_backend(), shots=self.shots, **run_options)
+
+    def is_simulated(self):
+        from qiskit.providers.fake_provider import FakeBackend, FakeBackendV2
+
+        return isinstance(self.get_backend(), (FakeBackend, FakeBackendV2))
+
+    def exact_simulator(self):
+        from qiskit_aer import AerSimulator
+
+        return AerSimulator.from_backend(self.get_backend(), method="density_matrix")
+
+    def stand_in(self):
+        stand_in = QuantumComputerSimulator.create_noisy_simulator(self.get_backend(), shots=self.shots)
+        stand_in.unique_name = self.unique_name + "_stand_in"
+        return stand_in
+
+    def noise_fingerprint(self):
+        if not self.is_simulated():
+            return None
+
+        # Fake backends are simulated with the noise of their stored calibration
+        backend = self.get_backend()
+        properties = backend.properties()
+        last_update = getattr(properties, "last_update_date", None) if properties != None else None
+        return repr((backend.backend_name, getattr(backend, "backend_version", None), str(last_update)))
     
     def get_backend(self):
+        if self.backend == None:
+            self.backend = self.load_backend()
         return self.backend
 
+SKIP = "skip"
+DEGRADE = "degrade"
+FAIL = "fail"
+
 class FaultTolerantQuantumContainer:
-    def __init__(self, id, channels, measurement_aggregator) -> None:
+    def __init__(self, id, channels, measurement_aggregator, batch_aggregation=None, channel_restriction=None,
+                 restricted_aggregator=None, unavailable_channels_policy=SKIP, sequence_aggregator=None) -> None:
         self.id = id
         self.channels = channels
         self.measurement_aggregator = measurement_aggregator
+        self.batch_aggregation = batch_aggregation
+        self.channel_restriction = channel_restriction
+        self.restricted_aggregator = restricted_aggregator
+        self.unavailable_channels_policy = unavailable_channels_policy
+        # Aggregates the measurements of a sequence of circuits in their order at once, e.g. for switches whose choice depends on the previous circuits
+        self.sequence_aggregator = sequence_aggregator
 
     def aggregate(self, measurements):
+        if len(measurements) < len(self.channels) and self.restricted_aggregator != None:
+            return self.restricted_aggregator(measurements)
         return self.measurement_aggregator(measurements)
 
+    def channels_for(self, available_channels):
+        '''Channels that run a circuit if only the available channels can run it, None if the circuit is skipped.
+        With the degrade policy the pattern decides which of the available channels it can still work with.'''
+        if len(available_channels) == len(self.channels):
+            return self.channels
+
+        if self.unavailable_channels_policy == FAIL:
+            raise Exception("Not all channels of container " + self.id + " can run the circuit")
+        if self.unavailable_channels_policy == DEGRADE and self.channel_restriction != None:
+            return self.channel_restriction([channel for channel in self.channels if channel in available_channels])
+        return None
+
+    def run(self, circuit, executor=None, qdevice_provider=None):
+        '''Runs a single circuit through the container and returns an OnlineRunResult with the aggregated measurements.
+        Without an executor, the one shared by the containers of the provider the devices come from is used.'''
+        from core.online import default_executor
+
+        return (executor if executor != None else default_executor(qdevice_provider)).run(self, circuit)
+
+    async def run_async(self, circuit, executor=None, qdevice_provider=None):
+        '''Like run, concurrent requests are batched into shared device jobs'''
+        from core.online import default_executor
+
+        return await (executor if executor != None else default_executor(qdevice_provider)).run_async(self, circuit)
+
     def broadcast_and_apply(self, circuit):
         return [channel.apply(circuit) for channel in self.channels]
     
@@ -159,11 +346,25 @@ class FaultTolerantQuantumContainer:
         return hash(self.id)
     
 class QuantumContainerOrchestrator:
-    def __init__(self, qcontainers, qdevice_provider, execution_retries=3) -> None:
-        self.orchestrated_containers = set(qcontainers)
+    def __init__(self, qcontainers, qdevice_provider, execution_retries=3, aggregation_processes=None, feasibility_planner=None,
+                 hedging_policy=None, deadline_planner=None, fidelity_estimator=None) -> None:
+        # Containers keep their given order, so identical circuits of a batch are always in the same position
+        self.orchestrated_containers = list(dict.fromkeys(qcontainers))
         self.qdevice_provider = qdevice_provider
         self.aggregated_results = []
         self.execution_retries = execution_retries; 
+        self.aggregation_processes = aggregation_processes
+        self.feasibility_planner = feasibility_planner
+        self.hedging_policy = hedging_policy
+        self.deadline_planner = deadline_planner
+        self.fidelity_estimator = fidelity_estimator
+        self.expected_fidelities = {}
+        # Transpiled circuits of channels that require their specific device, batches containing them are not hedged
+        self.pinned_circuits = set()
+        self.skipped = []
+
+    def has_result_for(self, circuit, container):
+        return any(entry[0] == circuit and entry[1] == container for entry in self.aggregated_results)
 
     def get_result_for(self, circuit, container):
         for entry in self.aggregated_results:
@@ -174,23 +375,74 @@ class QuantumContainerOrchestrator:
 
     def orchestrate_executions(self, circuit_provider):
         orchestrations, partitioned_circuits = self.prepare_for_execution(circuit_provider)
+        memory_profile.checkpoint("transpilation", partitioned_circuits=partitioned_circuits, orchestrations=orchestrations)
         result_manager = self.execute(partitioned_circuits)
+        memory_profile.checkpoint("execution", partitioned_circuits=partitioned_circuits, results=result_manager.results)
         self.aggregate_results(orchestrations, result_manager)
+        memory_profile.checkpoint("aggregation", results=result_manager.results, aggregated_results=self.aggregated_results)
+        if self.hedging_policy != None:
+            self.hedging_policy.report()
 
     def prepare_for_execution(self, circuit_provider):
         orchestrations = []
         partitioned_circuits = {device:[] for c in self.orchestrated_containers for device in c.get_devices()}
         for circuit in circuit_provider.get():
             for container in self.orchestrated_containers:
-                transpiled_circuits = {}
-                for channel in container.channels:
-                    transpiled_circuit = channel.apply(circuit)
-                    transpiled_circuits[channel] = transpiled_circuit
-                    partitioned_circuits[channel.device].append(transpiled_circuit)
-
+                transpiled_circuits = self.transpile_for(circuit, container)
+                if transpiled_circuits == None:
+                    continue
                 orchestrations.append((circuit, container, transpiled_circuits))
+
+        if self.feasibility_planner != None:
+            self.feasibility_planner.report()
+        if self.fidelity_estimator != None:
+            self.fidelity_estimator.report()
+        if self.deadline_planner != None:
+            orchestrations = self.deadline_planner.plan(orchestrations)
+            self.deadline_planner.report()
+
+        for _, _, transpiled_circuits in orchestrations:
+            for channel, transpiled_circuit in transpiled_circuits.items():
+                partitioned_circuits[channel.device].append(transpiled_circuit)
         return (orchestrations, partitioned_circuits)
+
+    def transpile_for(self, circuit, container):
+        '''Transpiled circuits of the channels of the container that run the circuit, None if the container skips it.
+        Channels are left out if the feasibility planner rejects them or if they drop the circuit during transpilation.'''
+        channels = container.channels
+        if self.feasibility_planner != None:
+            channels = self.feasibility_planner.channels_for(circuit, container)
+            if channels == None:
+                self.skipped.append((circuit, container))
+                return None
+
+        transpiled_circuits = {}
+        for channel in channels:
+            transpiled_circuit = channel.apply(circuit)
+            if transpiled_circuit != None:
+                transpiled_circuits[channel] = transpiled_circuit
+            else:
+                print("Channel " + channel.id + " has dropped circuit " + circuit.id)
+
+        if len(transpiled_circuits) < len(channels):
+            remaining = container.channels_for(list(transpiled_circuits.keys())) if len(transpiled_circuits) > 0 else None
+            if remaining == None:
+                print("Circuit " + circuit.id + " is skipped by container " + container.id)
+                self.skipped.append((circuit, container))
+                return None
+            transpiled_circuits = {channel: transpiled_circuits[channel] for channel in remaining}
+
+        if self.fidelity_estimator != None:
+            estimates = self.fidelity_estimator.estimates_for(transpiled_circuits)
+            transpiled_circuits = self.fidelity_estimator.prune(circuit, container, transpiled_circuits, estimates)
+            self.expected_fidelities.update({t_circuit.id: estimates[channel] for channel, t_circuit in transpiled_circuits.items()})
+
+        self.pinned_circuits.update(t_circuit.id for channel, t_circuit in transpiled_circuits.items() if channel.requires_specific_device())
+        return transpiled_circuits
     
+    def measurements_for(self, channel, t_circuit, counts):
+        return Measurements(channel, counts, expected_fidelity=self.expected_fidelities.get(t_circuit.id, None))
+
     def execute(self, partitioned_circuits):
         result_manager = ExecutionResultManager(self.orchestrated_containers)
 
@@ -209,23 +461,29 @@ class QuantumContainerOrchestrator:
                 end_idx = start_idx + max_job_size
                 circuit_batch = circuit_partition[start_idx:end_idx]
                 print("Device: " + device.unique_name +  ", execute batch with size: " + str(len(circuit_batch)))
-                
-                for i in range(self.execution_retries): 
-                    try:
-                        partial_result = device.execute_batch(circuit_batch)
-                        break
-                    except Exception as e:
-                        print("An error occured during executing the circuits: " + str(e))
-                        if (i + 1) == self.execution_retries:
-                            raise Exception("Execution was not successfully")
-                        else:
-                            print("Retry execution")
-
+                partial_result = self.execute_with_retries(device, circuit_batch)
                 result_manager.register(device, partial_result)
         
         return result_manager
 
+    def execute_with_retries(self, device, circuit_batch):
+        for i in range(self.execution_retries): 
+            try:
+                if self.hedging_policy != None:
+                    hedgeable = not any(circuit.id in self.pinned_circuits for circuit in circuit_batch)
+                    return self.hedging_policy.execute(device, circuit_batch, hedgeable)
+                return device.execute_batch(circuit_batch)
+            except Exception as e:
+                print("An error occured during executing the circuits: " + str(e))
+                if (i + 1) == self.execution_retries:
+                    raise Exception("Execution was not successfully")
+                else:
+                    print("Retry execution")
+
     def aggregate_results(self, orchestrations, result_manager):
+        if self.aggregation_processes != None:
+            return self.aggregate_results_batched(orchestrations, result_manager)
+
         for orch in orchestrations:
             original_circuit = orch[0]
             container = orch[1]
@@ -234,22 +492,194 @@ class QuantumContainerOrchestrator:
             measurements = []
             for channel, t_circuit in transpiled_circuits.items():
                 result = result_manager.get_result_for(channel.device, t_circuit)
-                measurements.append(Measurements(channel, result))
+                measurements.append(self.measurements_for(channel, t_circuit, result))
             
             aggregate = container.aggregate(measurements)
             self.aggregated_results.append((original_circuit, container, aggregate, measurements))
 
+    def aggregate_results_batched(self, orchestrations, result_manager):
+        '''Aggregates all circuits of a container at once if the container supports it, the others one after another'''
+        from core.batch_aggregation import BatchAggregator
+
+        measurements_of = []
+        for original_circuit, container, transpiled_circuits in orchestrations:
+            measurements_of.append([self.measurements_for(channel, t_circuit, result_manager.get_result_for(channel.device, t_circuit))
+                                    for channel, t_circuit in transpiled_circuits.items()])
+
+        aggregates = [None] * len(orchestrations)
+        batch_aggregator = BatchAggregator(self.aggregation_processes)
+        try:
+            for container in self.orchestrated_containers:
+                idxs = [i for i, orch in enumerate(orchestrations) if orch[1] == container]
+                # The batch aggregations expect the measurements of all channels in the order of the container
+                batched = [i for i in idxs if len(measurements_of[i]) == len(container.channels)] if container.batch_aggregation != None else []
+                if len(batched) > 0:
+                    batch = batch_aggregator.aggregate(container.batch_aggregation, [measurements_of[i] for i in batched])
+                    for i, aggregate in zip(batched, batch):
+                        aggregates[i] = aggregate
+                if container.sequence_aggregator != None:
+                    remaining = [i for i in idxs if aggregates[i] == None]
+                    for i, aggregate in zip(remaining, container.sequence_aggregator([measurements_of[i] for i in remaining])):
+                        aggregates[i] = aggregate
+                for i in idxs:
+                    if aggregates[i] == None:
+                        aggregates[i] = container.aggregate(measurements_of[i])
+        finally:
+            batch_aggregator.close()
+
+        for orch, aggregate, measurements in zip(orchestrations, aggregates, measurements_of):
+            self.aggregated_results.append((orch[0], orch[1], aggregate, measurements))
+
+class PipelinedContainerOrchestrator(QuantumContainerOrchestrator):
+    '''Overlaps transpilation and execution. Transpiled circuits are queued per device and a batch is submitted as soon as it is
+    full or its oldest circuit has waited max_batch_latency seconds. A circuit is aggregated as soon as the results of all its
+    channels are in, the circuits of a container are still aggregated in order, as aggregators such as switches keep state.'''
+    def __init__(self, qcontainers, qdevice_provider, execution_retries=3, max_batch_size=None, max_batch_latency=5.0, feasibility_planner=None,
+                 hedging_policy=None, deadline_planner=None, fidelity_estimator=None) -> None:
+        super().__init__(qcontainers, qdevice_provider, execution_retries, feasibility_planner=feasibility_planner, hedging_policy=hedging_policy,
+                         deadline_planner=deadline_planner, fidelity_estimator=fidelity_estimator)
+        self.max_batch_size = max_batch_size
+        self.max_batch_latency = max_batch_latency
+        self.timings = {}
+
+    def orchestrate_executions(self, circuit_provider):
+        devices = {device for c in self.orchestrated_containers for device in c.get_devices()}
+        self.device_queues = {device: queue.Queue() for device in devices}
+        self.completions = queue.Queue()
+        self.counts = {}
+        self.execution_times = {device: 0.0 for device in devices}
+
+        executors = [threading.Thread(target=self._run_device, args=(device,), daemon=True) for device in devices]
+        for executor in executors:
+            executor.start()
+
+        # The orchestrations of each container in the order of the circuits
+        pending = {container: deque() for container in self.orchestrated_containers}
+        start = time.time()
+        try:
+            circuits = circuit_provider.get()
+            for i, circuit in enumerate(circuits):
+                orchestrations = []
+                for container in self.orchestrated_containers:
+                    transpiled_circuits = self.transpile_for(circuit, container)
+                    if transpiled_circuits != None:
+                        orchestrations.append((circuit, container, transpiled_circuits))
+                if self.deadline_planner != None:
+                    # The budget that is left is shared by the circuits that are left
+                    orchestrations = self.deadline_planner.plan(orchestrations, num_remaining=len(circuits) - i)
+
+                for circuit, container, transpiled_circuits in orchestrations:
+                    for channel, transpiled_circuit in transpiled_circuits.items():
+                        self.device_queues[channel.device].put(transpiled_circuit)
+                    pending[container].append((circuit, container, transpiled_circuits))
+                self._aggregate_completed(pending, block=False)
+        finally:
+            # Lets the executors submit their remaining circuits and stop
+            for device_queue in self.device_queues.values():
+                device_queue.put(None)
+        self.timings["transpilation"] = time.time() - start
+        if self.feasibility_planner != None:
+            self.feasibility_planner.report()
+        if self.fidelity_estimator != None:
+            self.fidelity_estimator.report()
+        if self.deadline_planner != None:
+            self.deadline_planner.report()
+
+        while any(len(orchestrations) > 0 for orchestrations in pending.values()):
+            self._aggregate_completed(pending, block=True)
+        self.timings["total"] = time.time() - start
+
+        for executor in executors:
+            executor.join()
+        memory_profile.checkpoint("pipeline", aggregated_results=self.aggregated_results)
+
+        print("Pipeline: transpilation took {0:.2f}s, all circuits were aggregated after {1:.2f}s".format(self.timings["transpilation"], self.timings["total"]))
+        for device, elapsed in self.execution_times.items():
+            print("Device: " + device.unique_name + ", busy executing for {0:.2f}s".format(elapsed))
+        if self.hedging_policy != None:
+            self.hedging_policy.report()
+
+    def batch_size_for(self, device):
+        sizes = [size for size in (self.qdevice_provider.max_job_size_for(device), self.max_batch_size) if size != None]
+        return min(sizes) if len(sizes) > 0 else float("inf")
+
+    def _run_device(self, device):
+        device_queue = self.device_queues[device]
+        batch_size = self.batch_size_for(device)
+
+        finished = False
+        while not finished:
+            circuit = device_queue.get()
+            if circuit == None:
+                break
+
+            batch = [circuit]
+            deadline = time.time() + self.max_batch_latency
+            while len(batch) < batch_size:
+                try:
+                    circuit = device_queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if circuit == None:
+                    finished = True
+                    break
+                batch.append(circuit)
+
+            print("Device: " + device.unique_name +  ", execute batch with size: " + str(len(batch)))
+            try:
+                start = time.time()
+                partial_result = self.execute_with_retries(device, batch)
+                self.execution_times[device] += time.time() - start
+                self.completions.put((device, {c.id: partial_result.get_counts(c.qiskit_circuit) for c in batch}))
+            except Exception as e:
+                self.completions.put(e)
+                return
+
+    def _aggregate_completed(self, pending, block):
+        completions = []
+        try:
+            completions.append(self.completions.get(block=block))
+            while True:
+                completions.append(self.completions.get_nowait())
+        except queue.Empty:
+            pass
+
+        for completion in completions:
+            if isinstance(completion, Exception):
+                raise completion
+            device, counts = completion
+            for circuit_id, circuit_counts in counts.items():
+                self.counts[(device, circuit_id)] = circuit_counts
+
+        for orchestrations in pending.values():
+            while len(orchestrations) > 0 and self._is_complete(orchestrations[0]):
+                original_circuit, container, transpiled_circuits = orchestrations.popleft()
+                measurements = [self.measurements_for(channel, t_circuit, self.counts.pop((channel.device, t_circuit.id))) for channel, t_circuit in transpiled_circuits.items()]
+                aggregate = container.aggregate(measurements)
+                self.aggregated_results.append((original_circuit, container, aggregate, measurements))
+
+    def _is_complete(self, orchestration):
+        return all((channel.device, t_circuit.id) in self.counts for channel, t_circuit in orchestration[2].items())
+
 class ExecutionResultManager:
     def __init__(self, containers) -> None:
         self.results = {device:[] for c in containers for device in c.get_devices()}
+        self.found_in = {}
 
     def register(self, device, partial_result):
         self.results[device].append(partial_result)
 
     def get_result_for(self, device, circuit):
-        for device_result in self.results[device]:
+        from qiskit.exceptions import QiskitError
+
+        # Circuits are usually looked up batch after batch, so the search starts at the batch of the previous circuit
+        device_results = self.results[device]
+        start = self.found_in.get(device, 0)
+        for i in list(range(start, len(device_results))) + list(range(start)):
             try:
-                return device_result.get_counts(circuit.qiskit_circuit)
+                counts = device_results[i].get_counts(circuit.qiskit_circuit)
+                self.found_in[device] = i
+                return counts
             except QiskitError:
                 pass
         
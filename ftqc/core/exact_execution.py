@@ -0,0 +1,162 @@
+import numpy as np
+from core.execution_profile import active_qubits
+
+# A density matrix of 12 qubits takes 256MB
+DEFAULT_MAX_EXACT_QUBITS = 10
+# Outcomes expected less than half a time in the shots of a device are left out, as sampling would rarely see them
+MIN_EXPECTED_COUNT = 0.5
+
+exact_executor = None
+
+def use_exact_execution(executor):
+    '''Sets the executor computing exact output distributions on local simulated devices, None samples all circuits'''
+    global exact_executor
+    exact_executor = executor
+
+def final_measurements(qiskit_circuit):
+    '''Pairs of measured qubit and clbit if all measurements are at the end of the circuit, None otherwise'''
+    measured_qubits = set()
+    written_clbits = set()
+    measurements = []
+    for instruction in qiskit_circuit.data:
+        operation = instruction.operation
+        if getattr(operation, "condition", None) != None or len(instruction.clbits) > 0 and operation.name != "measure":
+            return None
+        if any(q in measured_qubits for q in instruction.qubits):
+            if operation.name == "barrier":
+                continue
+            return None
+        if operation.name == "measure":
+            qubit, clbit = instruction.qubits[0], instruction.clbits[0]
+            if clbit in written_clbits:
+                return None
+            measured_qubits.add(qubit)
+            written_clbits.add(clbit)
+            measurements.append((qubit, clbit))
+
+    # Keys of the counts are formed from the classical registers, loose clbits cannot be represented
+    registered = {clbit for creg in qiskit_circuit.cregs for clbit in creg}
+    if len(measurements) == 0 or any(clbit not in registered for _, clbit in measurements):
+        return None
+    return measurements
+
+def readout_errors(noise_model, num_qubits):
+    '''Assignment matrix of each qubit, None if the noise model contains correlated readout errors'''
+    matrices = {}
+    if noise_model == None:
+        return matrices
+
+    default = None
+    for error in noise_model.to_dict()["errors"]:
+        if error["type"] != "roerror":
+            continue
+        if "gate_qubits" not in error.keys():
+            default = np.array(error["probabilities"])
+            continue
+        for qubits in error["gate_qubits"]:
+            if len(qubits) != 1:
+                return None
+            matrices[qubits[0]] = np.array(error["probabilities"])
+
+    if default is not None and default.shape == (2, 2):
+        for qubit in range(num_qubits):
+            matrices.setdefault(qubit, default)
+    elif default is not None:
+        return None
+    return matrices
+
+class PseudoCountsResult:
+    '''Result of a batch whose circuits have been computed exactly or sampled, get_counts behaves like that of qiskit's Result'''
+    def __init__(self, pseudo_counts, sampled_result=None) -> None:
+        self.pseudo_counts = pseudo_counts
+        self.sampled_result = sampled_result
+
+    def get_counts(self, experiment):
+        from qiskit.exceptions import QiskitError
+
+        name = experiment if isinstance(experiment, str) else experiment.name
+        if name in self.pseudo_counts.keys():
+            return self.pseudo_counts[name]
+        if self.sampled_result != None:
+            return self.sampled_result.get_counts(experiment)
+        raise QiskitError("No counts for experiment " + name)
+
+class ExactProbabilityExecutor:
+    '''Computes the noisy output distribution of circuits with at most max_qubits active qubits from their density matrix.
+    Readout errors are applied to the distribution afterwards. The probabilities are scaled to the shots of the device,
+    so they can be used like sampled counts. Outcomes with an expected count below min_expected_count are dropped and the
+    remaining probabilities are scaled up to the shots again. Larger circuits and circuits with mid-circuit measurements
+    are sampled.'''
+    def __init__(self, max_qubits=DEFAULT_MAX_EXACT_QUBITS, min_expected_count=MIN_EXPECTED_COUNT) -> None:
+        self.max_qubits = max_qubits
+        self.min_expected_count = min_expected_count
+        self.simulators = {}
+        self.exact_circuits = 0
+        self.sampled_circuits = 0
+
+    def execute_batch(self, device, circuits, sample):
+        simulator, errors = self._simulator_for(device)
+
+        exact = []
+        sampled = []
+        for circuit in circuits:
+            measurements = final_measurements(circuit.qiskit_circuit) if errors != None else None
+            if measurements != None and active_qubits(circuit.qiskit_circuit) <= self.max_qubits:
+                exact.append((circuit, measurements))
+            else:
+                sampled.append(circuit)
+
+        self.exact_circuits += len(exact)
+        self.sampled_circuits += len(sampled)
+
+        pseudo_counts = {}
+        if len(exact) > 0:
+            probability_circuits = [self._probability_circuit(circuit.qiskit_circuit, measurements) for circuit, measurements in exact]
+            result = simulator.run(probability_circuits).result()
+            for i, (circuit, measurements) in enumerate(exact):
+                probabilities = np.asarray(result.data(i)["probabilities"], dtype=float)
+                pseudo_counts[circuit.qiskit_circuit.name] = self._to_counts(circuit.qiskit_circuit, measurements, probabilities, errors, device.shots)
+
+        return PseudoCountsResult(pseudo_counts, sample(sampled) if len(sampled) > 0 else None)
+
+    def _simulator_for(self, device):
+        if device.unique_name not in self.simulators.keys():
+            simulator = device.exact_simulator()
+            num_qubits = simulator.configuration().n_qubits
+            self.simulators[device.unique_name] = (simulator, readout_errors(simulator.options.noise_model, num_qubits))
+        return self.simulators[device.unique_name]
+
+    def _probability_circuit(self, qiskit_circuit, measurements):
+        circuit = qiskit_circuit.copy_empty_like()
+        for instruction in qiskit_circuit.data:
+            if instruction.operation.name != "measure":
+                circuit.append(instruction)
+        circuit.save_probabilities([qubit for qubit, _ in measurements])
+        return circuit
+
+    def _to_counts(self, qiskit_circuit, measurements, probabilities, errors, shots):
+        num_measured = len(measurements)
+        # Axis 0 belongs to the last measured qubit, as the probabilities are ordered little-endian
+        tensor = probabilities.reshape([2] * num_measured)
+        for j, (qubit, _) in enumerate(measurements):
+            matrix = errors.get(qiskit_circuit.find_bit(qubit).index)
+            if matrix is not None:
+                axis = num_measured - 1 - j
+                tensor = np.moveaxis(np.tensordot(tensor, matrix, axes=([axis], [0])), -1, axis)
+        probabilities = tensor.reshape(-1)
+
+        shots = shots if shots != None else 1024
+        outcomes = np.flatnonzero(probabilities * shots >= self.min_expected_count)
+        if len(outcomes) == 0:
+            outcomes = np.array([np.argmax(probabilities)])
+        scale = shots / probabilities[outcomes].sum()
+
+        clbit_positions = {clbit: j for j, (_, clbit) in enumerate(measurements)}
+        counts = {}
+        for outcome in outcomes:
+            registers = []
+            for creg in reversed(qiskit_circuit.cregs):
+                bits = [(outcome >> clbit_positions[clbit]) & 1 if clbit in clbit_positions.keys() else 0 for clbit in reversed(list(creg))]
+                registers.append("".join(str(bit) for bit in bits))
+            counts[" ".join(registers)] = float(probabilities[outcome]) * scale
+        return counts
@@ -0,0 +1,92 @@
+import json
+import os
+import time
+import psutil
+
+DEFAULT_WIDE_CIRCUIT_QUBITS = 20
+STATEVECTOR_PARALLEL_THRESHOLD = 14
+# Noisy simulation keeps additional buffers besides the statevector
+MEMORY_SAFETY_FACTOR = 2
+
+execution_tuner = None
+
+def use_execution_tuner(tuner):
+    '''Sets the tuner consulted by all local simulated devices before submitting a batch, None uses Aer's defaults'''
+    global execution_tuner
+    execution_tuner = tuner
+
+def active_qubits(qiskit_circuit):
+    '''Number of qubits that are actually simulated, as Aer truncates the idle qubits of circuits transpiled to large devices'''
+    used = set()
+    for instruction in qiskit_circuit.data:
+        if instruction.operation.name not in ("barrier", "delay"):
+            used.update(instruction.qubits)
+    return max(len(used), 1)
+
+def estimate_memory_mb(num_qubits):
+    return MEMORY_SAFETY_FACTOR * 16 * (2 ** num_qubits) / (1024 ** 2)
+
+class ExecutionProfile:
+    def __init__(self, reason, max_parallel_experiments, max_parallel_shots, max_parallel_threads, max_memory_mb, statevector_parallel_threshold=None) -> None:
+        self.reason = reason
+        self.max_parallel_experiments = max_parallel_experiments
+        self.max_parallel_shots = max_parallel_shots
+        self.max_parallel_threads = max_parallel_threads
+        self.max_memory_mb = max_memory_mb
+        self.statevector_parallel_threshold = statevector_parallel_threshold
+
+    def run_options(self):
+        options = {"max_parallel_experiments": self.max_parallel_experiments,
+                   "max_parallel_shots": self.max_parallel_shots,
+                   "max_parallel_threads": self.max_parallel_threads,
+                   "max_memory_mb": self.max_memory_mb}
+        if self.statevector_parallel_threshold != None:
+            options["statevector_parallel_threshold"] = self.statevector_parallel_threshold
+        return options
+
+class ExecutionProfileTuner:
+    '''Chooses Aer's parallelization and memory limit for each batch. Many small circuits are run as parallel experiments,
+    few small circuits with many shots as parallel shots and wide circuits with all threads working on a single statevector.'''
+    def __init__(self, cores=None, memory_fraction=0.8, wide_circuit_qubits=DEFAULT_WIDE_CIRCUIT_QUBITS, log_file=None) -> None:
+        self.cores = cores if cores != None else (psutil.cpu_count(logical=False) or os.cpu_count() or 1)
+        self.memory_fraction = memory_fraction
+        self.wide_circuit_qubits = wide_circuit_qubits
+        self.log_file = log_file
+        self.history = []
+
+    def tune(self, circuits, shots):
+        shots = shots if shots != None else 1024
+        max_memory_mb = int(psutil.virtual_memory().available / (1024 ** 2) * self.memory_fraction)
+        num_qubits = max((active_qubits(c.qiskit_circuit) for c in circuits), default=1)
+        fitting = max(1, int(max_memory_mb // estimate_memory_mb(num_qubits)))
+
+        if num_qubits >= self.wide_circuit_qubits or fitting == 1:
+            return ExecutionProfile("statevector threads", 1, 1, self.cores, max_memory_mb, STATEVECTOR_PARALLEL_THRESHOLD)
+
+        if len(circuits) > 1:
+            experiments = min(len(circuits), self.cores, fitting)
+            shots_per_experiment = max(1, min(self.cores // experiments, fitting // experiments, shots))
+            return ExecutionProfile("parallel experiments", experiments, shots_per_experiment, self.cores, max_memory_mb)
+
+        return ExecutionProfile("parallel shots", 1, min(self.cores, fitting, shots), self.cores, max_memory_mb)
+
+    def record(self, device, profile, circuits, shots, elapsed):
+        shots = shots if shots != None else 1024
+        entry = {"time": time.time(),
+                 "device": device.unique_name,
+                 "num_circuits": len(circuits),
+                 "max_qubits": max((active_qubits(c.qiskit_circuit) for c in circuits), default=0),
+                 "shots": shots,
+                 "elapsed": elapsed,
+                 "circuits_per_second": len(circuits) / elapsed if elapsed > 0 else None,
+                 "shots_per_second": len(circuits) * shots / elapsed if elapsed > 0 else None,
+                 "reason": profile.reason}
+        entry.update(profile.run_options())
+        self.history.append(entry)
+
+        print("Device: " + device.unique_name + ", execution profile: " + profile.reason +
+              ", batch of " + str(len(circuits)) + " circuits took {0:.2f}s".format(elapsed))
+
+        if self.log_file != None:
+            with open(self.log_file, "a") as log:
+                log.write(json.dumps(entry) + "\n")
@@ -0,0 +1,113 @@
+import json
+from os.path import join
+
+# Instructions every backend accepts besides its basis gates
+DIRECTIVES = {"measure", "barrier", "reset", "delay", "snapshot"}
+
+def num_qubits_of(backend):
+    if hasattr(backend, "configuration"):
+        return backend.configuration().n_qubits
+    return backend.num_qubits
+
+def basis_gates_of(backend):
+    if hasattr(backend, "configuration"):
+        return set(getattr(backend.configuration(), "basis_gates", None) or [])
+    return set(backend.operation_names)
+
+def max_shots_of(backend):
+    if hasattr(backend, "configuration"):
+        return getattr(backend.configuration(), "max_shots", None)
+    return None
+
+class FeasibilityPlanner:
+    '''Checks before transpilation whether the device of a channel can run a circuit at all: the circuit must fit into the
+    qubits of the device, every gate must be in the basis of the device or be translatable to it, and the shots and job
+    size of the device must be within the limits of its backend. Channels that cannot run a circuit are left out and the
+    container decides with its policy whether it runs the circuit with the remaining channels or skips it.'''
+    def __init__(self, qdevice_provider, report_dir=None) -> None:
+        self.qdevice_provider = qdevice_provider
+        self.report_dir = report_dir
+        self.device_limits = {}
+        self.translatable = {}
+        self.infeasible = []
+        self.degraded = []
+        self.skipped = []
+
+    def check(self, circuit, channel):
+        '''Reasons why the channel cannot run the circuit, an empty list if it can'''
+        num_qubits, basis_gates, device_reasons = self._limits_of(channel.device)
+        reasons = list(device_reasons)
+
+        qiskit_circuit = circuit.qiskit_circuit
+        if qiskit_circuit.num_qubits > num_qubits:
+            reasons.append("the circuit has {0} qubits, the device only {1}".format(qiskit_circuit.num_qubits, num_qubits))
+
+        for instruction in qiskit_circuit.data:
+            operation = instruction.operation
+            if operation.name in basis_gates or operation.name in DIRECTIVES:
+                continue
+            if not self._is_translatable(operation):
+                reasons.append("gate " + operation.name + " cannot be translated to the basis " + str(sorted(basis_gates)))
+                break
+        return reasons
+
+    def channels_for(self, circuit, container):
+        '''Channels of the container that run the circuit, None if the container skips it'''
+        feasible = []
+        for channel in container.channels:
+            reasons = self.check(circuit, channel)
+            if len(reasons) == 0:
+                feasible.append(channel)
+            else:
+                self.infeasible.append({"circuit": circuit.id, "container": container.id, "channel": channel.id,
+                                        "device": channel.device.unique_name, "reasons": reasons})
+
+        if len(feasible) == len(container.channels):
+            return container.channels
+
+        channels = container.channels_for(feasible)
+        if channels == None:
+            self.skipped.append({"circuit": circuit.id, "container": container.id})
+        else:
+            self.degraded.append({"circuit": circuit.id, "container": container.id, "channels": [channel.id for channel in channels]})
+        return channels
+
+    def report(self):
+        print("Feasibility: {0} infeasible (circuit, channel) pairs, {1} circuits run with fewer channels, {2} circuits skipped".format(
+            len(self.infeasible), len(self.degraded), len(self.skipped)))
+        for entry in self.infeasible:
+            print("Channel " + entry["channel"] + " cannot run circuit " + entry["circuit"] + ": " + "; ".join(entry["reasons"]))
+
+        if self.report_dir == None:
+            return None
+
+        report_file = join(self.report_dir, "feasibility_report.json")
+        with open(report_file, "w") as f:
+            json.dump({"infeasible": self.infeasible, "degraded": self.degraded, "skipped": self.skipped}, f, indent=4)
+        print("Feasibility report has been written to file: " + report_file)
+        return report_file
+
+    def _limits_of(self, device):
+        if device.unique_name not in self.device_limits.keys():
+            backend = device.get_backend()
+            reasons = []
+
+            max_shots = max_shots_of(backend)
+            if max_shots != None and device.shots != None and device.shots > max_shots:
+                reasons.append("the device runs {0} shots, its backend allows at most {1}".format(device.shots, max_shots))
+
+            max_job_size = self.qdevice_provider.max_job_size_for(device)
+            if max_job_size != None and max_job_size < 1:
+                reasons.append("the backend does not accept any circuit per job")
+
+            self.device_limits[device.unique_name] = (num_qubits_of(backend), basis_gates_of(backend), reasons)
+        return self.device_limits[device.unique_name]
+
+    def _is_translatable(self, operation):
+        from qiskit.circuit.equivalence_library import SessionEquivalenceLibrary
+
+        key = (operation.name, operation.num_qubits)
+        if key not in self.translatable.keys():
+            # Gates are unrolled along their definition or translated along the equivalences known to qiskit
+            self.translatable[key] = getattr(operation, "definition", None) != None or SessionEquivalenceLibrary.has_entry(operation)
+        return self.translatable[key]
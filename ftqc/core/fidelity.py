@@ -0,0 +1,88 @@
+import math
+
+# Instructions that neither act on the state nor take time
+DIRECTIVES = {"barrier", "snapshot"}
+
+class FidelityEstimator:
+    '''Estimates before execution how likely a channel runs a circuit without error. The estimate is the product of the
+    success probabilities of all gates and measurements of the transpiled circuit, taken from the calibration of the
+    device, and of the decay of each active qubit over the duration of the circuit, estimated from its depth and the mean
+    gate length. It is not a prediction of the measured distribution, but it ranks the channels of a circuit: routing
+    that adds many CX gates or an unoptimized variant of a deep circuit gets a clearly lower estimate.
+
+    Channels whose estimate is below min_fidelity or below relative_threshold times the best estimate of the container are
+    pruned before execution, as long as the channel restriction of the pattern accepts the remaining channels. The
+    estimates of the channels that run are passed on with their measurements, so that switches try the most promising
+    spare first and linear opinion pools weight the channels by their estimate.'''
+    def __init__(self, min_fidelity=None, relative_threshold=None) -> None:
+        self.min_fidelity = min_fidelity
+        self.relative_threshold = relative_threshold
+        self.calibrations = {}
+        self.pruned = []
+
+    def estimate(self, channel, transpiled_circuit):
+        calibration = self._calibration_of(channel.device)
+        qiskit_circuit = transpiled_circuit.qiskit_circuit
+
+        log_fidelity = 0.0
+        active_qubits = set()
+        for instruction in qiskit_circuit.data:
+            name = instruction.operation.name
+            if name in DIRECTIVES:
+                continue
+            qubits = [qiskit_circuit.find_bit(qubit).index for qubit in instruction.qubits]
+            active_qubits.update(qubits)
+            error = calibration.readout_error(qubits[0]) if name == "measure" else calibration.gate_error(name, qubits)
+            if error >= 1.0:
+                return 0.0
+            log_fidelity += math.log1p(-error)
+
+        if calibration.gate_length != None:
+            duration = qiskit_circuit.depth() * calibration.gate_length
+            for qubit in active_qubits:
+                t2 = calibration.t2_times.get(qubit, None)
+                if t2 != None and t2 > 0:
+                    log_fidelity -= duration / t2
+        return math.exp(log_fidelity)
+
+    def estimates_for(self, transpiled_circuits):
+        return {channel: self.estimate(channel, transpiled_circuit) for channel, transpiled_circuit in transpiled_circuits.items()}
+
+    def prune(self, circuit, container, transpiled_circuits, estimates=None):
+        '''Transpiled circuits of the channels that are worth running, the worst channels are pruned first'''
+        estimates = estimates if estimates != None else self.estimates_for(transpiled_circuits)
+        if container.channel_restriction == None or len(estimates) == 0:
+            return transpiled_circuits
+
+        best = max(estimates.values())
+        def is_bad(channel):
+            return ((self.min_fidelity != None and estimates[channel] < self.min_fidelity) or
+                    (self.relative_threshold != None and estimates[channel] < self.relative_threshold * best))
+
+        channels = [channel for channel in container.channels if channel in transpiled_circuits.keys()]
+        for channel in sorted([channel for channel in channels if is_bad(channel)], key=lambda channel: estimates[channel]):
+            if channel not in channels:
+                continue
+            remaining = container.channel_restriction([c for c in channels if c != channel])
+            if remaining == None:
+                continue
+            for removed in [c for c in channels if c not in remaining]:
+                self.pruned.append({"circuit": circuit.id, "container": container.id, "channel": removed.id,
+                                    "expected_fidelity": estimates[removed], "best_expected_fidelity": best})
+            channels = remaining
+        return {channel: transpiled_circuits[channel] for channel in channels}
+
+    def report(self):
+        print("Fidelity estimation: {0} channel executions pruned".format(len(self.pruned)))
+        pruned_per_channel = {}
+        for entry in self.pruned:
+            key = (entry["container"], entry["channel"])
+            pruned_per_channel[key] = pruned_per_channel.get(key, 0) + 1
+        for (container_id, channel_id), count in pruned_per_channel.items():
+            print("Container " + container_id + " has pruned channel " + channel_id + " for " + str(count) + " circuits")
+        return self.pruned
+
+    def _calibration_of(self, device):
+        if device.unique_name not in self.calibrations.keys():
+            self.calibrations[device.unique_name] = device.calibration()
+        return self.calibrations[device.unique_name]
@@ -0,0 +1,123 @@
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_PERCENTILE = 90
+DEFAULT_MIN_OBSERVATIONS = 3
+
+class HedgingPolicy:
+    '''Submits a duplicate of a batch to a stand-in of its device when the batch runs longer than the given percentile of
+    the job times observed on the device. The primary runs through execute_batch of the device, so exact execution and the
+    execution cache apply to it as without hedging. The result that arrives first is used and the job of the stand-in is
+    cancelled if the primary wins, a straggling primary cannot be cancelled and still fills the cache. Batches
+    containing circuits of channels that require their specific device are never duplicated. Stand-ins are taken from
+    stand_ins by device name or created by the device, e.g. a local simulator with the noise of an IBM backend.'''
+    def __init__(self, percentile=DEFAULT_PERCENTILE, min_observations=DEFAULT_MIN_OBSERVATIONS, stand_ins=None, max_workers=8) -> None:
+        self.percentile = percentile
+        self.min_observations = min_observations
+        self.stand_ins = stand_ins if stand_ins != None else {}
+        self.job_times = {}
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.hedges = []
+
+    def threshold_for(self, device):
+        '''Seconds after which a batch of the device is hedged, None until enough jobs have been observed'''
+        with self.lock:
+            job_times = list(self.job_times.get(device.unique_name, []))
+        if len(job_times) < self.min_observations:
+            return None
+        return float(np.percentile(job_times, self.percentile))
+
+    def stand_in_for(self, device):
+        with self.lock:
+            if device.unique_name not in self.stand_ins.keys():
+                self.stand_ins[device.unique_name] = device.stand_in()
+            return self.stand_ins[device.unique_name]
+
+    def execute(self, device, circuit_batch, hedgeable=True):
+        '''Executes the batch on the device and hedges it on the stand-in of the device if it straggles'''
+        threshold = self.threshold_for(device) if hedgeable else None
+
+        start = time.time()
+        if threshold == None:
+            result = device.execute_batch(circuit_batch)
+            self._observe(device, time.time() - start)
+            return result
+
+        stand_in = self.stand_in_for(device)
+        primary = self.pool.submit(device.execute_batch, circuit_batch)
+        done, _ = wait([primary], timeout=threshold)
+        if primary in done:
+            result = primary.result()
+            self._observe(device, time.time() - start)
+            return result
+
+        print("Device: " + device.unique_name + ", batch is straggling after {0:.2f}s, it is hedged on ".format(threshold) + stand_in.unique_name)
+        hedge_start = time.time()
+        hedge_job = stand_in.submit_batch(circuit_batch)
+        hedge = self.pool.submit(hedge_job.result)
+
+        pending = {primary, hedge}
+        errors = []
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() != None:
+                    errors.append(future.exception())
+                    continue
+
+                won = future is hedge
+                finished = time.time()
+                loser_job, loser = (primary, primary) if won else (hedge_job, hedge)
+                entry = {"device": device.unique_name, "stand_in": stand_in.unique_name, "batch_size": len(circuit_batch),
+                         "threshold": threshold, "hedge_won": won, "winner_time": finished - start, "hedge_delay": hedge_start - start,
+                         "saved": None, "cancelled": self._cancel(loser_job)}
+                if not won:
+                    # Only primaries that finish count as observed job times, hedged stragglers would bias the percentile
+                    self._observe(device, finished - start)
+                else:
+                    self._measure_saving(entry, loser, start)
+                with self.lock:
+                    self.hedges.append(entry)
+                return future.result()
+
+        raise errors[0]
+
+    def report(self):
+        with self.lock:
+            hedges = list(self.hedges)
+        won = [h for h in hedges if h["hedge_won"]]
+        measured = [h["saved"] for h in won if h["saved"] != None]
+        report = {"hedged_batches": len(hedges),
+                  "hedges_won": len(won),
+                  "losers_cancelled": sum(1 for h in hedges if h["cancelled"]),
+                  "measured_savings": len(measured),
+                  "time_saved": sum(measured)}
+        print("Hedging: {0} batches hedged, the stand-in won {1} times and saved at least {2:.2f}s".format(
+            report["hedged_batches"], report["hedges_won"], report["time_saved"]) +
+            (", {0} cancelled stragglers could not be measured".format(len(won) - len(measured)) if len(won) > len(measured) else ""))
+        return report
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+    def _observe(self, device, elapsed):
+        with self.lock:
+            self.job_times.setdefault(device.unique_name, []).append(elapsed)
+
+    def _cancel(self, job):
+        try:
+            return bool(job.cancel())
+        except Exception:
+            return False
+
+    def _measure_saving(self, entry, loser, start):
+        # A straggler that could not be cancelled still finishes, which tells how long the run would have waited for it
+        winner_time = entry["winner_time"]
+        def record(future):
+            if not future.cancelled() and future.exception() == None:
+                with self.lock:
+                    entry["saved"] = time.time() - start - winner_time
+        loser.add_done_callback(record)
@@ -0,0 +1,115 @@
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from os.path import join
+from types import FunctionType, ModuleType
+import psutil
+
+memory_profiler = None
+
+def use_memory_profiler(profiler):
+    '''Sets the profiler recording the memory at the boundaries of the orchestration and experiment stages, None disables it'''
+    global memory_profiler
+    if profiler == None and memory_profiler != None and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    memory_profiler = profiler
+    if profiler != None:
+        profiler.start()
+
+def checkpoint(stage, **structures):
+    if memory_profiler != None:
+        memory_profiler.checkpoint(stage, **structures)
+
+def deep_size(obj, stop_types=()):
+    '''Size of all objects reachable from obj, objects of the stop types are shared with other structures and not followed'''
+    seen = set()
+    stack = [obj]
+    size = 0
+    while len(stack) > 0:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, (type, ModuleType, FunctionType) + stop_types):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        stack.extend(gc.get_referents(current))
+    return size
+
+def peak_rss_mb():
+    '''Peak RSS of the process in MB, the current RSS where the platform does not report a peak'''
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is given in bytes on macOS and in KB elsewhere
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        memory_info = psutil.Process(os.getpid()).memory_info()
+        return getattr(memory_info, "peak_wset", memory_info.rss) / 1024 ** 2
+
+class MemoryProfiler:
+    '''Records the RSS of the process and the memory traced by tracemalloc at stage boundaries. The peak is tracked per stage,
+    the allocations that grew most since the previous stage are listed by source line. Memory that is not traced, e.g. that of
+    Aer's simulator, shows up as the difference between RSS and traced memory.'''
+    def __init__(self, frames=1, top_n=10) -> None:
+        self.frames = frames
+        self.top_n = top_n
+        self.records = []
+        self.previous_snapshot = None
+        self.previous_time = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.previous_snapshot = tracemalloc.take_snapshot()
+        self.previous_time = time.time()
+
+    def checkpoint(self, stage, **structures):
+        from core.entities import QuantumDevice, FaultTolerantQuantumContainer
+        from core.qchannels import QuantumRedundancyChannel
+
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot = tracemalloc.take_snapshot()
+        growth = snapshot.compare_to(self.previous_snapshot, "lineno") if self.previous_snapshot != None else []
+
+        # Devices, channels and containers are shared by all structures and would attribute the backends to each of them
+        stop_types = (QuantumDevice, QuantumRedundancyChannel, FaultTolerantQuantumContainer)
+        record = {"stage": stage,
+                  "time": time.time(),
+                  "duration": time.time() - self.previous_time,
+                  "rss_mb": psutil.Process(os.getpid()).memory_info().rss / 1024 ** 2,
+                  # ru_maxrss is given in kilobytes on Linux
+                  "peak_rss_mb": peak_rss_mb(),
+                  "traced_mb": current / 1024 ** 2,
+                  "stage_peak_traced_mb": peak / 1024 ** 2,
+                  "structures_mb": {name: deep_size(structure, stop_types) / 1024 ** 2 for name, structure in structures.items()},
+                  "top_growth": [{"location": str(stat.traceback), "size_diff_mb": stat.size_diff / 1024 ** 2, "count_diff": stat.count_diff}
+                                 for stat in growth[:self.top_n]]}
+        record["untraced_mb"] = record["rss_mb"] - record["traced_mb"]
+        self.records.append(record)
+
+        print("Memory after " + stage + ": RSS {0:.1f}MB, traced {1:.1f}MB, stage peak {2:.1f}MB".format(
+            record["rss_mb"], record["traced_mb"], record["stage_peak_traced_mb"]) +
+            "".join(", " + name + " {0:.2f}MB".format(size) for name, size in record["structures_mb"].items()))
+
+        self.previous_snapshot = snapshot
+        self.previous_time = time.time()
+
+    def save_report(self, result_dir):
+        report_file = join(result_dir, "memory_report.json")
+        with open(report_file, "w") as f:
+            json.dump(self.records, f, indent=4)
+
+        lines = ["{0:<14} {1:>10} {2:>10} {3:>10} {4:>12} {5:>10}  {6}".format("stage", "RSS MB", "peak RSS", "traced", "stage peak", "untraced", "structures")]
+        for record in self.records:
+            structures = ", ".join(name + " {0:.2f}MB".format(size) for name, size in record["structures_mb"].items())
+            lines.append("{0:<14} {1:>10.1f} {2:>10.1f} {3:>10.1f} {4:>12.1f} {5:>10.1f}  {6}".format(
+                record["stage"], record["rss_mb"], record["peak_rss_mb"], record["traced_mb"], record["stage_peak_traced_mb"],
+                record["untraced_mb"], structures))
+        with open(join(result_dir, "memory_report.txt"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        print("Memory report has been written to file: " + report_file)
+        return report_file
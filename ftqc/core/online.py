@@ -0,0 +1,175 @@
+import itertools
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from core.entities import Circuit, Measurements
+
+DEFAULT_MAX_BATCH_LATENCY = 0.01
+
+_default_executors = {}
+_default_lock = threading.Lock()
+
+def default_executor(qdevice_provider):
+    '''Executor shared by all containers whose devices come from the provider and that are run without an explicit executor'''
+    with _default_lock:
+        if qdevice_provider not in _default_executors.keys():
+            _default_executors[qdevice_provider] = OnlineExecutor(qdevice_provider)
+        return _default_executors[qdevice_provider]
+
+class OnlineRunResult:
+    '''Aggregated measurements of a single request with the measurements of each channel and the latency of each step in seconds'''
+    def __init__(self, circuit, container, aggregated, measurements, latencies) -> None:
+        self.circuit = circuit
+        self.container = container
+        self.aggregated = aggregated
+        self.measurements = measurements
+        self.latencies = latencies
+
+class OnlineExecutor:
+    '''Runs single circuits through containers with low latency. The devices are kept warm by one thread each that collects
+    the circuits of concurrent requests into a shared job, a job is submitted as soon as it is full or its oldest circuit has
+    waited max_batch_latency seconds. Transpilations go through the channels, so the transpilation cache is used if set.
+    Jobs are limited to the max_job_size_for of the device provider, without a provider max_batch_size must be given.'''
+    def __init__(self, qdevice_provider=None, max_batch_size=None, max_batch_latency=DEFAULT_MAX_BATCH_LATENCY, max_concurrent_requests=32) -> None:
+        if qdevice_provider == None and max_batch_size == None:
+            raise Exception("An online executor needs the device provider or max_batch_size, jobs must not exceed the max_experiments of a backend")
+        self.qdevice_provider = qdevice_provider
+        self.max_batch_size = max_batch_size
+        self.max_batch_latency = max_batch_latency
+        self.request_pool = ThreadPoolExecutor(max_workers=max_concurrent_requests)
+        self.device_queues = {}
+        self.device_threads = {}
+        self.container_locks = {}
+        self.request_ids = itertools.count()
+        self.lock = threading.Lock()
+        self.transpilation_lock = threading.Lock()
+        self.history = []
+
+    def run(self, container, circuit):
+        '''Transpiles, executes and aggregates the circuit and returns an OnlineRunResult'''
+        start = time.perf_counter()
+        if not isinstance(circuit, Circuit):
+            circuit = Circuit(circuit.name, circuit)
+        # Concurrent requests for the same circuit end up in the same job, so each request needs unique circuit names
+        request = Circuit(circuit.id + "@" + str(next(self.request_ids)), circuit.qiskit_circuit)
+
+        # qiskit's basis translation shares its equivalence graph between calls and is not thread-safe
+        transpiled_circuits = {}
+        with self.transpilation_lock:
+            for channel in container.channels:
+                transpiled_circuit = channel.apply(request)
+                if transpiled_circuit != None:
+                    transpiled_circuits[channel] = transpiled_circuit
+        channels = container.channels_for(list(transpiled_circuits.keys())) if len(transpiled_circuits) > 0 else None
+        if channels == None:
+            raise Exception("Container " + container.id + " cannot run circuit " + circuit.id)
+        transpiled = time.perf_counter()
+
+        futures = {channel: self._submit(channel.device, transpiled_circuits[channel]) for channel in channels}
+        measurements = []
+        executions = []
+        for channel, future in futures.items():
+            counts, execution = future.result()
+            measurements.append(Measurements(channel, counts))
+            executions.append(execution)
+        executed = time.perf_counter()
+
+        # Aggregators such as switches keep state, so the requests of a container are aggregated one after another
+        with self._container_lock(container):
+            aggregated = container.aggregate(measurements)
+        aggregated_at = time.perf_counter()
+
+        latencies = {"transpilation": transpiled - start,
+                     "queueing": max(e["started"] for e in executions) - transpiled,
+                     "execution": executed - max(e["started"] for e in executions),
+                     "aggregation": aggregated_at - executed,
+                     "total": aggregated_at - start,
+                     "batch_sizes": [e["batch_size"] for e in executions]}
+        with self.lock:
+            self.history.append(latencies)
+        return OnlineRunResult(circuit, container, aggregated, measurements, latencies)
+
+    def submit(self, container, circuit):
+        '''Runs the request in the background and returns a concurrent.futures.Future of its OnlineRunResult'''
+        return self.request_pool.submit(self.run, container, circuit)
+
+    async def run_async(self, container, circuit):
+        import asyncio
+
+        return await asyncio.wrap_future(self.submit(container, circuit))
+
+    def latency_percentiles(self, percentiles=[50, 95, 99]):
+        '''Percentiles of the latency of each step over all requests so far'''
+        with self.lock:
+            history = list(self.history)
+        if len(history) == 0:
+            return {}
+        steps = ["transpilation", "queueing", "execution", "aggregation", "total"]
+        return {step: dict(zip(percentiles, np.percentile([h[step] for h in history], percentiles).tolist())) for step in steps}
+
+    def close(self):
+        self.request_pool.shutdown()
+        with self.lock:
+            for device_queue in self.device_queues.values():
+                device_queue.put(None)
+            threads = list(self.device_threads.values())
+            self.device_queues = {}
+            self.device_threads = {}
+        for thread in threads:
+            thread.join()
+
+    def _container_lock(self, container):
+        with self.lock:
+            if container not in self.container_locks.keys():
+                self.container_locks[container] = threading.Lock()
+            return self.container_locks[container]
+
+    def _submit(self, device, transpiled_circuit):
+        future = Future()
+        with self.lock:
+            if device not in self.device_queues.keys():
+                self.device_queues[device] = queue.Queue()
+                self.device_threads[device] = threading.Thread(target=self._run_device, args=(device, self.device_queues[device]), daemon=True)
+                self.device_threads[device].start()
+            self.device_queues[device].put((transpiled_circuit, future))
+        return future
+
+    def _batch_size_for(self, device):
+        sizes = [self.max_batch_size]
+        if self.qdevice_provider != None:
+            sizes.append(self.qdevice_provider.max_job_size_for(device))
+        sizes = [size for size in sizes if size != None]
+        return min(sizes) if len(sizes) > 0 else float("inf")
+
+    def _run_device(self, device, device_queue):
+        batch_size = self._batch_size_for(device)
+
+        finished = False
+        while not finished:
+            entry = device_queue.get()
+            if entry == None:
+                break
+
+            batch = [entry]
+            deadline = time.perf_counter() + self.max_batch_latency
+            while len(batch) < batch_size:
+                try:
+                    entry = device_queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if entry == None:
+                    finished = True
+                    break
+                batch.append(entry)
+
+            execution = {"started": time.perf_counter(), "batch_size": len(batch)}
+            try:
+                result = device.execute_batch([circuit for circuit, _ in batch])
+                for circuit, future in batch:
+                    future.set_result((result.get_counts(circuit.qiskit_circuit), execution))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
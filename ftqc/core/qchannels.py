@@ -1,14 +1,46 @@
+import itertools
 import random
-from uuid import uuid4
-from qiskit import transpile
+from uuid import NAMESPACE_OID, uuid4, uuid5
 from core.entities import Circuit
 
 DEFAULT_SEED = 123
 
+transpilation_cache = None
+staged_transpiler = None
+transpilation_budget = None
+channel_ids = None
+
+def use_transpilation_cache(cache):
+    '''Sets the cache that is consulted by all channels before transpiling a circuit, None disables caching'''
+    global transpilation_cache
+    transpilation_cache = cache
+
+def use_staged_transpiler(transpiler):
+    '''Sets the transpiler sharing the device-independent stages between channels, None transpiles each channel separately'''
+    global staged_transpiler
+    staged_transpiler = transpiler
+
+def use_transpilation_budget(budget):
+    '''Sets the budget limiting the time each channel may spend transpiling a circuit, None transpiles without limit'''
+    global transpilation_budget
+    # The worker process of a replaced budget would otherwise live until the interpreter exits
+    if transpilation_budget != None and transpilation_budget is not budget:
+        transpilation_budget.stop()
+    transpilation_budget = budget
+
+def use_channel_ids(ids):
+    '''Sets the iterator giving the ids of new channels, None gives each channel a random id'''
+    global channel_ids
+    channel_ids = ids
+
+def deterministic_channel_ids(namespace):
+    '''Ids that are equal in all processes that create their channels in the same order, e.g. the workers of a sharded run'''
+    return (str(uuid5(NAMESPACE_OID, namespace + "-" + str(i))) for i in itertools.count())
+
 class QuantumRedundancyChannel:
     def __init__(self, device) -> None:
         self.device = device
-        self.id = str(uuid4())
+        self.id = next(channel_ids) if channel_ids != None else str(uuid4())
 
     def __hash__(self) -> int:
         return hash(self.id)
@@ -19,14 +51,45 @@ class QuantumRedundancyChannel:
         return False
 
     def apply(self, circuit):
-        transpilation = self.create_variant_of(circuit)
+        if transpilation_cache != None:
+            transpilation = transpilation_cache.get_or_create(circuit, self)
+        else:
+            transpilation = self.create_variant_of(circuit)
+        if transpilation == None:
+            # The circuit has been dropped from the channel as its transpilation budget was exhausted
+            return None
         transpilation.name = f"{circuit.id}-{self.id}"
         return Circuit(transpilation.name, transpilation)
 
     def create_variant_of(self, circuit):
         '''Execute the circuit and return measurements'''
         pass
-    
+
+    def transpile(self, circuit):
+        if transpilation_budget != None:
+            return transpilation_budget.transpile(circuit, self)
+        if staged_transpiler != None:
+            return staged_transpiler.transpile(circuit, self)
+
+        from qiskit import transpile
+        return transpile(circuit.qiskit_circuit, backend=self.device.get_backend(), **self.transpile_options())
+
+    def transpile_options(self):
+        '''The options passed to transpile besides the backend, channels with equal options and devices create equal variants'''
+        return {}
+
+    def requires_specific_device(self):
+        '''Whether the circuits of the channel must run on its own device, e.g. because the device is what makes the channel redundant'''
+        return False
+
+    def fallback_transpile_options(self):
+        '''Cheaper options used when the transpilation budget is exhausted, the seed of the channel is kept'''
+        return dict(self.transpile_options(), optimization_level=0)
+
+    def variant_key(self):
+        options = self.transpile_options()
+        return (self.device.unique_name,) + tuple((k, options[k]) for k in sorted(options.keys()))
+
 class VaryingTranspilationSeedGeneration(QuantumRedundancyChannel):
     def __init__(self, device) -> None:
         super().__init__(device)
@@ -35,9 +98,10 @@ class VaryingTranspilationSeedGeneration(QuantumRedundancyChannel):
 
     def create_variant_of(self, circuit):
         print("Apply varying transpilation seed channel")
-        return transpile(circuit.qiskit_circuit, 
-                         backend=self.device.get_backend(), 
-                         seed_transpiler=self.seed)
+        return self.transpile(circuit)
+
+    def transpile_options(self):
+        return {"seed_transpiler": self.seed}
 
 class HeterogeneousQuantumDeviceBackend(QuantumRedundancyChannel):
     def __init__(self, device) -> None:
@@ -46,9 +110,13 @@ class HeterogeneousQuantumDeviceBackend(QuantumRedundancyChannel):
 
     def create_variant_of(self, circuit):
         print("Apply heterogeneous quantum device channel")
-        return transpile(circuit.qiskit_circuit, 
-                  backend=self.device.get_backend(), 
-                  seed_transpiler=DEFAULT_SEED)
+        return self.transpile(circuit)
+
+    def transpile_options(self):
+        return {"seed_transpiler": DEFAULT_SEED}
+
+    def requires_specific_device(self):
+        return True
 
 class DifferentOptimizationLevel(QuantumRedundancyChannel):
     def __init__(self, device, opt_level) -> None:
@@ -58,7 +126,7 @@ class DifferentOptimizationLevel(QuantumRedundancyChannel):
 
     def create_variant_of(self, circuit):
         print("Apply different optimization level channel")
-        return transpile(circuit.qiskit_circuit, 
-                         backend=self.device.get_backend(), 
-                         optimization_level=self.opt_level, 
-                         seed_transpiler=DEFAULT_SEED)
\ No newline at end of file
+        return self.transpile(circuit)
+
+    def transpile_options(self):
+        return {"optimization_level": self.opt_level, "seed_transpiler": DEFAULT_SEED}
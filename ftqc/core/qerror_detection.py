@@ -1,3 +1,4 @@
+import numpy as np
 from math import log, sqrt
 from core.conformal_measurements import ConformalSet, default_top_n_rate
 
@@ -6,6 +7,10 @@ class QuantumFaultDetector:
         '''Main method for checking measurements in terms of faults'''
         pass
 
+    def accept_batch(self, measurements_batch):
+        '''Checks the measurements of many circuits at once and returns whether each of them is accepted'''
+        return np.array([self.accept(measurements) for measurements in measurements_batch], dtype=bool)
+
 def shannon_entropy(p_dist):
     return sum(p * log(p) for p in p_dist) * (-1)
 
@@ -42,34 +47,86 @@ def bhattacharyya(p_dist, q_dist):
     bc = sum(sqrt(p_dist[i] * q_dist[i]) for i in range(len(p_dist)))
     return log(bc) * (-1)
 
+'''The batch variants evaluate many distributions at once. Each row of p_dists holds one distribution padded with zeros,
+mask marks the entries that belong to the distribution and q_dists holds the reference distributions with the same shape'''
+def _sum_over(mask, values):
+    return np.where(mask, values, 0.0).sum(axis=1)
+
+def _safe(mask, values):
+    return np.where(mask, values, 1.0)
+
+def shannon_entropy_batch(p_dists, q_dists, mask):
+    return _sum_over(mask, p_dists * np.log(_safe(mask, p_dists))) * (-1)
+
+def hellinger_batch(p_dists, q_dists, mask):
+    return _sum_over(mask, (np.sqrt(p_dists) - np.sqrt(q_dists)) ** 2) / sqrt(2.)
+
+def kl_divergence_batch(p_dists, q_dists, mask):
+    return _sum_over(mask, p_dists * np.log(_safe(mask, p_dists) / _safe(mask, q_dists)))
+
+def cross_entropy_batch(p_dists, q_dists, mask):
+    return _sum_over(mask, p_dists * np.log(_safe(mask, q_dists))) * (-1)
+
+def jensen_shannon_divergence_batch(p_dists, q_dists, mask):
+    m = (p_dists * q_dists) / 2
+    return 0.5 * kl_divergence_batch(p_dists, m, mask) + 0.5 * kl_divergence_batch(q_dists, m, mask)
+
+def bhattacharyya_batch(p_dists, q_dists, mask):
+    bc = _sum_over(mask, np.sqrt(p_dists * q_dists))
+    return np.log(bc) * (-1)
+
+def to_probability_matrix(all_measurements):
+    '''Returns the padded probabilities of the measurements, the reference distribution of MeasurementNoiseQuantifier and the mask'''
+    num_states = max((m.num_of_measured_states() for m in all_measurements), default=0)
+    p_dists = np.zeros((len(all_measurements), num_states))
+    mask = np.zeros((len(all_measurements), num_states), dtype=bool)
+    for i, measurements in enumerate(all_measurements):
+        probabilities = measurements.get_probabilities()
+        p_dists[i, :len(probabilities)] = probabilities
+        mask[i, :len(probabilities)] = True
+
+    num_counts = np.array([float(m.num_counts) for m in all_measurements])
+    q_dists = np.where(mask, 1 / num_counts[:, None], 0.0)
+    return p_dists, q_dists, mask
+
 class MeasurementNoiseQuantifier(QuantumFaultDetector):
-    def __init__(self, f_divergence, threshold) -> None:
+    def __init__(self, f_divergence, threshold, f_divergence_batch=None) -> None:
         def closeness_to_uniform_dist(measurements):
             p_dist = measurements.get_probabilities()
             q_dist = [1/measurements.num_counts for _ in range(len(p_dist))]
             return f_divergence(p_dist, q_dist)
         self.measure_closeness_to_uniform_dist = closeness_to_uniform_dist
+        self.f_divergence_batch = f_divergence_batch
         self.threshold = threshold
 
     def using_shannon_entropy(threshold):
         def adapted_shannon_entropy(p_dist, q_dist):
             return shannon_entropy(p_dist)
-        return MeasurementNoiseQuantifier(adapted_shannon_entropy, threshold)
+        return MeasurementNoiseQuantifier(adapted_shannon_entropy, threshold, shannon_entropy_batch)
 
     def using_kl_divergence(threshold):
-        return MeasurementNoiseQuantifier(kl_divergence, threshold)
+        return MeasurementNoiseQuantifier(kl_divergence, threshold, kl_divergence_batch)
     
     def using_cross_entropy(threshold):
-        return MeasurementNoiseQuantifier(cross_entropy, threshold)
+        return MeasurementNoiseQuantifier(cross_entropy, threshold, cross_entropy_batch)
     
     def using_jensen_shannon_divergence(threshold):
-        return MeasurementNoiseQuantifier(jensen_shannon_divergence, threshold)
+        return MeasurementNoiseQuantifier(jensen_shannon_divergence, threshold, jensen_shannon_divergence_batch)
 
     def using_bhattacharyya(threshold):
-        return MeasurementNoiseQuantifier(bhattacharyya, threshold)
+        return MeasurementNoiseQuantifier(bhattacharyya, threshold, bhattacharyya_batch)
     
     def using_hellinger(threshold):
-        return MeasurementNoiseQuantifier(hellinger, threshold)
+        return MeasurementNoiseQuantifier(hellinger, threshold, hellinger_batch)
+
+    def measure_closeness_batch(self, all_measurements, probability_matrix=None):
+        '''Measures the closeness of each measurements to the uniform distribution, the probability matrix can be shared between quantifiers'''
+        if self.f_divergence_batch == None:
+            return np.array([self.measure_closeness_to_uniform_dist(m) for m in all_measurements])
+
+        if probability_matrix == None:
+            probability_matrix = to_probability_matrix(all_measurements)
+        return self.f_divergence_batch(*probability_matrix)
 
     def accept(self, measurements):
         return not self.reject(measurements)
@@ -80,6 +137,24 @@ class MeasurementNoiseQuantifier(QuantumFaultDetector):
         
         closeness = self.measure_closeness_to_uniform_dist(measurements[0])
         return closeness < self.threshold
+
+    def accept_batch(self, measurements_batch):
+        if any(len(measurements) != 1 for measurements in measurements_batch):
+            raise Exception("There must be only a single set of measurements.")
+
+        single_measurements = [measurements[0] for measurements in measurements_batch]
+        closeness = self.measure_closeness_batch(single_measurements)
+        accepted = np.logical_not(closeness < self.threshold)
+
+        # Rounding of the batch divergences must not flip decisions, so scores close to the threshold are checked again
+        for i in np.flatnonzero(np.isclose(closeness, self.threshold, rtol=1e-9, atol=1e-12)):
+            accepted[i] = self.accept([single_measurements[i]])
+        return accepted
+
+def measure_closeness_of_all(quantifiers, all_measurements):
+    '''Evaluates several quantifiers, e.g. {name: quantifier}, on the same measurements and returns {name: closeness per measurements}'''
+    probability_matrix = to_probability_matrix(all_measurements)
+    return {name: quantifier.measure_closeness_batch(all_measurements, probability_matrix) for name, quantifier in quantifiers.items()}
     
 class MeasurementComparison(QuantumFaultDetector):
     def __init__(self, primary_channel, comparator_channel, num_matching_solutions=None) -> None:
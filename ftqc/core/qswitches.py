@@ -1,5 +1,7 @@
+import threading
 import uuid
-from random import randint
+import numpy as np
+from random import Random
 
 class QuantumSwitchUnit:
     def __init__(self, fault_detector, primary_channel, secondary_channels=None) -> None:
@@ -7,64 +9,194 @@ class QuantumSwitchUnit:
         self.primary_channel = primary_channel
         self.secondary_channels = secondary_channels
         self.fault_detector = fault_detector
-        self.measurements = None
 
     def __hash__(self) -> int:
         return hash(self.id)
 
-    def fault_detected(self):
-        return not self.fault_detector.accept(self.measurements)
-    
     def has_produced(self, measurements):
         return any(channel == measurements.generated_from_channel for channel in self.get_channels())
-    
+
     def get_channels(self):
         if self.secondary_channels == None:
             return [self.primary_channel]
         return [self.primary_channel] + self.secondary_channels
-    
-    def operational_measurements(self):
-        for m in self.measurements:
+
+    def produced_measurements(self, all_measurements):
+        return [measurements for measurements in all_measurements if self.has_produced(measurements)]
+
+    def is_complete(self, measurements):
+        return len(measurements) == len(self.get_channels())
+
+    def primary_measurements(self, measurements):
+        for m in measurements:
             if m.generated_from_channel == self.primary_channel:
                 return m
-            
+
         raise Exception("None of the measurements was produced by the primary channel")
 
+class SwitchState:
+    '''State of a switch between two circuits, it is never changed but replaced. Units are referred to by their position
+    in the units of the switch, the operational first. draws counts the random choices so far, the next choice is made
+    with a generator derived from the seed of the switch and draws.'''
+    def __init__(self, operational, spares, draws=0) -> None:
+        self.operational = operational
+        self.spares = tuple(spares)
+        self.draws = draws
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SwitchState) and (self.operational, self.spares, self.draws) == (other.operational, other.spares, other.draws)
+
+    def __hash__(self) -> int:
+        return hash((self.operational, self.spares, self.draws))
+
+    def switched_to(self, spare, draws):
+        '''State after the spare has replaced the operational, which becomes the last spare'''
+        return SwitchState(spare, [s for s in self.spares if s != spare] + [self.operational], draws)
+
+class SwitchEvaluation:
+    '''Measurements of every unit of a switch for a single circuit and whether a fault has been detected for them. It does
+    not depend on the state of the switch, so the circuits can be evaluated in any order. Faults are detected on demand.'''
+    def __init__(self, units, all_measurements, faults=None) -> None:
+        self.units = units
+        self.produced = [unit.produced_measurements(all_measurements) for unit in units]
+        self.faults = faults if faults != None else [None] * len(units)
+
+    def is_available(self, i):
+        return self.units[i].is_complete(self.produced[i])
+
+    def fault_detected(self, i):
+        if self.faults[i] == None:
+            self.faults[i] = not self.units[i].fault_detector.accept(self.produced[i])
+        return self.faults[i]
+
+def _evaluate_all(units, measurements_sequence):
+    '''Evaluations of a sequence of circuits, the fault detector of every unit checks all of them at once'''
+    evaluations = [SwitchEvaluation(units, all_measurements) for all_measurements in measurements_sequence]
+    for i, unit in enumerate(units):
+        idxs = [c for c, evaluation in enumerate(evaluations) if evaluation.is_available(i)]
+        if len(idxs) == 0:
+            continue
+        accepted = unit.fault_detector.accept_batch([evaluations[c].produced[i] for c in idxs])
+        for c, accept in zip(idxs, accepted):
+            evaluations[c].faults[i] = not bool(accept)
+    return evaluations
+
 class QuantumRedundancySwitch:
-    def __init__(self) -> None:
-        self.operational = None
-        self.spares = None
+    '''Switches from the operational unit to a spare when a fault is detected for it. The switch itself is stateless: advance
+    takes the state before a circuit and returns the state after it together with the selected measurements. Circuits can
+    thus be evaluated in parallel and the states are reconstructed in circuit order afterwards by switch_batch. The
+    aggregators of the containers keep the current state and replace it under a lock.'''
+    def __init__(self, seed=None) -> None:
+        self.units = None
+        # Without a given seed one is drawn, so that the choices of a run can still be reproduced from it
+        self.seed = seed if seed != None else Random().getrandbits(32)
+        self.state = None
+        self.lock = threading.Lock()
 
-    def switch_if_necessary(self, all_measurements):
-        qswitch_units = [self.operational] + self.spares
-        for qswitch_unit in qswitch_units:
-            qswitch_unit.measurements = []
-            for measurements in all_measurements:
-                if qswitch_unit.has_produced(measurements):
-                    qswitch_unit.measurements.append(measurements)
-        
-        if any(len(qswitch_unit.measurements) == 0 for qswitch_unit in qswitch_units):
+    def set_units(self, operational, spares):
+        self.units = [operational] + list(spares)
+        self.state = self.initial_state()
+
+    def initial_state(self):
+        return SwitchState(0, range(1, len(self.units)))
+
+    def get_operational(self, state=None):
+        return self.units[(state if state != None else self.state).operational]
+
+    def get_spares(self, state=None):
+        return [self.units[i] for i in (state if state != None else self.state).spares]
+
+    def rng_for(self, state):
+        return Random(str(self.seed) + ":" + str(state.draws))
+
+    def evaluate(self, all_measurements):
+        return SwitchEvaluation(self.units, all_measurements)
+
+    def advance(self, state, evaluation, restricted=False):
+        '''State after a circuit and the measurements selected for it. Without restriction all units must have measurements,
+        with restriction units whose channels have not all produced measurements are not available: an unavailable
+        operational is replaced as if a fault had been detected, unavailable spares are not switched to.'''
+        if not restricted and any(len(produced) == 0 for produced in evaluation.produced):
             raise Exception("There is at least one qswitch for which not all measurements could be retrieved")
 
-        if self.operational.fault_detected():
-            new_operational = self.do_switch()
-
-            self.spares.remove(new_operational)
-            self.spares.append(self.operational)
-            
-            self.operational = new_operational
-        
-        return self.operational.operational_measurements()
-    
-    def do_switch(self):
-        '''Main method for switching between spares and operational'''
+        if (restricted and not evaluation.is_available(state.operational)) or evaluation.fault_detected(state.operational):
+            candidates = [i for i in state.spares if not restricted or evaluation.is_available(i)]
+            if len(candidates) == 0:
+                raise Exception("There is no available spare to switch to")
+            spare, draws = self.select_spare(state, candidates, evaluation)
+            state = state.switched_to(spare, draws)
+
+        return state, self.units[state.operational].primary_measurements(evaluation.produced[state.operational])
+
+    def switch_if_necessary(self, all_measurements):
+        return self._switch(all_measurements, False)
+
+    def switch_among_available(self, all_measurements):
+        return self._switch(all_measurements, True)
+
+    def switch_batch(self, measurements_sequence, state=None, executor=None, chunk_size=64):
+        '''Selected measurements of a sequence of circuits and the state after each of them, starting from the given state
+        or the initial state. The circuits are evaluated in chunks, in parallel if an executor is given (process pools need fault
+        detectors that can be pickled, which closures such as those of the noise quantifiers cannot), and the states are
+        advanced in circuit order afterwards, which gives the same choices as advancing them one circuit after another.'''
+        state = state if state != None else self.initial_state()
+        chunks = [measurements_sequence[i:i + chunk_size] for i in range(0, len(measurements_sequence), chunk_size)]
+        if executor == None:
+            evaluations = [evaluation for chunk in chunks for evaluation in _evaluate_all(self.units, chunk)]
+        else:
+            futures = [executor.submit(_evaluate_all, self.units, chunk) for chunk in chunks]
+            evaluations = [evaluation for future in futures for evaluation in future.result()]
+
+        selected = []
+        states = []
+        for all_measurements, evaluation in zip(measurements_sequence, evaluations):
+            restricted = len(all_measurements) < sum(len(unit.get_channels()) for unit in self.units)
+            state, measurements = self.advance(state, evaluation, restricted)
+            selected.append(measurements)
+            states.append(state)
+        return selected, states
+
+    def aggregate_sequence(self, measurements_sequence, executor=None):
+        '''Aggregates a sequence of circuits at once, continuing from and replacing the current state'''
+        with self.lock:
+            selected, states = self.switch_batch(measurements_sequence, self.state, executor)
+            if len(states) > 0:
+                self.state = states[-1]
+        return selected
+
+    def available_channels(self, channels):
+        '''Channels of the units that can run with the given channels, None if fewer than two units remain'''
+        qswitch_units = [qswitch_unit for qswitch_unit in self.units if all(channel in channels for channel in qswitch_unit.get_channels())]
+        if len(qswitch_units) < 2:
+            return None
+        return [channel for channel in channels if any(channel in qswitch_unit.get_channels() for qswitch_unit in qswitch_units)]
+
+    def expected_fidelity_of(self, measurements):
+        '''Product of the expected fidelities of the measurements of a unit, None if they have not been estimated'''
+        if len(measurements) == 0 or any(m.expected_fidelity == None for m in measurements):
+            return None
+        return float(np.prod([m.expected_fidelity for m in measurements]))
+
+    def by_expected_fidelity(self, candidates, evaluation):
+        '''Spares with the most promising estimate first, spares without an estimate keep their order after them'''
+        fidelities = {i: self.expected_fidelity_of(evaluation.produced[i]) for i in candidates}
+        return sorted(candidates, key=lambda i: -fidelities[i] if fidelities[i] != None else 0.0)
+
+    def select_spare(self, state, candidates, evaluation):
+        '''Main method for switching between spares and operational, returns the selected spare among the candidates and the
+        number of random draws after the selection'''
         pass
 
+    def _switch(self, all_measurements, restricted):
+        evaluation = self.evaluate(all_measurements)
+        with self.lock:
+            self.state, measurements = self.advance(self.state, evaluation, restricted)
+        return measurements
+
 class SimpleQuantumRedundancySwitch(QuantumRedundancySwitch):
-    def do_switch(self):
-        for spare in self.spares:
-            if not spare.fault_detected():
-                return spare
-        
-        return self.spares[randint(0, len(self.spares) - 1)]
+    def select_spare(self, state, candidates, evaluation):
+        for spare in self.by_expected_fidelity(candidates, evaluation):
+            if not evaluation.fault_detected(spare):
+                return spare, state.draws
 
+        return candidates[self.rng_for(state).randint(0, len(candidates) - 1)], state.draws + 1
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from core.caching import circuit_fingerprint
+
+STAGED_OPTIONS = {"optimization_level", "seed_transpiler"}
+# Levels whose staged output has been compared with transpile on random circuits of several backends without a difference.
+# At higher levels the layout and routing passes break ties by the order of the DAG nodes, which differs once the circuit
+# of the shared stage is converted back into a DAG, so the output differs from transpile for some circuits.
+STAGED_LEVELS = {0}
+
+class StagedTranspiler:
+    '''Runs the init stage of the preset pass managers, i.e. unitary synthesis and unrolling to gates on at most two qubits,
+    once per circuit and device. Only layout, routing, translation, optimization and scheduling, which depend on the seed and
+    the optimization level, are run per channel. Only channels at the levels of STAGED_LEVELS are staged, all others are
+    transpiled directly. verify compares the staged output with transpile and disables staging for a variant on a difference.'''
+    def __init__(self, verify=False, max_circuits=16) -> None:
+        self.verify = verify
+        self.max_circuits = max_circuits
+        self.shared_stages = {}
+        self.channel_pass_managers = {}
+        self.init_circuits = OrderedDict()
+        self.shared_runs = 0
+        self.channel_runs = 0
+
+    def transpile(self, circuit, channel):
+        from qiskit import transpile
+
+        options = channel.transpile_options()
+        backend = channel.device.get_backend()
+        pass_manager = self._channel_pass_manager(channel, options) if self._is_staged(options) else None
+        if pass_manager == None:
+            return transpile(circuit.qiskit_circuit, backend=backend, **options)
+
+        transpiled = pass_manager.run(self._init_circuit(circuit, channel))
+        transpiled.name = circuit.qiskit_circuit.name
+        self.channel_runs += 1
+
+        if self.verify:
+            expected = transpile(circuit.qiskit_circuit, backend=backend, **options)
+            if expected != transpiled or expected.layout != transpiled.layout or expected.global_phase != transpiled.global_phase:
+                print("Staged transpilation differs from transpile for " + str(channel.variant_key()) + ", it is disabled for this variant")
+                self.channel_pass_managers[channel.variant_key()] = None
+                return expected
+
+        return transpiled
+
+    def _is_staged(self, options):
+        from qiskit import user_config
+
+        # Same default as transpile if the channel does not choose a level
+        level = options.get("optimization_level", user_config.get_config().get("transpile_optimization_level", 1))
+        return set(options.keys()) <= STAGED_OPTIONS and level in STAGED_LEVELS
+
+    def _shared_stage(self, channel):
+        from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+
+        device_name = channel.device.unique_name
+        if device_name not in self.shared_stages.keys():
+            self.shared_stages[device_name] = generate_preset_pass_manager(0, backend=channel.device.get_backend()).init
+        return self.shared_stages[device_name]
+
+    def _channel_pass_manager(self, channel, options):
+        from qiskit import user_config
+        from qiskit.transpiler import PassManager, StagedPassManager
+        from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+
+        key = channel.variant_key()
+        if key in self.channel_pass_managers.keys():
+            return self.channel_pass_managers[key]
+
+        # Same default as transpile if the channel does not choose a level
+        default_level = user_config.get_config().get("transpile_optimization_level", 1)
+        full = generate_preset_pass_manager(options.get("optimization_level", default_level),
+                                            backend=channel.device.get_backend(),
+                                            seed_transpiler=options.get("seed_transpiler", None))
+        shared = self._shared_stage(channel).passes()
+        init = full.init.passes() if full.init != None else []
+
+        # The init stage of the channel must start with the shared stage, the remaining passes are run per channel
+        if len(init) < len(shared) or any(self._pass_names(a) != self._pass_names(b) for a, b in zip(shared, init)):
+            self.channel_pass_managers[key] = None
+            return None
+
+        remaining = PassManager()
+        for group in init[len(shared):]:
+            remaining.append(group["passes"])
+
+        stages = {stage: getattr(full, stage) for stage in full.expanded_stages}
+        stages["init"] = remaining
+        self.channel_pass_managers[key] = StagedPassManager(stages=full.stages, **stages)
+        return self.channel_pass_managers[key]
+
+    def _init_circuit(self, circuit, channel):
+        # Circuits are identified by their content, as different circuits may have the same id
+        fingerprint = circuit_fingerprint(circuit.qiskit_circuit)
+        key = (fingerprint if fingerprint != None else id(circuit.qiskit_circuit), channel.device.unique_name)
+        if key in self.init_circuits.keys():
+            original, init_circuit = self.init_circuits[key]
+            # Ids of circuits that have been garbage collected are reused, so they only match the same circuit object
+            if fingerprint != None or original is circuit.qiskit_circuit:
+                self.init_circuits.move_to_end(key)
+                return init_circuit
+
+        init_circuit = self._shared_stage(channel).run(circuit.qiskit_circuit)
+        self.init_circuits[key] = (circuit.qiskit_circuit if fingerprint == None else None, init_circuit)
+        self.init_circuits.move_to_end(key)
+        self.shared_runs += 1
+        if len(self.init_circuits) > self.max_circuits:
+            self.init_circuits.popitem(last=False)
+        return init_circuit
+
+    def _pass_names(self, group):
+        return [type(p).__name__ for p in group["passes"]]
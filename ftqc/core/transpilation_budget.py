@@ -0,0 +1,161 @@
+import json
+import pickle
+import time
+from multiprocessing import get_context
+from os.path import join
+
+FALLBACK = "fallback"
+DROP = "drop"
+
+def circuit_statistics(qiskit_circuit):
+    '''Size of a circuit as reported for slow transpilations'''
+    return {"num_qubits": qiskit_circuit.num_qubits,
+            "depth": qiskit_circuit.depth(),
+            "size": qiskit_circuit.size(),
+            "num_nonlocal_gates": qiskit_circuit.num_nonlocal_gates()}
+
+def _transpile_worker(connection):
+    from qiskit import QuantumCircuit, transpile
+
+    backends = {}
+    connection.send("ready")
+    while True:
+        request = connection.recv()
+        if request == None:
+            break
+
+        device_name, payload, options = request
+        if options == None:
+            # Transpiling a small circuit loads the passes and the target of the backend before the first budget starts
+            backends[device_name] = payload
+            warm_up = QuantumCircuit(2, 2)
+            warm_up.cx(0, 1)
+            warm_up.measure([0, 1], [0, 1])
+            transpile(warm_up, backend=payload)
+            connection.send("ready")
+            continue
+
+        try:
+            connection.send((True, transpile(payload, backend=backends[device_name], **options)))
+        except Exception as e:
+            connection.send((False, str(e)))
+
+class TranspilationBudget:
+    '''Limits the time a channel may spend transpiling a circuit. The transpilation runs in a worker process that is killed
+    when time_limit seconds have passed. The channel then transpiles with its cheaper fallback options under the same limit,
+    or drops the circuit if on_exhausted is "drop" or the fallback runs out of time as well. Transpilations taking longer than
+    slow_threshold seconds are reported with the size of the circuit.'''
+    def __init__(self, time_limit=120.0, on_exhausted=FALLBACK, slow_threshold=None) -> None:
+        if on_exhausted not in (FALLBACK, DROP):
+            raise Exception("Unknown policy for exhausted transpilation budgets: " + str(on_exhausted))
+
+        self.time_limit = time_limit
+        self.on_exhausted = on_exhausted
+        self.slow_threshold = slow_threshold if slow_threshold != None else time_limit / 2
+        self.worker = None
+        self.connection = None
+        self.worker_devices = set()
+        self.unpicklable_devices = set()
+        self.slow_transpilations = []
+        self.degradations = []
+        self.dropped = []
+
+    def transpile(self, circuit, channel):
+        '''Returns the transpiled circuit, None if the circuit is dropped from the channel'''
+        options = channel.transpile_options()
+        transpiled = self._transpile_within_limit(circuit, channel, options)
+        if transpiled != None:
+            return transpiled
+
+        # A channel that already transpiles with its fallback options, e.g. at optimization level 0, is not retried
+        fallback_options = channel.fallback_transpile_options() if self.on_exhausted == FALLBACK else options
+        if fallback_options != options:
+            transpiled = self._transpile_within_limit(circuit, channel, fallback_options)
+            if transpiled != None:
+                print("Transpilation budget of channel " + channel.id + " exhausted for circuit " + circuit.id + ", fell back to " + str(fallback_options))
+                self.degradations.append({"circuit": circuit.id, "channel": channel.id, "options": options, "fallback_options": fallback_options})
+                return transpiled
+
+        print("Transpilation budget of channel " + channel.id + " exhausted for circuit " + circuit.id + ", the circuit is dropped")
+        self.dropped.append({"circuit": circuit.id, "channel": channel.id, "options": options})
+        return None
+
+    def _transpile_within_limit(self, circuit, channel, options):
+        from qiskit import transpile
+
+        device = channel.device
+        if device.unique_name in self.unpicklable_devices:
+            return transpile(circuit.qiskit_circuit, backend=device.get_backend(), **options)
+
+        self._start_worker()
+        if device.unique_name not in self.worker_devices:
+            try:
+                self.connection.send((device.unique_name, device.get_backend(), None))
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                # The worker needs its own copy of the backend, backends that cannot be copied are transpiled without limit
+                print("Backend of device " + device.unique_name + " cannot be sent to the transpilation worker, it is transpiled without budget: " + str(e))
+                self.unpicklable_devices.add(device.unique_name)
+                return transpile(circuit.qiskit_circuit, backend=device.get_backend(), **options)
+            self.connection.recv()
+            self.worker_devices.add(device.unique_name)
+
+        self.connection.send((device.unique_name, circuit.qiskit_circuit, options))
+        start = time.time()
+        finished = self.connection.poll(self.time_limit)
+        elapsed = time.time() - start
+
+        if elapsed > self.slow_threshold:
+            statistics = circuit_statistics(circuit.qiskit_circuit)
+            print("Slow transpilation of circuit " + circuit.id + " by channel " + channel.id + ": {0:.1f}s, ".format(elapsed) + str(statistics))
+            self.slow_transpilations.append(dict(statistics, circuit=circuit.id, channel=channel.id, options=options,
+                                                 elapsed=elapsed, finished=finished))
+
+        if not finished:
+            self._kill_worker()
+            return None
+
+        successful, transpiled = self.connection.recv()
+        if not successful:
+            raise Exception("Transpilation of circuit " + circuit.id + " by channel " + channel.id + " failed: " + transpiled)
+        return transpiled
+
+    def _start_worker(self):
+        if self.worker != None:
+            return
+
+        context = get_context("spawn")
+        self.connection, worker_connection = context.Pipe()
+        self.worker = context.Process(target=_transpile_worker, args=(worker_connection,), daemon=True)
+        self.worker.start()
+        worker_connection.close()
+        # Importing qiskit in the worker does not count towards the budget
+        self.connection.recv()
+
+    def _kill_worker(self):
+        self.worker.kill()
+        self.worker.join()
+        self.connection.close()
+        self.worker = None
+        self.connection = None
+        self.worker_devices = set()
+
+    def stop(self):
+        if self.worker == None:
+            return
+        self.connection.send(None)
+        self.worker.join()
+        self.connection.close()
+        self.worker = None
+        self.connection = None
+        self.worker_devices = set()
+
+    def save_report(self, result_dir):
+        report_file = join(result_dir, "transpilation_budget.json")
+        with open(report_file, "w") as f:
+            json.dump({"time_limit": self.time_limit,
+                       "on_exhausted": self.on_exhausted,
+                       "slow_transpilations": self.slow_transpilations,
+                       "degradations": self.degradations,
+                       "dropped": self.dropped}, f, indent=4)
+        print("Transpilation budget report has been written to file: " + report_file)
+        return report_file
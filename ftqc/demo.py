@@ -1,18 +1,10 @@
 from provider.qdevice_provider import FakeQuantumDeviceProvider
-from provider.circuit_provider import CircuitProvider
 from builder.ft_builder import CombinerPatternBuilder
 from core.entities import Circuit
 from core.qchannels import VaryingTranspilationSeedGeneration, HeterogeneousQuantumDeviceBackend, DifferentOptimizationLevel
-from experiment.ftqc_experiment import FaultTolerantQCExperiment
+from experiment.util import simulate_and_retrieve_best_solution
 from qiskit.circuit.random import random_circuit
 
-class SingleCircuitProvider(CircuitProvider):
-    def __init__(self, circuit) -> None:
-        self.circuit = circuit
-    
-    def get(self):
-        return [Circuit(self.circuit.name, self.circuit)]
-
 if __name__ == '__main__':
     device_provider = FakeQuantumDeviceProvider()
 
@@ -27,13 +19,11 @@ if __name__ == '__main__':
     combiner = builder.build()
 
     circuit = random_circuit(3, 6, measure=True)
-    circuit_provider = SingleCircuitProvider(circuit)
-
-    ftqc_exp = FaultTolerantQCExperiment(circuit_provider, device_provider, [combiner])
-    result = ftqc_exp.run_experiment()[0]
+    result = combiner.run(circuit, qdevice_provider=device_provider)
 
-    print(result.ft_qcontainer)
-    print(str(result.ground_truth))
-    print(str(result.agg_measurements.measurements))
-    for m in result.single_measurements:
+    print(combiner.id)
+    print(str(simulate_and_retrieve_best_solution(Circuit(circuit.name, circuit))))
+    print(str(result.aggregated.measurements))
+    for m in result.measurements:
         print(str(m.measurements))
+    print("Latency: " + ", ".join(step + " {0:.3f}s".format(result.latencies[step]) for step in ["transpilation", "queueing", "execution", "aggregation", "total"]))
@@ -1,18 +1,15 @@
+import argparse
+import os
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from provider.circuit_provider import QasmBasedCircuitProvider
-from core.qerror_detection import MeasurementNoiseQuantifier
+from core.qerror_detection import MeasurementNoiseQuantifier, measure_closeness_of_all
 from core.entities import Measurements
 from core.entities import QuantumComputerSimulator
-from qiskit.tools.visualization import plot_histogram
-
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.drawing.image import Image
-from openpyxl.styles import Font, Alignment
-import os
 
-def evaluateDistances():
-    quantifiers = {
+def create_quantifiers():
+    return {
     "Shannon Entropy": MeasurementNoiseQuantifier.using_shannon_entropy(0.1),
     "KL Divergence": MeasurementNoiseQuantifier.using_kl_divergence(0.1),
     "Cross Entropy": MeasurementNoiseQuantifier.using_cross_entropy(0.1),
@@ -21,187 +18,198 @@ def evaluateDistances():
     "Hellinger": MeasurementNoiseQuantifier.using_hellinger(0.1)
     }
 
-    # Evaluate measurements using the provided distances
-    evaluation_results = []
-    qasm_files_dir = "MQTBench"
-    provider = QasmBasedCircuitProvider(dir=qasm_files_dir)  
-
-    image_files = []
-    if not os.path.exists('histograms'):
-        os.mkdir('histograms')
-
-    for batch in provider.get():  
-        for noise in [False, True]:
-            if noise:
-                simulator = QuantumComputerSimulator.create_noisy_simulator() 
-                simulator.modify_noise()
-
-            else:
-                simulator = QuantumComputerSimulator.create_perfect_simulator()
-            
-            results = simulator.execute_batch(batch.circuits)
-            measurements = []
-            for circuit in batch.circuits:
-                
-                counts = results.get_counts(circuit.qiskit_circuit)
-                measurement = Measurements("channel", counts)
-                
-
-                image_filename = os.path.join("histograms", f"{circuit.id}-noise:{noise}.png")
-                plot_histogram(counts, filename=image_filename, bar_labels=False)
-                image_files.append(image_filename)
+def render_histogram(counts, image_filename):
+    import matplotlib
+    matplotlib.use("Agg")
+    from qiskit.tools.visualization import plot_histogram
+
+    plot_histogram(counts, filename=image_filename, bar_labels=False)
+    return image_filename
+
+class HistogramRenderer:
+    '''Renders the histograms in a process pool while the next batches are simulated. Without a directory, no histograms are rendered.'''
+    def __init__(self, histogram_dir="histograms", processes=None) -> None:
+        self.histogram_dir = histogram_dir
+        self.executor = None
+        self.pending = []
+
+        if self.histogram_dir != None:
+            if not os.path.exists(self.histogram_dir):
+                os.mkdir(self.histogram_dir)
+            self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn"))
+
+    def render(self, counts, name):
+        if self.executor == None:
+            return None
+
+        image_filename = os.path.join(self.histogram_dir, name + ".png")
+        self.pending.append(self.executor.submit(render_histogram, counts, image_filename))
+        return image_filename
+
+    def close(self):
+        if self.executor == None:
+            return
+
+        for future in self.pending:
+            future.result()
+        self.executor.shutdown()
+
+class IncrementalResultWriter:
+    '''Appends the rows of each batch to a CSV file, so the results of long studies are written while they are running'''
+    def __init__(self, csv_file) -> None:
+        self.csv_file = csv_file
+        if os.path.exists(self.csv_file):
+            os.remove(self.csv_file)
+
+    def append(self, rows):
+        if len(rows) == 0:
+            return
+        pd.DataFrame(rows).to_csv(self.csv_file, mode="a", header=not os.path.exists(self.csv_file), index=False)
+
+    def read(self):
+        if not os.path.exists(self.csv_file):
+            return pd.DataFrame()
+        return pd.read_csv(self.csv_file)
+
+def simulate_batches(provider, max_batch_size=None):
+    '''Yields each batch with its noisy and perfect results. The jobs of the next batch are submitted before the current one is yielded.'''
+    simulator = QuantumComputerSimulator.create_noisy_simulator()
+    simulator.modify_noise()
+    perfect_simulator = QuantumComputerSimulator.create_perfect_simulator()
+
+    def submit(batch):
+        return (batch, simulator.submit_batch(batch), perfect_simulator.submit_batch(batch))
+
+    submitted = None
+    for batch in provider.get_batches(max_batch_size):
+        following = submit(batch)
+        if submitted != None:
+            yield (submitted[0], submitted[1].result(), submitted[2].result())
+        submitted = following
+
+    if submitted != None:
+        yield (submitted[0], submitted[1].result(), submitted[2].result())
+
+def write_workbook(df_evaluation, xlsx_file, correlation_df=None):
+    '''Writes the tabular results at once and embeds the histograms next to their rows'''
+    from openpyxl.drawing.image import Image
+
+    with pd.ExcelWriter(xlsx_file, engine="openpyxl") as writer:
+        df_evaluation.to_excel(writer, sheet_name="results", index=False)
+        if correlation_df is not None:
+            correlation_df.to_excel(writer, sheet_name="correlation", index=False)
+
+        if "histogram" not in df_evaluation.columns:
+            return
+
+        ws = writer.sheets["results"]
+        image_col = ws.cell(row=1, column=df_evaluation.columns.get_loc("histogram") + 1).column_letter
+        for idx, image_file in enumerate(df_evaluation["histogram"], 2):
+            if not isinstance(image_file, str) or not os.path.exists(image_file):
+                continue
+
+            img = Image(image_file)
+            ws.column_dimensions[image_col].width = img.width // 6
+            ws.row_dimensions[idx].height = img.height
+            ws.add_image(img, f"{image_col}{idx}")
+
+def evaluateDistances(qasm_files_dir="MQTBench", result_file="distances.csv", xlsx_file="results.xlsx", histogram_dir="histograms", processes=None, max_batch_size=None):
+    quantifiers = create_quantifiers()
+    provider = QasmBasedCircuitProvider(dir=qasm_files_dir)
+    renderer = HistogramRenderer(histogram_dir, processes)
+    writer = IncrementalResultWriter(result_file)
+
+    try:
+        for batch, noisy_results, perfect_results in simulate_batches(provider, max_batch_size):
+            evaluation_results = []
+            for noise, results in [(False, perfect_results), (True, noisy_results)]:
+                all_counts = [results.get_counts(circuit.qiskit_circuit) for circuit in batch]
+                closeness = measure_closeness_of_all(quantifiers, [Measurements("channel", counts) for counts in all_counts])
+
+                for i, circuit in enumerate(batch):
+                    results_for_this_circuit = {
+                    "circuit_name": circuit.id,
+                    "Noise": noise,
+                    "histogram": renderer.render(all_counts[i], f"{circuit.id}-noise_{noise}")
+                    }
+
+                    for name in quantifiers.keys():
+                        results_for_this_circuit[name] = closeness[name][i]
+
+                    evaluation_results.append(results_for_this_circuit)
+
+            writer.append(evaluation_results)
+    finally:
+        renderer.close()
+
+    if xlsx_file != None:
+        write_workbook(writer.read(), xlsx_file)
+
+def evaluateCorrelation(qasm_files_dir="MQTBench", result_file="correlation.csv", xlsx_file="results.xlsx", histogram_dir="histograms", processes=None, max_batch_size=None):
+    quantifiers = create_quantifiers()
+    provider = QasmBasedCircuitProvider(dir=qasm_files_dir)
+    renderer = HistogramRenderer(histogram_dir, processes)
+    writer = IncrementalResultWriter(result_file)
+
+    try:
+        for batch, noisy_results, perfect_results in simulate_batches(provider, max_batch_size):
+            all_counts = [noisy_results.get_counts(circuit.qiskit_circuit) for circuit in batch]
+            closeness = measure_closeness_of_all(quantifiers, [Measurements("channel", counts) for counts in all_counts])
+
+            evaluation_results = []
+            for i, circuit in enumerate(batch):
+                counts = all_counts[i]
+                perfect_counts = perfect_results.get_counts(circuit.qiskit_circuit)
+
+                greatest_rank = max(counts, key=counts.get)
+                perfect_rank = max(perfect_counts, key=perfect_counts.get)
 
                 results_for_this_circuit = {
                 "circuit_name": circuit.id,
-                "Noise": noise,
-                "count": "counts"
+                "histogram": renderer.render(counts, circuit.id),
+                "match": greatest_rank == perfect_rank
                 }
-                
-                for name, quantifier in quantifiers.items():
-                    results_for_this_circuit[name] = quantifier.measure_closeness_to_uniform_dist(measurement)
-                    
-                evaluation_results.append(results_for_this_circuit) 
-
-    df_evaluation = pd.DataFrame(evaluation_results)
-    wb = Workbook()
-    ws = wb.active
-
-    for r_idx, row in enumerate(dataframe_to_rows(df_evaluation, index=False, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            ws.cell(row=r_idx, column=c_idx, value=value)
-
-    for idx, image_file in enumerate(image_files, 1):
-        img = Image(image_file)
-       
-        ws.column_dimensions['C'].width = img.width // 6  
-        image_col_width = ws.column_dimensions['C'].width
-        ws.row_dimensions[idx + 1].height = img.height 
-        ws.add_image(img, f"C{idx+1}")
-
-    font = Font(bold=True, size=40)
-    alignment = Alignment(horizontal="center", vertical="center")
-
-    for col in ws.columns:
-        col_dimension = ws.column_dimensions[col[0].column_letter]
-        if col_dimension.width < image_col_width:
-            col_dimension.width = image_col_width
-  
-    for row in ws.iter_rows():
-        for cell in row:
-            cell.font = font
-            cell.alignment = alignment
-
-
-    # Save the workbook
-    wb.save("results.xlsx")
-
-def evaluateCorrelation():
-    quantifiers = {
-    "Shannon Entropy": MeasurementNoiseQuantifier.using_shannon_entropy(0.1),
-    "KL Divergence": MeasurementNoiseQuantifier.using_kl_divergence(0.1),
-    "Cross Entropy": MeasurementNoiseQuantifier.using_cross_entropy(0.1),
-    "Jensen-Shannon Divergence": MeasurementNoiseQuantifier.using_jensen_shannon_divergence(0.1),
-    "Bhattacharyya": MeasurementNoiseQuantifier.using_bhattacharyya(0.1),
-    "Hellinger": MeasurementNoiseQuantifier.using_hellinger(0.1)
-    }
 
-    # Evaluate measurements using the provided distances
-    evaluation_results = []
-    qasm_files_dir = "MQTBench"
-    provider = QasmBasedCircuitProvider(dir=qasm_files_dir)  
-
-    image_files = []
-    if not os.path.exists('histograms'):
-        os.mkdir('histograms')
-
-    for batch in provider.get():          
-        simulator = QuantumComputerSimulator.create_noisy_simulator() 
-        simulator.modify_noise()
-
-        
-        perfect_simulator = QuantumComputerSimulator.create_perfect_simulator()
-        
-        results = simulator.execute_batch(batch.circuits)
-        perfect_results = perfect_simulator.execute_batch(batch.circuits)
-        for circuit in batch.circuits:
-            
-            counts = results.get_counts(circuit.qiskit_circuit)
-            perfect_counts = perfect_results.get_counts(circuit.qiskit_circuit)
-
-            measurement = Measurements("channel", counts)
-            greatest_rank = max(counts, key=counts.get)
-            perfect_rank = max(perfect_counts, key=counts.get)
-            
-            if (greatest_rank == perfect_rank ):
-                match = True
-            else:
-                match = False
-
-            image_filename = os.path.join("histograms", f"{circuit.id}.png")
-            plot_histogram(counts, filename=image_filename, bar_labels=False)
-            image_files.append(image_filename)
-
-            results_for_this_circuit = {
-            "circuit_name": circuit.id,
-            "count": "counts",
-            "match": match
-            }
-            
-            for name, quantifier in quantifiers.items():
-                results_for_this_circuit[name] = quantifier.measure_closeness_to_uniform_dist(measurement)
-                
-            evaluation_results.append(results_for_this_circuit)
-
-    df_evaluation = pd.DataFrame(evaluation_results)
-    wb = Workbook()
-    ws = wb.active
-
-    for r_idx, row in enumerate(dataframe_to_rows(df_evaluation, index=False, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            ws.cell(row=r_idx, column=c_idx, value=value)
-
-    for idx, image_file in enumerate(image_files, 1):
-        img = Image(image_file)
-       
-        ws.column_dimensions['J'].width = img.width // 6  
-        image_col_width = ws.column_dimensions['J'].width
-        ws.row_dimensions[idx + 1].height = img.height 
-        ws.add_image(img, f"J{idx+1}")
+                for name in quantifiers.keys():
+                    results_for_this_circuit[name] = closeness[name][i]
 
+                evaluation_results.append(results_for_this_circuit)
+
+            writer.append(evaluation_results)
+    finally:
+        renderer.close()
+
+    df_evaluation = writer.read()
     correlation_results = {"Metric": [], "Correlation with Match": []}
     for quantifier_name in quantifiers.keys():
-        correlation = df_evaluation["match"].astype(int).corr(df_evaluation[quantifier_name])
+        correlation = df_evaluation["match"].astype(int).corr(df_evaluation[quantifier_name]) if len(df_evaluation) > 0 else float("nan")
         correlation_results["Metric"].append(quantifier_name)
         correlation_results["Correlation with Match"].append(correlation)
 
-    # Convert the correlation results in a DataFrame and insert into workbook
     correlation_df = pd.DataFrame(correlation_results)
-    for r_idx, row in enumerate(dataframe_to_rows(correlation_df, index=False, header=True), ws.max_row + 2):
-        for c_idx, value in enumerate(row, 1):
-            ws.cell(row=r_idx, column=c_idx, value=value)
-
-    font = Font(bold=True, size=40)
-    alignment = Alignment(horizontal="center", vertical="center")
-
-    for col in ws.columns:
-        col_dimension = ws.column_dimensions[col[0].column_letter]
-        if col_dimension.width < image_col_width:
-            col_dimension.width = image_col_width
-
-  
-    for row in ws.iter_rows():
-        for cell in row:
-            cell.font = font
-            cell.alignment = alignment
+    correlation_df.to_csv(os.path.splitext(result_file)[0] + "_summary.csv", index=False)
+    print(correlation_df)
 
-
-    # Save the workbook
-    wb.save("results.xlsx")
+    if xlsx_file != None:
+        write_workbook(df_evaluation, xlsx_file, correlation_df)
 
 if __name__ == '__main__':
-    evaluateCorrelation()
-
-    
-
-
-
+    parser = argparse.ArgumentParser(description="Evaluates the noise quantifiers on the circuits of a QASM benchmark")
+    parser.add_argument("study", choices=["distances", "correlation"], nargs="?", default="correlation")
+    parser.add_argument("--qasm-dir", default="MQTBench")
+    parser.add_argument("--result-file", default=None, help="CSV file to which the results are written incrementally")
+    parser.add_argument("--xlsx-file", default="results.xlsx")
+    parser.add_argument("--no-xlsx", action="store_true")
+    parser.add_argument("--no-histograms", action="store_true")
+    parser.add_argument("--processes", type=int, default=None, help="Number of processes rendering histograms")
+    parser.add_argument("--max-batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    study = evaluateDistances if args.study == "distances" else evaluateCorrelation
+    result_file = args.result_file if args.result_file != None else args.study + ".csv"
+    study(qasm_files_dir=args.qasm_dir,
+          result_file=result_file,
+          xlsx_file=None if args.no_xlsx else args.xlsx_file,
+          histogram_dir=None if args.no_histograms else "histograms",
+          processes=args.processes,
+          max_batch_size=args.max_batch_size)
@@ -0,0 +1,18 @@
+import argparse
+from os.path import dirname
+from experiment.ftqc_experiment import FaultTolerantQCExperiment
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluates stored experiment results without initializing any device")
+    parser.add_argument("result_files", nargs="+")
+    parser.add_argument("--outputdir", default=None, help="Directory of the evaluation, defaults to the directory of the first result file")
+    parser.add_argument("--all", action="store_true", help="Also evaluate results whose aggregated measurements have been rejected")
+    args = parser.parse_args()
+
+    ftqc_exp = FaultTolerantQCExperiment(None, None, [])
+    results = []
+    for result_file in args.result_files:
+        results.extend(ftqc_exp.load_from(result_file) if args.all else ftqc_exp.load_accepted_from(result_file))
+
+    print("Evaluate " + str(len(results)) + " results")
+    ftqc_exp.evaluate(results, args.outputdir if args.outputdir != None else dirname(args.result_files[0]) or ".")
@@ -0,0 +1,41 @@
+import numpy as np
+
+DEFAULT_RESAMPLES = 2000
+DEFAULT_CONFIDENCE = 0.95
+# Upper bound of drawn indices held in memory at once
+MAX_CHUNK_SIZE = 4000000
+
+class BootstrapConfidence:
+    '''Percentile bootstrap of metrics that are sums over the results of an approach. Each resample draws the indices of the
+    results with replacement and is turned into the number of times every result has been drawn, so the sums of all metrics
+    over all resamples are a single matrix product.'''
+    def __init__(self, num_resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=0) -> None:
+        self.num_resamples = num_resamples
+        self.confidence = confidence
+        self.seed = seed
+
+    def resampled_sums(self, values):
+        '''Sums of the columns of values (results x metrics) for every resample of the results'''
+        values = np.asarray(values, dtype=float)
+        num_results = len(values)
+        rng = np.random.default_rng(self.seed)
+        chunk_size = max(1, MAX_CHUNK_SIZE // max(num_results, 1))
+
+        sums = []
+        for start in range(0, self.num_resamples, chunk_size):
+            size = min(chunk_size, self.num_resamples - start)
+            idxs = rng.integers(0, num_results, size=(size, num_results)) + num_results * np.arange(size)[:, None]
+            draws = np.bincount(idxs.ravel(), minlength=size * num_results).reshape(size, num_results)
+            sums.append(draws @ values)
+        return np.vstack(sums)
+
+    def interval(self, samples):
+        '''Lower and upper bound of each column'''
+        alpha = (1 - self.confidence) / 2
+        return np.quantile(samples, [alpha, 1 - alpha], axis=0)
+
+def comparison_counts(agg_positions, ref_positions):
+    '''Per result indicators of whether the aggregated position is worse, equal or better than the reference'''
+    agg_positions = np.asarray(agg_positions)
+    ref_positions = np.asarray(ref_positions)
+    return np.stack([agg_positions > ref_positions, agg_positions == ref_positions, agg_positions < ref_positions], axis=1)
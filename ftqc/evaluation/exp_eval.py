@@ -1,7 +1,7 @@
 import datetime
-import pandas as pd
+import numpy as np
 from evaluation.metrics import NumberOfCorrectCircuits, NumberOfTopTenCircuits, DirectComparisonWithAgg
-from tabulate import tabulate
+from evaluation.bootstrap import BootstrapConfidence, comparison_counts
 from os.path import join 
 
 class ApproachResult:
@@ -12,20 +12,55 @@ class ApproachResult:
         self.num_top_ten_evaluator = NumberOfTopTenCircuits()
         self.direct_comparison_evaluator = DirectComparisonWithAgg()
         
-    def evaluate(self):
+    def evaluate(self, bootstrap=None):
         avg_pos_results = [result.avg_postion() for result in self.results]
         agg_pos_results = [result.position_of_agg() for result in self.results]
         fixed_pos_results = [result.position_of_closest() for result in self.results]
         top_ten_size = [result.top_ten_size for result in self.results]
 
-        return [[self.approach, "Avg", self.num_correct_evaluator.evaluate(avg_pos_results), self.num_top_ten_evaluator.evaluate(avg_pos_results, top_ten_size), self.direct_comparison_evaluator.evaluate(agg_pos_results, avg_pos_results)],
+        rows = [[self.approach, "Avg", self.num_correct_evaluator.evaluate(avg_pos_results), self.num_top_ten_evaluator.evaluate(avg_pos_results, top_ten_size), self.direct_comparison_evaluator.evaluate(agg_pos_results, avg_pos_results)],
             [self.approach, "Agg", self.num_correct_evaluator.evaluate(agg_pos_results), self.num_top_ten_evaluator.evaluate(agg_pos_results, top_ten_size), self.direct_comparison_evaluator.evaluate_with_single(self.results)],
             [self.approach, "Fixed", self.num_correct_evaluator.evaluate(fixed_pos_results), self.num_top_ten_evaluator.evaluate(fixed_pos_results, top_ten_size), self.direct_comparison_evaluator.evaluate(agg_pos_results, fixed_pos_results)]]
-        
+
+        if bootstrap != None:
+            intervals = self.confidence_intervals(bootstrap, avg_pos_results, agg_pos_results, fixed_pos_results, top_ten_size)
+            for row, row_intervals in zip(rows, intervals):
+                row.extend(row_intervals)
+
+        return rows
+
+    def confidence_intervals(self, bootstrap, avg_pos_results, agg_pos_results, fixed_pos_results, top_ten_size):
+        '''Intervals of numT1, numT10% and the comparison of each view, all of them computed from the same resamples'''
+        positions = np.array([avg_pos_results, agg_pos_results, fixed_pos_results]).T
+        top_ten_size = np.asarray(top_ten_size)[:, None]
+
+        # The aggregated measurements are compared with every single measurement of a result
+        single_counts = np.zeros((len(self.results), 3))
+        for i, result in enumerate(self.results):
+            single_counts[i] = comparison_counts(np.full(len(result.single_measurements), agg_pos_results[i]), result.position_singles()).sum(axis=0)
+
+        values = np.hstack([positions == 0,
+                            positions <= top_ten_size,
+                            comparison_counts(agg_pos_results, avg_pos_results),
+                            single_counts,
+                            comparison_counts(agg_pos_results, fixed_pos_results)])
+        sums = bootstrap.resampled_sums(values)
+
+        comparisons = [sums[:, 6:9], sums[:, 9:12], sums[:, 12:15]]
+        intervals = []
+        for view in range(3):
+            num_t1 = bootstrap.interval(sums[:, view])
+            num_t10 = bootstrap.interval(sums[:, 3 + view])
+            comparison = bootstrap.interval(comparisons[view] / np.maximum(comparisons[view].sum(axis=1, keepdims=True), 1))
+            intervals.append([tuple(round(float(bound), 1) for bound in num_t1),
+                              tuple(round(float(bound), 1) for bound in num_t10),
+                              tuple((round(float(lower), 3), round(float(upper), 3)) for lower, upper in zip(comparison[0], comparison[1]))])
+        return intervals
 
 class FtqcExperimentEvaluator:
-    def __init__(self, results, result_directory) -> None:
+    def __init__(self, results, result_directory, bootstrap=BootstrapConfidence()) -> None:
         self.result_directory = result_directory
+        self.bootstrap = bootstrap
         self.approaches = {}
         for result in results:
             if result.ft_qcontainer not in self.approaches.keys():
@@ -34,20 +69,33 @@ class FtqcExperimentEvaluator:
             self.approaches[result.ft_qcontainer].append(result)
 
     def evaluate(self):
+        return FtqcExperimentEvaluator.print_and_save(self.evaluations(), save_directory=self.result_directory)
+
+    def evaluations(self):
         evaluations = {}
         for approach, results in self.approaches.items():
-            evaluations[approach] = ApproachResult(approach, results).evaluate()
+            evaluations[approach] = ApproachResult(approach, results).evaluate(self.bootstrap)
+        return evaluations
+
+    def to_data_frame(evaluations):
+        import pandas as pd
 
-        return FtqcExperimentEvaluator.print_and_save(evaluations, save_directory=self.result_directory)
-            
-    def print_and_save(evaluations, save_directory="."):
         df = []
 
         for key in evaluations:
             df.extend(evaluations[key])
 
-        df = pd.DataFrame(df, columns=["Appr.", "View", "numT1", "numT10%", "comparison"])
-        df = df.round(decimals=1)
+        columns = ["Appr.", "View", "numT1", "numT10%", "comparison"]
+        if len(df) > 0 and len(df[0]) > len(columns):
+            columns += ["numT1 CI", "numT10% CI", "comparison CI"]
+
+        df = pd.DataFrame(df, columns=columns)
+        return df.round(decimals=1)
+            
+    def print_and_save(evaluations, save_directory="."):
+        from tabulate import tabulate
+
+        df = FtqcExperimentEvaluator.to_data_frame(evaluations)
         print(tabulate(df, headers='keys', tablefmt='pretty', showindex=False))
         
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -0,0 +1,114 @@
+import copy
+import numpy as np
+from os.path import join
+from core.qerror_detection import measure_closeness_of_all
+from experiment.util import determine_position
+
+class QuantifierThresholdAnalysis:
+    '''Evaluates candidate thresholds of noise quantifiers on stored measurements. A quantifier accepts measurements whose
+    closeness to the uniform distribution is at least its threshold, a positive is a measurement whose most frequent state
+    is correct. Scores are computed once, all thresholds of a quantifier are then evaluated in a single vectorized pass.'''
+    def __init__(self, scores, matches, quantifiers=None) -> None:
+        self.scores = {name: np.asarray(values, dtype=float) for name, values in scores.items()}
+        self.matches = np.asarray(matches, dtype=bool)
+        self.quantifiers = quantifiers
+
+        if any(len(values) != len(self.matches) for values in self.scores.values()):
+            raise Exception("There must be a score of each quantifier for every label.")
+
+    def from_measurements(quantifiers, all_measurements, matches):
+        return QuantifierThresholdAnalysis(measure_closeness_of_all(quantifiers, all_measurements), matches, quantifiers)
+
+    def from_results(quantifiers, results):
+        '''Uses the single-channel measurements of experiment results, labelled by whether the correct state is ranked first'''
+        all_measurements = [measurements for result in results for measurements in result.single_measurements]
+        matches = [determine_position(result.ground_truth, measurements) == 0 for result in results for measurements in result.single_measurements]
+        return QuantifierThresholdAnalysis.from_measurements(quantifiers, all_measurements, matches)
+
+    def from_table(df, quantifier_names, match_column="match"):
+        '''Uses the scores stored by dist_exp, e.g. its correlation CSV'''
+        return QuantifierThresholdAnalysis({name: df[name].to_numpy() for name in quantifier_names}, df[match_column].to_numpy())
+
+    def candidate_thresholds(self, name):
+        '''Every distinct score is an operating point, +inf rejects all measurements'''
+        return np.append(np.unique(self.scores[name]), np.inf)
+
+    def sweep(self, name, thresholds=None):
+        import pandas as pd
+
+        thresholds = self.candidate_thresholds(name) if thresholds is None else np.asarray(thresholds, dtype=float)
+        scores = self.scores[name]
+        positive_scores = np.sort(scores[self.matches])
+        negative_scores = np.sort(scores[~self.matches])
+
+        # Number of scores >= threshold for each threshold at once
+        tp = len(positive_scores) - np.searchsorted(positive_scores, thresholds, side="left")
+        fp = len(negative_scores) - np.searchsorted(negative_scores, thresholds, side="left")
+        fn = len(positive_scores) - tp
+        tn = len(negative_scores) - fp
+        accepted = tp + fp
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tpr = np.where(len(positive_scores) > 0, tp / max(len(positive_scores), 1), np.nan)
+            fpr = np.where(len(negative_scores) > 0, fp / max(len(negative_scores), 1), np.nan)
+            precision = np.where(accepted > 0, tp / np.maximum(accepted, 1), np.nan)
+            f1 = np.where(precision + tpr > 0, 2 * precision * tpr / (precision + tpr), 0.0)
+
+        return pd.DataFrame({"threshold": thresholds, "tp": tp, "fp": fp, "tn": tn, "fn": fn,
+                             "tpr": tpr, "fpr": fpr, "precision": precision, "recall": tpr, "f1": f1,
+                             "accept_rate": accepted / max(len(scores), 1)})
+
+    def roc_curve(self, name):
+        sweep = self.sweep(name).sort_values(["fpr", "tpr"])
+        return sweep["fpr"].to_numpy(), sweep["tpr"].to_numpy(), sweep["threshold"].to_numpy()
+
+    def roc_auc(self, name):
+        '''An AUC below 0.5 indicates that the quantifier rejects the correct measurements rather than the noisy ones'''
+        fpr, tpr, _ = self.roc_curve(name)
+        return float(np.trapz(tpr, fpr))
+
+    def pr_curve(self, name):
+        sweep = self.sweep(name)
+        sweep = sweep[sweep["tp"] + sweep["fp"] > 0].sort_values(["recall", "precision"], ascending=[True, False])
+        return sweep["recall"].to_numpy(), sweep["precision"].to_numpy(), sweep["threshold"].to_numpy()
+
+    def optimal_thresholds(self, criterion="youden"):
+        '''The threshold of each quantifier maximizing tpr - fpr (youden) or the f1 score (f1)'''
+        import pandas as pd
+
+        rows = []
+        for name in self.scores.keys():
+            sweep = self.sweep(name)
+            if criterion == "youden":
+                objective = (sweep["tpr"] - sweep["fpr"]).fillna(-np.inf)
+            elif criterion == "f1":
+                objective = sweep["f1"].fillna(-np.inf)
+            else:
+                raise Exception("Unknown criterion " + criterion + ", use youden or f1.")
+
+            best = sweep.loc[objective.idxmax()]
+            rows.append([name, best["threshold"], best["tpr"], best["fpr"], best["precision"], best["accept_rate"], self.roc_auc(name)])
+
+        return pd.DataFrame(rows, columns=["quantifier", "threshold", "tpr", "fpr", "precision", "accept_rate", "roc_auc"])
+
+    def tuned_quantifiers(self, criterion="youden"):
+        '''Returns copies of the analysed quantifiers using their optimal thresholds'''
+        if self.quantifiers == None:
+            raise Exception("The analysis has been created from scores only, there are no quantifiers to tune.")
+
+        optimal = self.optimal_thresholds(criterion).set_index("quantifier")
+        tuned = {}
+        for name, quantifier in self.quantifiers.items():
+            tuned[name] = copy.copy(quantifier)
+            tuned[name].threshold = float(optimal.loc[name, "threshold"])
+        return tuned
+
+    def save(self, save_directory=".", criterion="youden"):
+        import pandas as pd
+
+        curves = pd.concat([self.sweep(name).assign(quantifier=name) for name in self.scores.keys()], ignore_index=True)
+        curves.to_csv(join(save_directory, "threshold_sweep.csv"), index=False)
+
+        optimal = self.optimal_thresholds(criterion)
+        optimal.to_csv(join(save_directory, "optimal_thresholds.csv"), index=False)
+        return optimal
@@ -2,36 +2,50 @@ import json
 import re
 import math
 from typing import Any
+from core import memory_profile, qchannels
 from core.entities import QuantumContainerOrchestrator, Measurements
 from core.qchannels import QuantumRedundancyChannel
 from experiment.util import simulate_and_retrieve_best_solution, determine_position, save_results, load_results
 from evaluation.exp_eval import FtqcExperimentEvaluator
 
 class FaultTolerantQCExperiment:
-    def __init__(self, circuit_provider, qdevice_provider, ft_qcontainers):
+    def __init__(self, circuit_provider, qdevice_provider, ft_qcontainers, orchestrator_factory=QuantumContainerOrchestrator):
         self.ft_qcontainers = ft_qcontainers
         self.circuit_provider = circuit_provider
         self.qdevice_provider = qdevice_provider
+        self.orchestrator_factory = orchestrator_factory
 
     def run_experiment(self):
         results = []
         
-        orch_result = QuantumContainerOrchestrator(self.ft_qcontainers, self.qdevice_provider)
+        orch_result = self.orchestrator_factory(self.ft_qcontainers, self.qdevice_provider)
         orch_result.orchestrate_executions(self.circuit_provider)
         for circuit in self.circuit_provider.get():
             ground_truth = simulate_and_retrieve_best_solution(circuit)
             for qcontainer in self.ft_qcontainers:
+                if not orch_result.has_result_for(circuit, qcontainer):
+                    # The container has skipped the circuit, e.g. because a channel has dropped it
+                    continue
                 aggregated, single = orch_result.get_result_for(circuit, qcontainer)
                 results.append(ExperimentResult(qcontainer.id, ground_truth, aggregated, single))
+        memory_profile.checkpoint("ground_truth", aggregated_results=orch_result.aggregated_results, results=results)
         
         return results
     
     def save(self, results, result_dir):
         save_results(results, result_dir, ExperimentResult.JSONEncoder)
+        memory_profile.checkpoint("serialization", results=results)
+        if memory_profile.memory_profiler != None:
+            memory_profile.memory_profiler.save_report(result_dir)
+        if qchannels.transpilation_budget != None:
+            qchannels.transpilation_budget.save_report(result_dir)
 
     def load_from(self, result_file):
         return load_results(result_file, ExperimentResult.from_json)
 
+    def load_accepted_from(self, result_file):
+        return [result for result in self.load_from(result_file) if result.agg_measurements.accepted]
+
     def evaluate(self, results, result_dir):
         FtqcExperimentEvaluator(results, result_dir).evaluate()
 
@@ -90,7 +104,8 @@ class ExperimentResult:
         if "generated_from_channel" in json_dct.keys():
             return Measurements(json_dct["generated_from_channel"], 
                                 json_dct["measurements"], 
-                                json_dct["accepted"])
+                                json_dct["accepted"],
+                                json_dct.get("expected_fidelity", None))
         
         if "ft_qcontainer" in json_dct.keys():
             return ExperimentResult(json_dct["ft_qcontainer"],
@@ -0,0 +1,191 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from builder.ft_builder import CombinerPatternBuilder, ComparisonPatternBuilder, SparingPatternBuilder, ConformalMeasurementsBuilder
+from core.combiner import LinearOpinionPool
+from core.conformal_measurements import default_conformity_threshold, default_top_n_rate, agreement_multiplier
+from core.qerror_detection import MeasurementNoiseQuantifier, MeasurementComparison
+from core.qswitches import SimpleQuantumRedundancySwitch
+from experiment.ftqc_experiment import FaultTolerantQCExperiment, ExperimentResult
+
+# Parameters of the aggregators that can be varied by a replay, with the values used by pattern_definition.py
+DEFAULT_PARAMS = {"top_n_rate": default_top_n_rate,
+                  "conformity_threshold": default_conformity_threshold,
+                  "agreement_multiplier": agreement_multiplier,
+                  "num_matching_solutions": None,
+                  "noise_threshold": 0.1,
+                  "combiner_weights": None,
+                  "switch_seed": None}
+
+def channel_type(channel_id):
+    '''Class name of a stored channel id, e.g. DifferentOptimizationLevel for DifferentOptimizationLevel_fake_x_1_<uuid>'''
+    return channel_id.split("_")[0]
+
+def combiner_pattern(pattern_id, channel_ids, params):
+    builder = CombinerPatternBuilder(pattern_id)
+    for channel_id in channel_ids:
+        builder.add_channel(channel_id)
+
+    # Weights are given per channel type and normalized over the channels of the container
+    weights = params["combiner_weights"]
+    if weights == None:
+        builder.combine_measurements_uniformly()
+    else:
+        raw_weights = {channel_id: weights.get(channel_type(channel_id), 1.0) for channel_id in channel_ids}
+        total = sum(raw_weights.values())
+        builder.combine_measurements_with(LinearOpinionPool({channel_id: weight / total for channel_id, weight in raw_weights.items()}))
+    return builder.build()
+
+def noise_sparing_pattern(pattern_id, channel_ids, params):
+    builder = SparingPatternBuilder(pattern_id)
+    builder.with_operational(channel_ids[0])
+    for channel_id in channel_ids[1:]:
+        builder.and_spare(channel_id)
+    builder.using_single_error_detection(MeasurementNoiseQuantifier.using_hellinger(params["noise_threshold"]))
+    builder.using_quantum_switch(SimpleQuantumRedundancySwitch(params["switch_seed"]))
+    return builder.build()
+
+def comparison_sparing_pattern(pattern_id, channel_ids, params):
+    '''The channels are stored unit after unit as pairs of primary and comparator'''
+    builder = SparingPatternBuilder(pattern_id)
+    pairs = [(channel_ids[i], channel_ids[i + 1]) for i in range(0, len(channel_ids) - 1, 2)]
+    for i, (primary, comparator) in enumerate(pairs):
+        fault_detector = MeasurementComparison(primary, comparator, params["num_matching_solutions"])
+        if i == 0:
+            builder.with_operational(primary, comparator, fault_detector)
+        else:
+            builder.and_spare(primary, comparator, fault_detector)
+    builder.using_quantum_switch(SimpleQuantumRedundancySwitch(params["switch_seed"]))
+    return builder.build()
+
+def comparison_pattern(pattern_id, channel_ids, params):
+    builder = ComparisonPatternBuilder(pattern_id)
+    builder.with_primary_channel(channel_ids[0]).and_comparator(channel_ids[1])
+    if params["num_matching_solutions"] != None:
+        builder.num_of_matching_solutions(params["num_matching_solutions"])
+    return builder.build()
+
+def conformal_pattern(pattern_id, channel_ids, params):
+    builder = ConformalMeasurementsBuilder(pattern_id)
+    for channel_id in channel_ids:
+        builder.add_channel(channel_id)
+    builder.set_optional_top_n_rate(params["top_n_rate"])
+    builder.with_agreement_multiplier(params["agreement_multiplier"])
+    builder.with_min_conformity(params["conformity_threshold"])
+    return builder.build()
+
+# Builds the container of each pattern of pattern_definition.py from the ids of its stored channels
+PATTERNS = {"C_seed": combiner_pattern,
+            "C_back": combiner_pattern,
+            "C_opt": combiner_pattern,
+            "C_hyb": combiner_pattern,
+            "S_noise": noise_sparing_pattern,
+            "S_com": comparison_sparing_pattern,
+            "M_seed": conformal_pattern,
+            "M_hyb": conformal_pattern}
+
+def pattern_for(pattern_id, patterns=PATTERNS):
+    if pattern_id in patterns.keys():
+        return patterns[pattern_id]
+
+    # Patterns not known by name are identified by the prefix convention of pattern_definition.py
+    prefixes = {"C": combiner_pattern, "M": conformal_pattern}
+    if pattern_id[0] in prefixes.keys():
+        return prefixes[pattern_id[0]]
+    raise Exception("There is no replay pattern for container " + pattern_id)
+
+def expand_grid(grid):
+    '''All combinations of the values of the grid, {name: [values]}, as parameter dicts'''
+    names = sorted(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+class ReplayEngine:
+    '''Re-aggregates the channel measurements stored in result files with new parameters of the aggregators. The stored
+    ground truth is reused, so neither circuits nor devices are needed. Results are replayed in the stored order, as
+    sparing switches carry their state from one circuit to the next.'''
+    def __init__(self, results, patterns=PATTERNS, accepted_only=True) -> None:
+        self.results = results
+        self.patterns = patterns
+        self.accepted_only = accepted_only
+
+        # The channels of a container are those of its first result with the most measurements
+        self.channel_ids = {}
+        for result in results:
+            channel_ids = [m.generated_from_channel for m in result.single_measurements]
+            if len(channel_ids) > len(self.channel_ids.get(result.ft_qcontainer, [])):
+                self.channel_ids[result.ft_qcontainer] = channel_ids
+
+    def from_files(result_files, patterns=PATTERNS, accepted_only=True):
+        ftqc_exp = FaultTolerantQCExperiment(None, None, [])
+        results = [result for result_file in result_files for result in ftqc_exp.load_from(result_file)]
+        return ReplayEngine(results, patterns, accepted_only)
+
+    def containers_for(self, params):
+        params = dict(DEFAULT_PARAMS, **params)
+        return {pattern_id: pattern_for(pattern_id, self.patterns)(pattern_id, channel_ids, params)
+                for pattern_id, channel_ids in self.channel_ids.items()}
+
+    def replay(self, params):
+        '''Results of the stored circuits aggregated with the given parameters'''
+        containers = self.containers_for(params)
+
+        replayed = []
+        for result in self.results:
+            aggregated = containers[result.ft_qcontainer].aggregate(result.single_measurements)
+            if self.accepted_only and not aggregated.accepted:
+                continue
+            replayed.append(ExperimentResult(result.ft_qcontainer, result.ground_truth, aggregated, result.single_measurements, result.top_ten_size))
+        return replayed
+
+    def evaluate(self, params, bootstrap=None):
+        '''Evaluation table of the results replayed with the parameters, with a column per parameter'''
+        from evaluation.exp_eval import FtqcExperimentEvaluator
+
+        df = FtqcExperimentEvaluator.to_data_frame(FtqcExperimentEvaluator(self.replay(params), None, bootstrap).evaluations())
+        for i, name in enumerate(sorted(params.keys())):
+            df.insert(i, name, [params[name]] * len(df))
+        return df
+
+_engine = None
+
+def _evaluate_point(result_files, patterns, accepted_only, params):
+    # Each process loads the result files once for all of its grid points
+    global _engine
+    if _engine == None:
+        _engine = ReplayEngine.from_files(result_files, patterns, accepted_only)
+    return _engine.evaluate(params)
+
+class GridReplay:
+    '''Replays stored results for every point of a parameter grid, the points are evaluated in parallel processes'''
+    def __init__(self, result_files, grid, patterns=PATTERNS, accepted_only=True, processes=1) -> None:
+        self.result_files = result_files
+        self.points = expand_grid(grid)
+        self.patterns = patterns
+        self.accepted_only = accepted_only
+        self.processes = processes
+
+    def run(self):
+        '''Evaluation tables of all grid points in the order of the points'''
+        print("Replay " + str(len(self.points)) + " grid points")
+        if self.processes <= 1:
+            engine = ReplayEngine.from_files(self.result_files, self.patterns, self.accepted_only)
+            return [engine.evaluate(params) for params in self.points]
+
+        with ProcessPoolExecutor(max_workers=self.processes, mp_context=get_context("spawn")) as executor:
+            futures = [executor.submit(_evaluate_point, self.result_files, self.patterns, self.accepted_only, params) for params in self.points]
+            return [future.result() for future in futures]
+
+    def save(self, tables, result_dir):
+        import datetime
+        import pandas as pd
+        from os.path import join
+        from tabulate import tabulate
+
+        df = pd.concat(tables, ignore_index=True)
+        print(tabulate(df, headers='keys', tablefmt='pretty', showindex=False))
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        csv_filename = join(result_dir, f"replay_{timestamp}.csv")
+        df.to_csv(csv_filename, index=False)
+        print("Replay evaluations have been written to file: " + csv_filename)
+        return csv_filename
@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+from os.path import dirname
+from experiment.ftqc_experiment import ExperimentResult
+
+class SweepResultStore:
+    '''Collects the results and evaluations of all points of a parameter sweep in a single SQLite file, indexed by point and container'''
+    def __init__(self, db_file) -> None:
+        self.db_file = db_file
+        if dirname(self.db_file) != "":
+            os.makedirs(dirname(self.db_file), exist_ok=True)
+
+        connection = self._connect()
+        try:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS points (
+                    point_id TEXT PRIMARY KEY,
+                    section TEXT NOT NULL,
+                    rep INTEGER NOT NULL,
+                    params TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS results (
+                    point_id TEXT NOT NULL,
+                    ft_qcontainer TEXT NOT NULL,
+                    result TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS evaluations (
+                    point_id TEXT NOT NULL,
+                    approach TEXT NOT NULL,
+                    view TEXT NOT NULL,
+                    num_t1 REAL,
+                    num_t10 REAL,
+                    comparison TEXT);
+                CREATE INDEX IF NOT EXISTS results_by_point ON results (point_id, ft_qcontainer);
+                CREATE INDEX IF NOT EXISTS evaluations_by_point ON evaluations (point_id, approach);""")
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=60)
+
+    def add(self, point, results, evaluation_table):
+        '''Replaces everything stored for the point'''
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM results WHERE point_id = ?", (point.point_id,))
+                connection.execute("DELETE FROM evaluations WHERE point_id = ?", (point.point_id,))
+                connection.execute("INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?)",
+                                   (point.point_id, point.section, point.rep, json.dumps(point.params, sort_keys=True, default=str)))
+                connection.executemany("INSERT INTO results VALUES (?, ?, ?)",
+                                       [(point.point_id, result.ft_qcontainer, json.dumps(result, sort_keys=True, cls=ExperimentResult.JSONEncoder))
+                                        for result in results])
+                connection.executemany("INSERT INTO evaluations VALUES (?, ?, ?, ?, ?, ?)",
+                                       [(point.point_id, row["Appr."], row["View"], row["numT1"], row["numT10%"], str(row["comparison"]))
+                                        for _, row in evaluation_table.iterrows()])
+        finally:
+            connection.close()
+
+    def point_ids(self):
+        connection = self._connect()
+        try:
+            return [row[0] for row in connection.execute("SELECT point_id FROM points ORDER BY point_id")]
+        finally:
+            connection.close()
+
+    def params_of(self, point_id):
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT params FROM points WHERE point_id = ?", (point_id,)).fetchone()
+        finally:
+            connection.close()
+
+        if row == None:
+            raise Exception("There is no point with id " + point_id)
+        return json.loads(row[0])
+
+    def results_of(self, point_id, ft_qcontainer=None):
+        query = "SELECT result FROM results WHERE point_id = ?"
+        args = (point_id,)
+        if ft_qcontainer != None:
+            query += " AND ft_qcontainer = ?"
+            args = (point_id, ft_qcontainer)
+
+        connection = self._connect()
+        try:
+            return [json.loads(row[0], object_hook=ExperimentResult.from_json) for row in connection.execute(query, args)]
+        finally:
+            connection.close()
+
+    def evaluations(self):
+        '''Returns the evaluations of all points as a single table'''
+        import pandas as pd
+
+        connection = self._connect()
+        try:
+            return pd.read_sql_query("""SELECT p.point_id, p.section, p.rep, p.params, e.approach, e.view, e.num_t1, e.num_t10, e.comparison
+                                        FROM evaluations e JOIN points p ON e.point_id = p.point_id
+                                        ORDER BY p.point_id, e.approach""", connection)
+        finally:
+            connection.close()
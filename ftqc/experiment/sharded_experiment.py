@@ -0,0 +1,120 @@
+import os
+import socket
+import threading
+import time
+from os.path import join, exists
+from experiment.ftqc_experiment import FaultTolerantQCExperiment, ExperimentResult
+from experiment.util import save_results, load_results
+from experiment.work_queue import DONE, FAILED, LEASED, PENDING
+from provider.circuit_provider import ShardedCircuitProvider
+
+PARTIAL_RESULTS_DIR = "partials"
+
+class ShardWorker:
+    '''Claims shards from the work queue, runs the experiment for the circuits of each shard and writes partial result files'''
+    def __init__(self, work_queue, circuit_provider, num_shards, qdevice_provider, ft_qcontainers, result_dir, worker_id=None) -> None:
+        self.work_queue = work_queue
+        self.circuit_provider = circuit_provider
+        self.num_shards = num_shards
+        self.qdevice_provider = qdevice_provider
+        self.ft_qcontainers = ft_qcontainers
+        self.result_dir = result_dir
+        self.worker_id = worker_id if worker_id != None else socket.gethostname() + "-" + str(os.getpid())
+
+    def run(self, poll_interval=5):
+        num_processed = 0
+        while True:
+            shard_idx = self.work_queue.claim(self.worker_id)
+            if shard_idx == None:
+                # Shards leased by other workers are claimed once their lease has expired, in case these workers crashed
+                if self.work_queue.is_done():
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            print("Worker " + self.worker_id + " claimed shard " + str(shard_idx))
+            stop_renewal = threading.Event()
+            renewal = threading.Thread(target=self._renew_lease, args=(shard_idx, stop_renewal), daemon=True)
+            renewal.start()
+            try:
+                result_file = self.process(shard_idx)
+            finally:
+                stop_renewal.set()
+                renewal.join()
+
+            if self.work_queue.complete(shard_idx, self.worker_id, result_file):
+                num_processed += 1
+            else:
+                print("Shard " + str(shard_idx) + " has already been completed by another worker")
+
+        print("Worker " + self.worker_id + " processed " + str(num_processed) + " shards")
+        return num_processed
+
+    def process(self, shard_idx):
+        shard_provider = ShardedCircuitProvider(self.circuit_provider, self.num_shards, shard_idx)
+        ftqc_exp = FaultTolerantQCExperiment(shard_provider, self.qdevice_provider, self.ft_qcontainers)
+        results = ftqc_exp.run_experiment()
+
+        partial_dir = join(self.result_dir, PARTIAL_RESULTS_DIR)
+        os.makedirs(partial_dir, exist_ok=True)
+
+        # Write to a temporary file first, so a crashing worker never leaves a truncated partial result behind
+        result_file = join(partial_dir, "shard_{0:05d}.json".format(shard_idx))
+        tmp_file = result_file + "." + self.worker_id + ".tmp"
+        save_results(results, partial_dir, ExperimentResult.JSONEncoder, file_name=tmp_file)
+        os.replace(tmp_file, result_file)
+        return result_file
+
+    def _renew_lease(self, shard_idx, stop_renewal):
+        while not stop_renewal.wait(self.work_queue.lease_duration / 3):
+            if not self.work_queue.renew(shard_idx, self.worker_id):
+                print("Worker " + self.worker_id + " lost the lease for shard " + str(shard_idx))
+                return
+
+class ShardCoordinator:
+    '''Splits the circuits into shards, waits until the workers have processed all of them and merges the partial results'''
+    def __init__(self, work_queue, num_shards, result_dir) -> None:
+        self.work_queue = work_queue
+        self.num_shards = num_shards
+        self.result_dir = result_dir
+
+    def start(self):
+        if not exists(self.result_dir):
+            os.makedirs(self.result_dir)
+        self.work_queue.create(self.num_shards)
+
+    def wait(self, poll_interval=5, timeout=None, workers=None):
+        '''Blocks until all shards are done. If the local worker processes are passed, waiting is aborted once they all have exited'''
+        start = time.time()
+        last_status = None
+        while True:
+            # Shards of crashed workers fail here as well, in case no worker is left to claim them
+            self.work_queue.fail_exhausted()
+            status = self.work_queue.status()
+            if status != last_status:
+                print("Coordinator: shards " + ", ".join(s + ": " + str(status.get(s, 0)) for s in [DONE, LEASED, PENDING, FAILED]))
+                last_status = status
+            if self.work_queue.is_done():
+                break
+
+            if timeout != None and time.time() - start > timeout:
+                raise Exception("Not all shards have been processed within " + str(timeout) + " seconds: " + str(self.work_queue.status()))
+
+            if workers != None and not any(worker.is_alive() for worker in workers):
+                if self.work_queue.is_done():
+                    break
+                raise Exception("All local workers have exited before processing every shard: " + str(self.work_queue.status()))
+
+            time.sleep(poll_interval)
+
+        for shard_idx, worker_id, attempts in self.work_queue.failed_shards():
+            print("Coordinator: shard " + str(shard_idx) + " has failed after " + str(attempts) + " attempts, last claimed by worker " + str(worker_id))
+
+    def merge(self):
+        '''Results of all completed shards, the circuits of failed shards are missing'''
+        results = []
+        for result_file in self.work_queue.result_files():
+            results.extend(load_results(result_file, ExperimentResult.from_json))
+
+        save_results(results, self.result_dir, ExperimentResult.JSONEncoder)
+        return results
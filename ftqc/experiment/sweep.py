@@ -0,0 +1,173 @@
+import ast
+import itertools
+import random
+from configparser import ConfigParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+DEFAULT_PATTERN_SEED = 123
+DEFAULT_CIRCUIT_SEED = 123
+DEFAULT_NUM_CIRCUITS = 100
+
+class SweepPoint:
+    def __init__(self, section, params, varying, rep) -> None:
+        self.section = section
+        self.params = params
+        self.varying = varying
+        self.rep = rep
+        self.point_id = "_".join([section] + [f"{key}{params[key]}" for key in varying] + ["rep" + str(rep)])
+
+    def device_key(self):
+        '''Points with the same device key can share devices and noise models'''
+        return (self.params.get("backend"), self.params.get("simulate", True))
+
+    def circuit_key(self):
+        # Each repetition draws other random circuits, qasm circuits are the same for all repetitions
+        circuit_seed = self.params.get("circuit_seed", DEFAULT_CIRCUIT_SEED) + self.rep if self.params.get("qasm_dir") == None else None
+        return (self.params.get("qasm_dir"), self.params.get("num_circuits", DEFAULT_NUM_CIRCUITS), circuit_seed)
+
+    def pattern_seed(self):
+        '''Seed of the channels, the repetitions of a point create other channels but points of the same repetition equal ones'''
+        return self.params.get("pattern_seed", DEFAULT_PATTERN_SEED) + self.rep
+
+def parse_value(value):
+    '''Evaluates a config value like expsuite does, values that are no python literals are considered strings'''
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+def expand_config(cfg_file, sections=None):
+    '''Expands the parameter grid of each config section into single points. Like expsuite, list parameters are combined
+    with each other (experiment = grid, the default) or element-wise (experiment = list), and each point is repeated.'''
+    cfgparser = ConfigParser()
+    if not cfgparser.read(cfg_file):
+        raise Exception("Config file " + cfg_file + " not found.")
+
+    points = []
+    for section in cfgparser.sections():
+        if sections != None and section not in sections:
+            continue
+
+        params = {key: parse_value(value) for key, value in cfgparser.items(section)}
+        strategy = params.pop("experiment", "grid")
+        varying = sorted(key for key, value in params.items() if isinstance(value, (list, tuple)))
+
+        if strategy == "single" or len(varying) == 0:
+            combinations = [()]
+            varying = []
+        elif strategy == "grid":
+            combinations = itertools.product(*[params[key] for key in varying])
+        elif strategy == "list":
+            combinations = zip(*[params[key] for key in varying])
+        else:
+            raise Exception("Unexpected value '" + str(strategy) + "' for parameter 'experiment'. Use 'grid', 'list' or 'single'.")
+
+        for combination in combinations:
+            point_params = dict(params)
+            point_params.update(zip(varying, combination))
+            for rep in range(point_params.get("repetitions", 1)):
+                points.append(SweepPoint(section, point_params, varying, rep))
+
+    return points
+
+def group_points(points, num_groups):
+    '''Groups points sharing devices, so each group runs in a single process. Large groups are split until there are enough groups'''
+    groups = {}
+    for point in points:
+        groups.setdefault(point.device_key(), []).append(point)
+
+    # Points using the same circuits and the same transpilations run one after another within a group
+    groups = [sorted(group, key=lambda p: (repr(p.circuit_key()), p.point_id)) for group in groups.values()]
+    while len(groups) < num_groups:
+        largest = max(groups, key=len)
+        if len(largest) < 2:
+            break
+        groups.remove(largest)
+        groups.extend([largest[:len(largest) // 2], largest[len(largest) // 2:]])
+
+    return groups
+
+class SweepWorker:
+    '''Runs the points of a group and keeps device providers, circuit sets and transpilations for the following points'''
+    def __init__(self, store_file, cache_dir) -> None:
+        from core.caching import TranspilationCache
+        from core.qchannels import use_transpilation_cache
+        from experiment.result_store import SweepResultStore
+
+        self.store = SweepResultStore(store_file)
+        self.device_providers = {}
+        self.circuit_providers = {}
+        self.transpilation_cache = TranspilationCache(cache_dir)
+        use_transpilation_cache(self.transpilation_cache)
+
+    def device_provider_for(self, point):
+        from provider.qdevice_provider import QuantumDeviceProvider, HybridQuantumDeviceProvider, IBMQCredentials
+
+        key = point.device_key()
+        if key not in self.device_providers.keys():
+            if point.params.get("simulate", True):
+                self.device_providers[key] = QuantumDeviceProvider(point.params.get("backend", "ibmq_ehningen"))
+            else:
+                ibmq_credentials = IBMQCredentials(api_token='api_token', api_url='api_url', instance='instance')
+                self.device_providers[key] = HybridQuantumDeviceProvider(ibmq_credentials)
+        return self.device_providers[key]
+
+    def circuit_provider_for(self, point):
+        from provider.circuit_provider import QasmBasedCircuitProvider, RandomCircuitProvider
+
+        key = point.circuit_key()
+        if key not in self.circuit_providers.keys():
+            qasm_dir, num_circuits, circuit_seed = key
+            if qasm_dir != None:
+                self.circuit_providers[key] = QasmBasedCircuitProvider(qasm_dir)
+            else:
+                self.circuit_providers[key] = RandomCircuitProvider(num_circuits, max_num_qubits=10, max_depth=40, seed=circuit_seed)
+        return self.circuit_providers[key]
+
+    def run(self, point):
+        from pattern_definition import build_patterns
+        from experiment.ftqc_experiment import FaultTolerantQCExperiment
+        from evaluation.exp_eval import FtqcExperimentEvaluator
+
+        print("Run sweep point " + point.point_id)
+        device_provider = self.device_provider_for(point)
+
+        # Equal seeds create equal channels, so points of the same repetition share the transpilations of the channels they have in common
+        random.seed(point.pattern_seed())
+        patterns = build_patterns(point.params, device_provider)
+
+        ftqc_exp = FaultTolerantQCExperiment(self.circuit_provider_for(point), device_provider, patterns)
+        results = ftqc_exp.run_experiment()
+
+        evaluation_table = FtqcExperimentEvaluator.to_data_frame(FtqcExperimentEvaluator(results, None).evaluations())
+        self.store.add(point, results, evaluation_table)
+        return point.point_id
+
+def run_group(points, store_file, cache_dir):
+    worker = SweepWorker(store_file, cache_dir)
+    finished = [worker.run(point) for point in points]
+    print("Transpilation cache hit rate: {0:.2f}".format(worker.transpilation_cache.hit_rate()))
+    return finished
+
+class SweepRunner:
+    def __init__(self, cfg_file, store_file, cache_dir=None, processes=1, sections=None) -> None:
+        self.points = expand_config(cfg_file, sections)
+        self.store_file = store_file
+        self.cache_dir = cache_dir
+        self.processes = processes
+
+    def run(self):
+        groups = group_points(self.points, self.processes)
+        print("Run " + str(len(self.points)) + " sweep points in " + str(len(groups)) + " groups")
+
+        if self.processes <= 1:
+            for group in groups:
+                run_group(group, self.store_file, self.cache_dir)
+            return
+
+        # Spawn instead of fork, as forking after qiskit and Aer have been loaded can deadlock the workers
+        with ProcessPoolExecutor(max_workers=self.processes, mp_context=get_context("spawn")) as executor:
+            futures = [executor.submit(run_group, group, self.store_file, self.cache_dir) for group in groups]
+            for future in as_completed(futures):
+                print("Finished sweep points: " + ", ".join(future.result()))
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import time
+from os.path import dirname
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+class ShardWorkQueue:
+    '''Work queue backed by a SQLite file that is shared between the coordinator and the workers.
+    A claimed shard is leased for lease_duration seconds. If a worker crashes and does not renew its lease,
+    the shard can be claimed again by another worker after the lease has expired. A shard whose lease has expired after
+    max_attempts claims, e.g. because it crashes every worker, is marked as failed instead.'''
+    def __init__(self, db_file, lease_duration=600, max_attempts=3) -> None:
+        self.db_file = db_file
+        self.lease_duration = lease_duration
+        self.max_attempts = max_attempts
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_file, timeout=60, isolation_level=None)
+        connection.execute("""CREATE TABLE IF NOT EXISTS shards (
+                                shard_idx INTEGER PRIMARY KEY,
+                                status TEXT NOT NULL,
+                                worker TEXT,
+                                lease_expiry REAL,
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                result_file TEXT)""")
+        return connection
+
+    def create(self, num_shards):
+        if dirname(self.db_file) != "":
+            os.makedirs(dirname(self.db_file), exist_ok=True)
+
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany("INSERT OR IGNORE INTO shards (shard_idx, status) VALUES (?, ?)",
+                                   [(i, PENDING) for i in range(num_shards)])
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def claim(self, worker_id):
+        '''Leases the next pending or expired shard to the worker and returns its index, or None if there is no such shard'''
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            self._fail_exhausted(connection, now)
+            row = connection.execute("""SELECT shard_idx FROM shards
+                                        WHERE status = ? OR (status = ? AND lease_expiry < ?)
+                                        ORDER BY shard_idx LIMIT 1""", (PENDING, LEASED, now)).fetchone()
+            if row == None:
+                connection.execute("COMMIT")
+                return None
+
+            connection.execute("""UPDATE shards SET status = ?, worker = ?, lease_expiry = ?, attempts = attempts + 1
+                                  WHERE shard_idx = ?""", (LEASED, worker_id, now + self.lease_duration, row[0]))
+            connection.execute("COMMIT")
+            return row[0]
+        finally:
+            connection.close()
+
+    def fail_exhausted(self):
+        '''Marks the shards that have expired after max_attempts claims as failed and returns how many there are'''
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            num_failed = self._fail_exhausted(connection, time.time())
+            connection.execute("COMMIT")
+            return num_failed
+        finally:
+            connection.close()
+
+    def _fail_exhausted(self, connection, now):
+        cursor = connection.execute("""UPDATE shards SET status = ?, lease_expiry = NULL
+                                       WHERE status = ? AND lease_expiry < ? AND attempts >= ?""",
+                                    (FAILED, LEASED, now, self.max_attempts))
+        return cursor.rowcount
+
+    def renew(self, shard_idx, worker_id):
+        '''Extends the lease of the shard. Returns False if the worker has lost the lease in the meantime'''
+        connection = self._connect()
+        try:
+            cursor = connection.execute("""UPDATE shards SET lease_expiry = ?
+                                           WHERE shard_idx = ? AND worker = ? AND status = ?""",
+                                        (time.time() + self.lease_duration, shard_idx, worker_id, LEASED))
+            return cursor.rowcount == 1
+        finally:
+            connection.close()
+
+    def complete(self, shard_idx, worker_id, result_file):
+        '''Marks the shard as done. Returns False if the shard has already been completed by another worker'''
+        connection = self._connect()
+        try:
+            cursor = connection.execute("""UPDATE shards SET status = ?, worker = ?, result_file = ?, lease_expiry = NULL
+                                           WHERE shard_idx = ? AND status != ?""",
+                                        (DONE, worker_id, result_file, shard_idx, DONE))
+            return cursor.rowcount == 1
+        finally:
+            connection.close()
+
+    def status(self):
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall()
+            return {status: count for status, count in rows}
+        finally:
+            connection.close()
+
+    def is_done(self):
+        '''Whether every shard has been completed or has failed'''
+        status = self.status()
+        return len(status) > 0 and all(s in (DONE, FAILED) for s in status.keys())
+
+    def failed_shards(self):
+        '''(shard index, last worker, attempts) of the failed shards'''
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT shard_idx, worker, attempts FROM shards WHERE status = ? ORDER BY shard_idx", (FAILED,)).fetchall()
+        finally:
+            connection.close()
+
+    def result_files(self):
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT result_file FROM shards WHERE status = ? ORDER BY shard_idx", (DONE,)).fetchall()
+            return [row[0] for row in rows]
+        finally:
+            connection.close()
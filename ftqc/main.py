@@ -1,26 +1,93 @@
-from provider.qdevice_provider import QuantumDeviceProvider, FakeQuantumDeviceProvider, HybridQuantumDeviceProvider, IBMQCredentials
-from provider.circuit_provider import QasmBasedCircuitProvider, RandomCircuitProvider
 from pattern_definition import build_patterns
 from experiment.ftqc_experiment import FaultTolerantQCExperiment
+from core.entities import QuantumContainerOrchestrator, PipelinedContainerOrchestrator
 from expsuite import PyExperimentSuite
-
-from builder.ft_builder import ConformalMeasurementsBuilder, CombinerPatternBuilder
-from core.qchannels import VaryingTranspilationSeedGeneration, DifferentOptimizationLevel, HeterogeneousQuantumDeviceBackend
-from core.entities import Measurements
+from core.execution_profile import ExecutionProfileTuner, use_execution_tuner
+from core.qchannels import use_staged_transpiler, use_transpilation_budget
+from core.staged_transpilation import StagedTranspiler
+from core.transpilation_budget import TranspilationBudget
+from core.exact_execution import ExactProbabilityExecutor, use_exact_execution
+from core.memory_profile import MemoryProfiler, use_memory_profiler
+from core.feasibility import FeasibilityPlanner
+from core.hedging import HedgingPolicy
+from core.deadline import DeadlinePlanner
+from core.fidelity import FidelityEstimator
+from core import caching, qchannels
+from core.caching import ExecutionResultCache, use_execution_cache
+from os.path import join
 
 class FtqcExperimentSuite(PyExperimentSuite):
     def reset(self, params, rep):
         print("Start initializing the experiment")
 
+        # The features are set for every experiment and repetition, so none is carried over from a previous one
+        use_execution_tuner(ExecutionProfileTuner(log_file=join(params["outputdir"], "execution_profiles.jsonl"))
+                            if params.get("tune_execution", False) else None)
+
+        use_memory_profiler(MemoryProfiler() if params.get("profile_memory", False) else None)
+
+        use_exact_execution(ExactProbabilityExecutor(max_qubits=params["exact_max_qubits"])
+                            if params.get("exact_max_qubits", None) != None else None)
+
+        use_staged_transpiler(StagedTranspiler(verify=params.get("verify_transpilation", False))
+                              if params.get("staged_transpilation", False) else None)
+
+        use_execution_cache(ExecutionResultCache(params["execution_cache_dir"], max_disk_mb=params.get("execution_cache_mb", None))
+                            if params.get("execution_cache_dir", None) != None else None)
+
+        use_transpilation_budget(TranspilationBudget(time_limit=params["transpilation_time_limit"],
+                                                     on_exhausted=params.get("transpilation_on_exhausted", "fallback"))
+                                 if params.get("transpilation_time_limit", None) != None else None)
+
+        if params.get("result_file") != None:
+            # Stored results are only evaluated, so neither devices nor circuits are needed
+            self.ftqc_exp = FaultTolerantQCExperiment(None, None, [])
+            return
+
+        from provider.qdevice_provider import HybridQuantumDeviceProvider, IBMQCredentials
+        from provider.circuit_provider import RandomCircuitProvider
+
         ibmq_credentials = IBMQCredentials(api_token='api_token', api_url='api_url', instance='instance')
-        device_provider = HybridQuantumDeviceProvider(ibmq_credentials)
+        device_provider = HybridQuantumDeviceProvider(ibmq_credentials, params.get("device_snapshot_dir", None))
+        if params.get("broker_address", None) != None:
+            from provider.device_broker import BrokeredQuantumDeviceProvider, DEFAULT_KEY_FILE
+
+            # Circuits are still transpiled here, the broker executes them together with those of other runs
+            device_provider = BrokeredQuantumDeviceProvider(device_provider, params["broker_address"],
+                                                            key_file=params.get("broker_key_file", DEFAULT_KEY_FILE))
 
         patterns = build_patterns(params, device_provider)        
+        device_provider.save_device_snapshot()
+        for pattern in patterns:
+            pattern.unavailable_channels_policy = params.get("unavailable_channels_policy", pattern.unavailable_channels_policy)
+        feasibility_planner = FeasibilityPlanner(device_provider, params["outputdir"]) if params.get("preflight", False) else None
+        hedging_policy = HedgingPolicy(percentile=params["hedging_percentile"]) if params.get("hedging_percentile", None) != None else None
+        deadline_planner = None
+        if params.get("time_budget", None) != None or params.get("shot_budget", None) != None:
+            deadline_planner = DeadlinePlanner(params.get("time_budget", None), params.get("shot_budget", None), report_dir=params["outputdir"])
+        fidelity_estimator = None
+        if params.get("estimate_fidelity", False):
+            fidelity_estimator = FidelityEstimator(params.get("min_expected_fidelity", None), params.get("relative_fidelity_threshold", None))
 
         circuit_provider = RandomCircuitProvider(100, max_num_qubits=10, max_depth=40)
         #circuit_provider = QasmBasedCircuitProvider(params["qasm_dir"])
 
-        self.ftqc_exp = FaultTolerantQCExperiment(circuit_provider, device_provider, patterns)
+        orchestrator_factory = lambda containers, provider: QuantumContainerOrchestrator(containers, provider,
+                                                                                        aggregation_processes=params.get("aggregation_processes", None),
+                                                                                        feasibility_planner=feasibility_planner,
+                                                                                        hedging_policy=hedging_policy,
+                                                                                        deadline_planner=deadline_planner,
+                                                                                        fidelity_estimator=fidelity_estimator)
+        if params.get("pipelined", False):
+            orchestrator_factory = lambda containers, provider: PipelinedContainerOrchestrator(containers, provider,
+                                                                                              max_batch_size=params.get("max_batch_size", None),
+                                                                                              max_batch_latency=params.get("max_batch_latency", 5.0),
+                                                                                              feasibility_planner=feasibility_planner,
+                                                                                              hedging_policy=hedging_policy,
+                                                                                              deadline_planner=deadline_planner,
+                                                                                              fidelity_estimator=fidelity_estimator)
+
+        self.ftqc_exp = FaultTolerantQCExperiment(circuit_provider, device_provider, patterns, orchestrator_factory)
 
     def iterate(self, params, rep, n):
         print('Start running the experiment')
@@ -33,15 +100,20 @@ class FtqcExperimentSuite(PyExperimentSuite):
             result_file = None
 
         if result_file == None:
-            exp_results = self.ftqc_exp.run_experiment()
-            self.ftqc_exp.save(exp_results, results_dir)
+            try:
+                exp_results = self.ftqc_exp.run_experiment()
+                self.ftqc_exp.save(exp_results, results_dir)
+            finally:
+                if qchannels.transpilation_budget != None:
+                    qchannels.transpilation_budget.stop()
+            if caching.execution_cache != None:
+                print("Execution cache: " + str(caching.execution_cache.statistics()))
         else:
-            exp_results = self.ftqc_exp.load_from(result_file)
-            exp_results = [result for result in exp_results if result.agg_measurements.accepted]
+            exp_results = self.ftqc_exp.load_accepted_from(result_file)
 
         eval_results = self.ftqc_exp.evaluate(exp_results, results_dir)
 
         return {"rep": rep, "iter": n, "eval_results": eval_results}
 
 if __name__ == '__main__':
-    FtqcExperimentSuite().start()
\ No newline at end of file
+    FtqcExperimentSuite().start()
@@ -1,6 +1,4 @@
 import random
-from qiskit.circuit.random import random_circuit
-from qiskit.circuit import QuantumCircuit
 from core.entities import Circuit
 from provider.util import list_files, get_base_name
 
@@ -10,10 +8,15 @@ class CircuitProvider:
         pass
 
 class RandomCircuitProvider(CircuitProvider):
-    def __init__(self, num_circuits, max_num_qubits = 10, max_depth = 40) -> None:
+    def __init__(self, num_circuits, max_num_qubits = 10, max_depth = 40, seed=None) -> None:
+        '''Using the same seed yields the same circuits, e.g. on every node of a sharded run'''
+        from qiskit.circuit.random import random_circuit
+
+        rng = random.Random(seed) if seed != None else random
         self.random_circuits = []
         for i in range(num_circuits):
-            circuit = random_circuit(random.randint(2, max_num_qubits), random.randint(5, max_depth), measure=True)
+            circuit_seed = rng.randrange(0, 2**32) if seed != None else None
+            circuit = random_circuit(rng.randint(2, max_num_qubits), rng.randint(5, max_depth), measure=True, seed=circuit_seed)
             circuit.name = 'randomcircuit' + str(i)
             self.random_circuits.append(Circuit(circuit.name, circuit))
         
@@ -23,6 +26,8 @@ class RandomCircuitProvider(CircuitProvider):
     
 class QasmBasedCircuitProvider(CircuitProvider):
     def __init__(self, dir) -> None:
+        from qiskit.circuit import QuantumCircuit
+
         self.circuits = {}
         for qasm_file in list_files(dir, extension=".qasm"):
             qiskit_circuit = QuantumCircuit.from_qasm_file(qasm_file)
@@ -36,4 +41,31 @@ class QasmBasedCircuitProvider(CircuitProvider):
             self.circuits[prefix].append(circuit)
 
     def get(self):
-        return [circuit for key in self.circuits.keys() for circuit in self.circuits[key]]
\ No newline at end of file
+        return [circuit for key in self.circuits.keys() for circuit in self.circuits[key]]
+
+    def get_batches(self, max_batch_size=None):
+        '''Returns the circuits grouped by their benchmark, i.e. the file name without the qubit suffix'''
+        batches = []
+        for key in self.circuits.keys():
+            circuits = self.circuits[key]
+            size = max_batch_size if max_batch_size != None else len(circuits)
+            batches.extend([circuits[i:i + size] for i in range(0, len(circuits), size)])
+        return batches
+
+class ShardedCircuitProvider(CircuitProvider):
+    '''Provides the circuits of a single shard. The circuits are ordered by their id and assigned round-robin,
+    so every node obtains the same split as long as the wrapped provider yields the same circuits.'''
+    def __init__(self, circuit_provider, num_shards, shard_idx) -> None:
+        if num_shards <= 0:
+            raise Exception("The number of shards must be greater than zero")
+
+        if shard_idx < 0 or shard_idx >= num_shards:
+            raise Exception("The shard index must be between 0 and " + str(num_shards - 1))
+
+        self.circuit_provider = circuit_provider
+        self.num_shards = num_shards
+        self.shard_idx = shard_idx
+
+    def get(self):
+        ordered = sorted(self.circuit_provider.get(), key=lambda circuit: circuit.id)
+        return [circuit for i, circuit in enumerate(ordered) if i % self.num_shards == self.shard_idx]
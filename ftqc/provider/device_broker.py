@@ -0,0 +1,333 @@
+import itertools
+import os
+import secrets
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from os.path import dirname, exists, expanduser, join
+from core.entities import QuantumDevice
+
+DEFAULT_ADDRESS = ("localhost", 6174)
+# Clients authenticate with the key of this environment variable or, if it is not set, with the key file of the broker
+AUTHKEY_ENV = "FTQC_BROKER_AUTHKEY"
+DEFAULT_KEY_FILE = join(expanduser("~"), ".ftqc", "broker.key")
+DEFAULT_MAX_BATCH_LATENCY = 0.5
+
+def parse_address(address):
+    '''Address of a broker given as host:port'''
+    if isinstance(address, tuple):
+        return address
+    host, port = address.rsplit(":", 1)
+    return (host, int(port))
+
+def load_authkey(key_file=DEFAULT_KEY_FILE):
+    '''Authkey of the broker from the environment variable or the key file, which must only be accessible by its owner'''
+    if os.environ.get(AUTHKEY_ENV, "") != "":
+        return os.environ[AUTHKEY_ENV].encode()
+    if not exists(key_file):
+        raise Exception("No broker authkey: set " + AUTHKEY_ENV + " or start the broker once to create the key file " + key_file)
+    if os.name == "posix" and os.stat(key_file).st_mode & 0o077 != 0:
+        raise Exception("The broker key file " + key_file + " must only be accessible by its owner (mode 0600)")
+    with open(key_file, "r") as f:
+        return f.read().strip().encode()
+
+def create_authkey(key_file=DEFAULT_KEY_FILE):
+    '''Authkey of the broker, a random key is written to the key file with mode 0600 on the first start'''
+    if os.environ.get(AUTHKEY_ENV, "") != "" or exists(key_file):
+        return load_authkey(key_file)
+    os.makedirs(dirname(key_file), mode=0o700, exist_ok=True)
+    key = secrets.token_hex(32)
+    with os.fdopen(os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+        f.write(key)
+    print("Broker: a new authkey has been written to file: " + key_file)
+    return key.encode()
+
+class BrokerRequest:
+    '''Circuits a client has submitted for a device, the counts are filled in by the jobs that run them'''
+    def __init__(self, client_id, circuits) -> None:
+        self.client_id = client_id
+        self.circuits = circuits
+        self.counts = [None] * len(circuits)
+        self.remaining = len(circuits)
+        self.error = None
+        self.done = threading.Event()
+
+    def complete(self, idx, counts):
+        self.counts[idx] = counts
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.done.set()
+
+    def counts_by_name(self):
+        return {name: counts for (name, _), counts in zip(self.circuits, self.counts)}
+
+    def fail(self, error):
+        self.error = error
+        self.done.set()
+
+class DeviceBroker:
+    '''Owns the devices of a provider and runs the circuits that client processes submit over a local socket. The circuits
+    of all clients that wait for the same device are coalesced into jobs of max_experiments circuits. Jobs are filled in
+    turns of one circuit per client and the turns carry on from one job to the next, so every client gets an equal share
+    of the jobs no matter how many circuits the others have queued. A job that is not full is
+    submitted once its oldest circuit has waited max_batch_latency seconds. Without an authkey, the key of the
+    environment or of the default key file is used and the key file is created on the first start.'''
+    def __init__(self, qdevice_provider, address=DEFAULT_ADDRESS, authkey=None, max_batch_latency=DEFAULT_MAX_BATCH_LATENCY,
+                 execution_retries=3, devices=None) -> None:
+        self.qdevice_provider = qdevice_provider
+        self.address = parse_address(address)
+        self.authkey = authkey if authkey != None else create_authkey()
+        self.max_batch_latency = max_batch_latency
+        self.execution_retries = execution_retries
+        self.devices = {device.unique_name: device for device in [qdevice_provider.default_device] + qdevice_provider.provided_devices(min_qubits=1)}
+        for device in devices if devices != None else []:
+            self.devices[device.unique_name] = device
+
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.conditions = {}
+        self.threads = {}
+        self.request_ids = itertools.count()
+        self.jobs = []
+        self.listener = None
+        self.stopped = False
+
+    def serve_forever(self):
+        self.listener = Listener(self.address, authkey=self.authkey)
+        print("Broker: serving " + str(len(self.devices)) + " devices on " + self.address[0] + ":" + str(self.address[1]))
+        while not self.stopped:
+            try:
+                connection = self.listener.accept()
+            except Exception as e:
+                if self.stopped:
+                    break
+                print("Broker: connection refused: " + str(e))
+                continue
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def stop(self):
+        self.stopped = True
+        with self.lock:
+            for condition in self.conditions.values():
+                with condition:
+                    condition.notify_all()
+        if self.listener != None:
+            self.listener.close()
+        self.report()
+
+    def report(self):
+        with self.lock:
+            jobs = list(self.jobs)
+        print("Broker: {0} jobs with {1} circuits have been run".format(len(jobs), sum(job["size"] for job in jobs)))
+        for device_name in sorted({job["device"] for job in jobs}):
+            device_jobs = [job for job in jobs if job["device"] == device_name]
+            print("Device: " + device_name + ", {0} jobs, on average {1:.1f} circuits of {2:.1f} clients per job".format(
+                len(device_jobs), sum(job["size"] for job in device_jobs) / len(device_jobs),
+                sum(len(job["clients"]) for job in device_jobs) / len(device_jobs)))
+        return jobs
+
+    def submit(self, client_id, device_name, circuits):
+        '''Queues the named qiskit circuits [(name, circuit)] of the client for the device and returns the BrokerRequest'''
+        if device_name not in self.devices.keys():
+            raise Exception("The broker does not provide device: " + device_name)
+
+        # Circuits of different clients may have the same name, so they are renamed in the jobs
+        request_id = next(self.request_ids)
+        request = BrokerRequest(client_id, [(name, circuit.copy(name=name + "@" + str(request_id))) for name, circuit in circuits])
+        if len(circuits) == 0:
+            request.done.set()
+            return request
+
+        condition = self._device_condition(device_name)
+        with condition:
+            client_queue = self.queues[device_name].setdefault(client_id, deque())
+            now = time.time()
+            client_queue.extend((request, idx, circuit, now) for idx, (_, circuit) in enumerate(request.circuits))
+            condition.notify()
+        return request
+
+    def _serve(self, connection):
+        try:
+            client_id, = connection.recv()
+            connection.send(list(self.devices.keys()))
+            while True:
+                device_name, circuits = connection.recv()
+                try:
+                    request = self.submit(client_id, device_name, circuits)
+                    request.done.wait()
+                    connection.send((request.counts_by_name(), None) if request.error == None else (None, str(request.error)))
+                except Exception as e:
+                    connection.send((None, str(e)))
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def _device_condition(self, device_name):
+        with self.lock:
+            if device_name not in self.conditions.keys():
+                self.queues[device_name] = OrderedDict()
+                self.conditions[device_name] = threading.Condition()
+                self.threads[device_name] = threading.Thread(target=self._run_device, args=(device_name,), daemon=True)
+                self.threads[device_name].start()
+            return self.conditions[device_name]
+
+    def _run_device(self, device_name):
+        device = self.devices[device_name]
+        max_job_size = self.qdevice_provider.max_job_size_for(device)
+        max_job_size = max_job_size if max_job_size != None else float("inf")
+        queues = self.queues[device_name]
+        condition = self.conditions[device_name]
+
+        while not self.stopped:
+            with condition:
+                while not self.stopped and len(queues) == 0:
+                    condition.wait()
+
+                # Waits for more circuits until the job is full or its oldest circuit has waited long enough
+                while not self.stopped:
+                    queued = sum(len(client_queue) for client_queue in queues.values())
+                    oldest = min(client_queue[0][3] for client_queue in queues.values())
+                    remaining = oldest + self.max_batch_latency - time.time()
+                    if queued >= max_job_size or remaining <= 0:
+                        break
+                    condition.wait(remaining)
+                if self.stopped:
+                    break
+
+                job = []
+                while len(job) < max_job_size and len(queues) > 0:
+                    client_id, client_queue = next(iter(queues.items()))
+                    job.append(client_queue.popleft())
+                    # The client moves to the end of the turn order, an empty queue leaves it
+                    queues.move_to_end(client_id)
+                    if len(client_queue) == 0:
+                        del queues[client_id]
+
+            self._execute(device, job)
+
+    def _execute(self, device, job):
+        clients = {request.client_id for request, _, _, _ in job}
+        print("Broker: device " + device.unique_name + ", execute job with " + str(len(job)) + " circuits of " + str(len(clients)) + " clients")
+        with self.lock:
+            self.jobs.append({"device": device.unique_name, "size": len(job), "clients": sorted(clients), "started": time.time()})
+
+        circuits = [BrokeredCircuit(circuit) for _, _, circuit, _ in job]
+        for attempt in range(self.execution_retries):
+            try:
+                result = device.execute_batch(circuits)
+                for request, idx, circuit, _ in job:
+                    request.complete(idx, result.get_counts(circuit))
+                return
+            except Exception as e:
+                print("Broker: job on device " + device.unique_name + " failed in attempt " + str(attempt + 1) + ": " + str(e))
+                error = e
+        for request, _, _, _ in job:
+            request.fail(error)
+
+class BrokeredCircuit:
+    '''Circuit of a job of the broker, devices only need the id and the qiskit circuit of what they execute'''
+    def __init__(self, qiskit_circuit) -> None:
+        self.id = qiskit_circuit.name
+        self.qiskit_circuit = qiskit_circuit
+
+class BrokerJob:
+    def __init__(self, future) -> None:
+        self.future = future
+
+    def result(self):
+        return self.future.result()
+
+    def cancel(self):
+        # Circuits handed to the broker may already be part of a job of other clients
+        return False
+
+class BrokeredQuantumDevice(QuantumDevice):
+    '''Client side of a device of the broker. Circuits are transpiled against the backend of the local device, only their
+    execution is handed to the broker. Each instance keeps its own connection, so devices can be used from several threads.'''
+    def __init__(self, device, address=DEFAULT_ADDRESS, authkey=None, client_id=None) -> None:
+        super().__init__(device.unique_name, device.shots)
+        self.device = device
+        self.address = parse_address(address)
+        self.authkey = authkey if authkey != None else load_authkey()
+        self.client_id = client_id if client_id != None else socket.gethostname() + "-" + str(os.getpid())
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def get_backend(self):
+        return self.device.get_backend()
+
+    def noise_fingerprint(self):
+        return self.device.noise_fingerprint()
+
+    def calibration(self):
+        return self.device.calibration()
+
+    def execute(self, circuit):
+        return self.execute_batch([circuit])
+
+    def execute_batch(self, circuits):
+        from core.exact_execution import PseudoCountsResult
+
+        with self.lock:
+            if self.connection == None:
+                connection = Client(self.address, authkey=self.authkey)
+                connection.send((self.client_id,))
+                if self.unique_name not in connection.recv():
+                    connection.close()
+                    raise Exception("The broker does not provide device: " + self.unique_name)
+                self.connection = connection
+            try:
+                self.connection.send((self.unique_name, [(c.qiskit_circuit.name, c.qiskit_circuit) for c in circuits]))
+                counts, error = self.connection.recv()
+            except (EOFError, OSError):
+                # The broker has been restarted, the next batch connects again
+                self.connection = None
+                raise
+        if error != None:
+            raise Exception("Broker failed to execute batch on device " + self.unique_name + ": " + error)
+        return PseudoCountsResult(counts)
+
+    def submit_batch(self, circuits):
+        future = Future()
+        def run():
+            try:
+                future.set_result(self.execute_batch(circuits))
+            except Exception as e:
+                future.set_exception(e)
+        threading.Thread(target=run, daemon=True).start()
+        return BrokerJob(future)
+
+    def close(self):
+        with self.lock:
+            if self.connection != None:
+                self.connection.close()
+                self.connection = None
+
+class BrokeredQuantumDeviceProvider:
+    '''Provides the devices of a local provider as devices of the broker. The broker packs the circuits into jobs of the size
+    the backend allows, so the orchestrators hand over all circuits of a device at once. Without an authkey, the key of
+    the environment or of the key file the broker has created is used.'''
+    def __init__(self, qdevice_provider, address=DEFAULT_ADDRESS, authkey=None, key_file=DEFAULT_KEY_FILE) -> None:
+        self.qdevice_provider = qdevice_provider
+        self.address = parse_address(address)
+        self.authkey = authkey if authkey != None else load_authkey(key_file)
+        self.devices_by_name = {}
+        self.default_device = self._brokered(qdevice_provider.default_device)
+
+    def max_job_size_for(self, device):
+        return None
+
+    def provided_devices(self, min_qubits=10):
+        return [self._brokered(device) for device in self.qdevice_provider.provided_devices(min_qubits)]
+
+    def save_device_snapshot(self):
+        self.qdevice_provider.save_device_snapshot()
+
+    def _brokered(self, device):
+        if device.unique_name not in self.devices_by_name.keys():
+            self.devices_by_name[device.unique_name] = BrokeredQuantumDevice(device, self.address, self.authkey)
+        return self.devices_by_name[device.unique_name]
@@ -0,0 +1,243 @@
+import json
+import os
+import time
+from os.path import dirname, exists
+from core.entities import IBMQuantumComputer
+
+# Calibrations of IBM devices are updated about once a day
+DEFAULT_MAX_SNAPSHOT_AGE = 24 * 60 * 60
+
+# Errors assumed for devices and gates without calibration data, e.g. local simulators
+DEFAULT_SINGLE_QUBIT_ERROR = 1e-3
+DEFAULT_TWO_QUBIT_ERROR = 1e-2
+DEFAULT_READOUT_ERROR = 2e-2
+
+def calibration_stamp(backend):
+    '''Time of the last calibration of the backend, None for backends without properties'''
+    properties = backend.properties()
+    if properties == None or getattr(properties, "last_update_date", None) == None:
+        return None
+    return properties.last_update_date.isoformat()
+
+def mean(values):
+    return sum(values) / len(values) if len(values) > 0 else None
+
+class DeviceCalibration:
+    '''Gate and readout errors and lengths, coherence times and repetition delay of a backend as reported by its calibration.
+    Lengths and times are given in seconds.'''
+    def __init__(self, gate_errors, gate_lengths, readout_errors, readout_lengths, t2_times, rep_delay) -> None:
+        self.gate_errors = gate_errors
+        self.readout_errors = readout_errors
+        self.t2_times = t2_times
+        self.rep_delay = rep_delay
+        self.gate_length = mean(gate_lengths)
+        self.readout_length = mean(readout_lengths)
+
+        # Gates on qubits without an own calibration get the mean error of their gate
+        errors_by_name = {}
+        for (name, _), error in gate_errors.items():
+            errors_by_name.setdefault(name, []).append(error)
+        self.mean_gate_errors = {name: mean(errors) for name, errors in errors_by_name.items()}
+
+    def from_backend(backend):
+        properties = backend.properties() if hasattr(backend, "properties") else None
+        configuration = backend.configuration() if hasattr(backend, "configuration") else None
+        return DeviceCalibration.from_properties(properties, configuration)
+
+    def from_properties(properties, configuration=None):
+        rep_delay = getattr(configuration, "default_rep_delay", None) if configuration != None else None
+        if properties == None:
+            return DeviceCalibration({}, [], {}, [], {}, rep_delay)
+
+        gate_errors = {}
+        gate_lengths = []
+        for gate in properties.gates:
+            parameters = {parameter.name for parameter in gate.parameters}
+            if "gate_error" in parameters:
+                gate_errors[(gate.gate, tuple(gate.qubits))] = properties.gate_error(gate.gate, gate.qubits)
+            if "gate_length" in parameters:
+                gate_lengths.append(properties.gate_length(gate.gate, gate.qubits))
+
+        readout_errors = {}
+        readout_lengths = []
+        t2_times = {}
+        for qubit, qubit_properties in enumerate(properties.qubits):
+            parameters = {parameter.name for parameter in qubit_properties}
+            if "readout_error" in parameters:
+                readout_errors[qubit] = properties.readout_error(qubit)
+            if "readout_length" in parameters:
+                readout_lengths.append(properties.readout_length(qubit))
+            if "T2" in parameters:
+                t2_times[qubit] = properties.t2(qubit)
+        return DeviceCalibration(gate_errors, gate_lengths, readout_errors, readout_lengths, t2_times, rep_delay)
+
+    def gate_error(self, name, qubits):
+        error = self.gate_errors.get((name, tuple(qubits)), self.mean_gate_errors.get(name, None))
+        if error != None:
+            return min(error, 1.0)
+        return DEFAULT_SINGLE_QUBIT_ERROR if len(qubits) == 1 else DEFAULT_TWO_QUBIT_ERROR
+
+    def readout_error(self, qubit):
+        return min(self.readout_errors.get(qubit, DEFAULT_READOUT_ERROR), 1.0)
+
+    def seconds_per_layer_and_shot(self):
+        '''Mean gate length and per-shot overhead (readout and repetition delay) in seconds, None without gate lengths'''
+        if self.gate_length == None:
+            return None
+        overhead = self.readout_length if self.readout_length != None else 0.0
+        overhead += self.rep_delay if self.rep_delay != None else 0.0
+        return (self.gate_length, overhead)
+
+class DeviceRecord:
+    def __init__(self, name, num_qubits, max_experiments, coupling_map, basis_gates, calibration, loaded_at) -> None:
+        self.name = name
+        self.num_qubits = num_qubits
+        self.max_experiments = max_experiments
+        self.coupling_map = coupling_map
+        self.basis_gates = basis_gates
+        self.calibration = calibration
+        self.loaded_at = loaded_at
+
+    def from_backend(name, backend):
+        configuration = backend.configuration()
+        return DeviceRecord(name,
+                            configuration.n_qubits,
+                            getattr(configuration, "max_experiments", None),
+                            getattr(configuration, "coupling_map", None),
+                            getattr(configuration, "basis_gates", None),
+                            calibration_stamp(backend),
+                            time.time())
+
+    def from_dict(dct):
+        return DeviceRecord(dct["name"], dct["num_qubits"], dct["max_experiments"], dct["coupling_map"],
+                            dct["basis_gates"], dct["calibration"], dct["loaded_at"])
+
+class DeviceRegistry:
+    '''Loads the configuration of each backend of a provider once and hands out a single device instance per backend.
+    The names and records can be stored in a snapshot file, so that startup does not query the provider at all, devices
+    then request their backend when they are first used. Records older
+    than max_snapshot_age seconds are checked against the calibration of their backend and reloaded if it has changed.
+    The devices take their calibration from the registry, so it is parsed once per backend and dropped when it changes.'''
+    def __init__(self, provider, snapshot_file=None, max_snapshot_age=DEFAULT_MAX_SNAPSHOT_AGE, load_provider=None) -> None:
+        # Providers that log in are created by load_provider when the first backend is requested
+        self.provider = provider
+        self.load_provider = load_provider
+        self.snapshot_file = snapshot_file
+        self.max_snapshot_age = max_snapshot_age
+        self.records = {}
+        self.backends_by_name = {}
+        self.devices_by_name = {}
+        self.properties_by_name = {}
+        self.calibrations_by_name = {}
+        self.matched_names = {}
+        self.backend_names = None
+
+        if self.snapshot_file != None and exists(self.snapshot_file):
+            self.load_snapshot()
+
+    def names(self):
+        '''Names of all backends of the provider, backends without a name are skipped'''
+        if self.backend_names == None:
+            self.backend_names = []
+            for backend in self.get_provider().backends():
+                try:
+                    name = backend.backend_name
+                except AttributeError:
+                    print("There is no name for backend: " + str(backend))
+                    continue
+                self.backends_by_name[name] = backend
+                self.backend_names.append(name)
+        return self.backend_names
+
+    def backend(self, name):
+        if name not in self.backends_by_name.keys():
+            self.backends_by_name[name] = self.get_provider().get_backend(name)
+        return self.backends_by_name[name]
+
+    def get_provider(self):
+        if self.provider == None:
+            self.provider = self.load_provider()
+        return self.provider
+
+    def device(self, name):
+        if name not in self.devices_by_name.keys():
+            if name in self.backends_by_name.keys():
+                self.devices_by_name[name] = IBMQuantumComputer(self.backends_by_name[name])
+            else:
+                # The provider is only asked for the backend once the device transpiles or executes a circuit
+                self.devices_by_name[name] = IBMQuantumComputer.lazy(name, lambda: self.backend(name))
+            self.devices_by_name[name].calibration_source = self.calibration
+        return self.devices_by_name[name]
+
+    def devices(self, min_qubits=10):
+        return [self.device(name) for name in self.names() if self.record(name).num_qubits >= min_qubits]
+
+    def record(self, name):
+        record = self.records.get(name)
+        if record != None and time.time() - record.loaded_at > self.max_snapshot_age:
+            record = self._revalidate(record)
+
+        if record == None:
+            record = DeviceRecord.from_backend(name, self.backend(name))
+            self.records[name] = record
+        return record
+
+    def properties(self, name):
+        if name not in self.properties_by_name.keys():
+            self.properties_by_name[name] = self.backend(name).properties()
+        return self.properties_by_name[name]
+
+    def calibration(self, name):
+        if name not in self.calibrations_by_name.keys():
+            self.calibrations_by_name[name] = DeviceCalibration.from_properties(self.properties(name), self.backend(name).configuration())
+        return self.calibrations_by_name[name]
+
+    def max_experiments_for(self, name):
+        return self.record(name).max_experiments
+
+    def backend_name_in(self, device_name):
+        '''Name of the first backend contained in the device name, e.g. the noise model backend of a simulator'''
+        if device_name not in self.matched_names.keys():
+            self.matched_names[device_name] = next((name for name in self.names() if name in device_name), None)
+        return self.matched_names[device_name]
+
+    def refresh(self):
+        '''Reloads the records of all backends whose calibration has changed and returns their names'''
+        changed = []
+        for name, record in list(self.records.items()):
+            if self._revalidate(record) == None:
+                changed.append(name)
+        return changed
+
+    def _revalidate(self, record):
+        if calibration_stamp(self.backend(record.name)) == record.calibration:
+            record.loaded_at = time.time()
+            return record
+
+        print("Calibration of " + record.name + " has changed, its cached configuration is reloaded")
+        del self.records[record.name]
+        self.properties_by_name.pop(record.name, None)
+        self.calibrations_by_name.pop(record.name, None)
+        return None
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_file, "r") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            print("Device snapshot " + self.snapshot_file + " cannot be read and is ignored")
+            return
+
+        self.records = {dct["name"]: DeviceRecord.from_dict(dct) for dct in snapshot["records"]}
+        self.backend_names = snapshot.get("names")
+
+    def save_snapshot(self, snapshot_file=None):
+        snapshot_file = snapshot_file if snapshot_file != None else self.snapshot_file
+        if dirname(snapshot_file) != "":
+            os.makedirs(dirname(snapshot_file), exist_ok=True)
+
+        snapshot = {"names": self.names(), "records": [record.__dict__ for record in self.records.values()]}
+        tmp_file = snapshot_file + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(snapshot, f, indent=4)
+        os.replace(tmp_file, snapshot_file)
@@ -1,53 +1,52 @@
-from qiskit.test.mock import FakeProvider
-from core.entities import IBMQuantumComputer, QuantumComputerSimulator
-from qiskit_ibm_provider import IBMProvider
+from os.path import join
+from provider.device_registry import DeviceRegistry
 
 class QuantumDeviceProvider:
-    def __init__(self, backend_name, ibmq_credentials=None) -> None:
+    def __init__(self, backend_name, ibmq_credentials=None, snapshot_file=None) -> None:
         if ibmq_credentials == None:
-            self.provider = FakeProvider()
-            backend = self.provider.get_backend(backend_name if backend_name != "ibmq_ehningen" else "fake_boeblingen")
+            from qiskit.providers.fake_provider import FakeProvider
+
+            self.registry = DeviceRegistry(FakeProvider(), snapshot_file)
+            backend_name = backend_name if backend_name != "ibmq_ehningen" else "fake_boeblingen"
         else:
-            ibmq_credentials.activate_account()
-            
-            self.provider = IBMProvider(instance=ibmq_credentials.instance)
-            backend = self.provider.get_backend(backend_name)
+            def load_provider():
+                from qiskit_ibm_provider import IBMProvider
+
+                ibmq_credentials.activate_account()
+                return IBMProvider(instance=ibmq_credentials.instance)
 
-        self.default_device = IBMQuantumComputer(backend)
+            # With a snapshot the account is only logged in once a backend is needed
+            self.registry = DeviceRegistry(None, snapshot_file, load_provider=load_provider)
+
+        self.default_device = self.registry.device(backend_name)
 
     def max_job_size_for(self, device):
-        backend = self.provider.get_backend(device.unique_name)
-        return backend.configuration().max_experiments 
+        return self.registry.max_experiments_for(device.unique_name)
     
     def provided_devices(self, min_qubits=10):
-        return [IBMQuantumComputer(b) for b in self.provider.backends() if b.configuration().n_qubits >= min_qubits]
+        return self.registry.devices(min_qubits)
+
+    def save_device_snapshot(self):
+        if self.registry.snapshot_file != None:
+            self.registry.save_snapshot()
     
 class FakeQuantumDeviceProvider(QuantumDeviceProvider):
     '''The device provider is mainly considered for testing purposes'''
-    def __init__(self) -> None:
-        super().__init__("fake_boeblingen")
+    def __init__(self, snapshot_file=None) -> None:
+        super().__init__("fake_boeblingen", snapshot_file=snapshot_file)
 
     def max_job_size_for(self, device):
-        for b in self.provider.backends():
-            if b.name() in device.unique_name:
-                return b.configuration().max_experiments
-        
-        raise Exception("There is no backend for device: " + device.unique_name)
+        backend_name = self.registry.backend_name_in(device.unique_name)
+        if backend_name == None:
+            raise Exception("There is no backend for device: " + device.unique_name)
 
-    def provided_devices(self, min_qubits=10):
-        devices = []
-        for b in self.provider.backends():
-            if b.configuration().n_qubits >= min_qubits:
-                try:
-                    devices.append(IBMQuantumComputer(b))
-                except AttributeError:
-                    print("There is no name for backend: " + str(b))
-        return devices
+        return self.registry.max_experiments_for(backend_name)
     
 class HybridQuantumDeviceProvider(QuantumDeviceProvider):
-    def __init__(self, ibmq_credentials) -> None:
-        self.fake_device_provider = FakeQuantumDeviceProvider()
-        self.ehningen_device_provider = QuantumDeviceProvider("ibmq_ehningen", ibmq_credentials)
+    def __init__(self, ibmq_credentials, snapshot_dir=None) -> None:
+        self.fake_device_provider = FakeQuantumDeviceProvider(join(snapshot_dir, "fake_devices.json") if snapshot_dir != None else None)
+        self.ehningen_device_provider = QuantumDeviceProvider("ibmq_ehningen", ibmq_credentials,
+                                                              join(snapshot_dir, "ibmq_devices.json") if snapshot_dir != None else None)
         self.default_device = self.ehningen_device_provider.default_device
 
     def max_job_size_for(self, device):
@@ -59,10 +58,14 @@ class HybridQuantumDeviceProvider(QuantumDeviceProvider):
             return self.fake_device_provider.max_job_size_for(device)
     
     def provided_devices(self, min_qubits=10):
-        filtered = filter(lambda d: (d.unique_name != "fake_boeblingen"), self.fake_device_provider.provided_devices())
+        filtered = filter(lambda d: (d.unique_name != "fake_boeblingen"), self.fake_device_provider.provided_devices(min_qubits))
         devices = list(filtered)
         devices.append(self.default_device)
         return devices
+
+    def save_device_snapshot(self):
+        self.fake_device_provider.save_device_snapshot()
+        self.ehningen_device_provider.save_device_snapshot()
     
 class IBMQCredentials:
     def __init__(self, api_token, api_url, instance) -> None:
@@ -71,6 +74,8 @@ class IBMQCredentials:
         self.instance = instance
 
     def activate_account(self, overwrite=False):
+        from qiskit_ibm_provider import IBMProvider
+
         if overwrite:
             IBMProvider.save_account(self.api_token, self.api_url, overwrite=True)
             return
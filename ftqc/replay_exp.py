@@ -0,0 +1,25 @@
+import argparse
+from os.path import dirname
+from experiment.replay import GridReplay
+from experiment.sweep import parse_value
+
+def parse_grid(assignments):
+    '''Parses name=value assignments, list values span the grid, e.g. top_n_rate=[0.1,0.25]'''
+    grid = {}
+    for assignment in assignments:
+        name, value = assignment.split("=", 1)
+        value = parse_value(value)
+        grid[name] = list(value) if isinstance(value, (list, tuple)) else [value]
+    return grid
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-aggregates stored channel measurements for every point of a parameter grid without executing any circuit")
+    parser.add_argument("result_files", nargs="+")
+    parser.add_argument("--grid", nargs="*", default=[], help="Parameters of the aggregators as name=value, e.g. conformity_threshold=[0.6,0.7,0.8]")
+    parser.add_argument("--outputdir", default=None, help="Directory of the evaluations, defaults to the directory of the first result file")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--all", action="store_true", help="Also evaluate results whose replayed aggregation is rejected")
+    args = parser.parse_args()
+
+    replay = GridReplay(args.result_files, parse_grid(args.grid), accepted_only=not args.all, processes=args.processes)
+    replay.save(replay.run(), args.outputdir if args.outputdir != None else dirname(args.result_files[0]) or ".")
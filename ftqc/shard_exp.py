@@ -0,0 +1,79 @@
+import argparse
+import random
+from multiprocessing import get_context
+from os.path import join
+from core.qchannels import deterministic_channel_ids, use_channel_ids
+from experiment.work_queue import ShardWorkQueue
+from experiment.sharded_experiment import ShardCoordinator, ShardWorker
+from evaluation.exp_eval import FtqcExperimentEvaluator
+
+def create_device_provider(args):
+    from provider.qdevice_provider import FakeQuantumDeviceProvider, HybridQuantumDeviceProvider, IBMQCredentials
+
+    if args.provider == "hybrid":
+        ibmq_credentials = IBMQCredentials(api_token='api_token', api_url='api_url', instance='instance')
+        return HybridQuantumDeviceProvider(ibmq_credentials)
+    return FakeQuantumDeviceProvider()
+
+def create_circuit_provider(args):
+    from provider.circuit_provider import QasmBasedCircuitProvider, RandomCircuitProvider
+
+    if args.qasm_dir != None:
+        return QasmBasedCircuitProvider(args.qasm_dir)
+    return RandomCircuitProvider(args.circuits, max_num_qubits=10, max_depth=40, seed=args.circuit_seed)
+
+def run_worker(args, worker_id=None):
+    from pattern_definition import build_patterns
+
+    device_provider = create_device_provider(args)
+
+    # Every worker must create the same channels, i.e. the same transpilation seeds and ids, so that the results of all
+    # shards refer to the same channels
+    random.seed(args.pattern_seed)
+    use_channel_ids(deterministic_channel_ids("pattern-seed-" + str(args.pattern_seed)))
+    patterns = build_patterns({"transpilations": args.transpilations, "num_opt_level": args.num_opt_level}, device_provider)
+
+    work_queue = ShardWorkQueue(args.queue, lease_duration=args.lease, max_attempts=args.max_attempts)
+    ShardWorker(work_queue, create_circuit_provider(args), args.shards, device_provider, patterns, args.outputdir, worker_id).run(args.poll_interval)
+
+def run_coordinator(args):
+    work_queue = ShardWorkQueue(args.queue, lease_duration=args.lease, max_attempts=args.max_attempts)
+    coordinator = ShardCoordinator(work_queue, args.shards, args.outputdir)
+    coordinator.start()
+
+    # Spawn instead of fork, as forking after qiskit and Aer have been loaded can deadlock the workers
+    context = get_context("spawn")
+    workers = [context.Process(target=run_worker, args=(args, "local-worker-" + str(i))) for i in range(args.local_workers)]
+    for worker in workers:
+        worker.start()
+
+    coordinator.wait(poll_interval=args.poll_interval, workers=workers if len(workers) > 0 else None)
+    for worker in workers:
+        worker.join()
+
+    results = coordinator.merge()
+    FtqcExperimentEvaluator(results, args.outputdir).evaluate()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the experiment sharded across several worker processes or nodes")
+    parser.add_argument("role", choices=["coordinator", "worker"])
+    parser.add_argument("--queue", default=join("results", "work_queue.sqlite"), help="SQLite file shared by the coordinator and the workers")
+    parser.add_argument("--outputdir", default="results")
+    parser.add_argument("--shards", type=int, default=10)
+    parser.add_argument("--lease", type=float, default=600, help="Seconds after which the shard of an unresponsive worker can be claimed again")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Claims after which a shard whose worker keeps crashing is marked as failed")
+    parser.add_argument("--local-workers", type=int, default=0, help="Number of worker processes the coordinator spawns itself")
+    parser.add_argument("--poll-interval", type=float, default=5)
+    parser.add_argument("--provider", choices=["fake", "hybrid"], default="fake")
+    parser.add_argument("--circuits", type=int, default=100)
+    parser.add_argument("--circuit-seed", type=int, default=123)
+    parser.add_argument("--qasm-dir", default=None)
+    parser.add_argument("--pattern-seed", type=int, default=123)
+    parser.add_argument("--transpilations", type=int, default=9)
+    parser.add_argument("--num-opt-level", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.role == "coordinator":
+        run_coordinator(args)
+    else:
+        run_worker(args)
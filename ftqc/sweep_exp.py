@@ -0,0 +1,14 @@
+import argparse
+from os.path import join
+from experiment.sweep import SweepRunner
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the parameter grid of the config file in parallel processes")
+    parser.add_argument("--config", default="experiments.cfg")
+    parser.add_argument("--sections", nargs="*", default=None)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--store", default=join("results", "sweep.sqlite"), help="SQLite file collecting the results of all points")
+    parser.add_argument("--cache-dir", default=join("results", "transpilation_cache"), help="Directory of the transpilations shared between processes")
+    args = parser.parse_args()
+
+    SweepRunner(args.config, args.store, cache_dir=args.cache_dir, processes=args.processes, sections=args.sections).run()